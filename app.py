@@ -2,11 +2,26 @@
 微信自动化 HTTP 服务
 提供 RESTful API 接口，接收消息发送请求并加入队列处理
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 import json
 import logging
+import math
 import os
+import time
 from message_queue import MessageQueue
+from contact_index import ContactIndex
+from circuit_breaker import CircuitBreaker
+from webhook_dispatcher import WebhookDispatcher
+from event_bus import EventBus
+from fair_scheduler import DEFAULT_TENANT
+from pacing import AdaptivePacer
+from traffic_recorder import TrafficRecorder
+from sampling_profiler import SamplingProfiler, format_collapsed, summarize
+from file_cache import FileCache, MB
+from template_store import TemplateStore
+from history_store import HistoryStore
+from message_monitor import MessageMonitor
+from recipient_lists import RecipientListStore
 
 # 创建 Flask 应用
 app = Flask(__name__)
@@ -14,6 +29,19 @@ app = Flask(__name__)
 # 全局变量
 message_queue = None
 config = None
+event_bus = None
+# token -> 租户名称
+token_tenants = {}
+# 流量录制器（未配置 traffic_record_file 时为 None）
+traffic_recorder = None
+# 采样分析器（未启用 debug_profiler 时为 None）
+profiler = None
+# 消息模板存储
+template_store = None
+# 接收者列表存储
+recipient_list_store = None
+# 发送历史（history_file 为 null 时为 None）
+history_store = None
 
 # 配置日志
 def setup_logging():
@@ -44,6 +72,65 @@ def load_config():
     with open(config_file, 'r', encoding='utf-8') as f:
         return json.load(f)
 
+# 加载租户
+def load_tenants():
+    """
+    根据配置建立 token 与租户的对应关系
+    
+    config.json 中的 token 对应默认租户（权重 1、不限配额），
+    tokens 列表中的每一项对应一个租户
+    
+    Returns:
+        list: 租户配置列表（name、weight、quota），传给 MessageQueue
+    """
+    logger = logging.getLogger(__name__)
+    tenants = []
+    token_tenants.clear()
+    
+    if config.get('token'):
+        token_tenants[config['token']] = DEFAULT_TENANT
+        tenants.append({'name': DEFAULT_TENANT, 'weight': 1, 'quota': None})
+    
+    for entry in config.get('tokens', []):
+        if not entry.get('name') or not entry.get('token'):
+            logger.warning(f"忽略缺少 name 或 token 的租户配置: {entry.get('name')}")
+            continue
+        if entry['token'] in token_tenants:
+            logger.warning(f"忽略重复的租户 token: {entry['name']}")
+            continue
+        # 权重必须是正数（否则调度器会一直空转），配额必须是非负整数
+        weight = entry.get('weight', 1)
+        if isinstance(weight, bool) or not isinstance(weight, (int, float)) or not math.isfinite(weight) or weight <= 0:
+            logger.warning(f"忽略权重无效的租户配置: {entry['name']}, weight={weight!r}")
+            continue
+        quota = entry.get('quota')
+        if quota is not None and (isinstance(quota, bool) or not isinstance(quota, int) or quota < 0):
+            logger.warning(f"忽略配额无效的租户配置: {entry['name']}, quota={quota!r}")
+            continue
+        token_tenants[entry['token']] = entry['name']
+        tenants.append({
+            'name': entry['name'],
+            'weight': weight,
+            'quota': quota
+        })
+    
+    return tenants
+
+# 解析 token 对应的租户
+def resolve_tenant(token):
+    """
+    获取 token 对应的租户名称
+    
+    Args:
+        token: 请求中的 token
+        
+    Returns:
+        str: 租户名称，token 无效时返回 None
+    """
+    if not token:
+        return None
+    return token_tenants.get(token)
+
 # 验证 token
 def verify_token(token):
     """
@@ -55,7 +142,7 @@ def verify_token(token):
     Returns:
         bool: token 是否有效
     """
-    return token == config.get('token')
+    return resolve_tenant(token) is not None
 
 # 验证请求参数
 def validate_request_data(data):
@@ -68,30 +155,95 @@ def validate_request_data(data):
     Returns:
         tuple: (是否有效, 错误信息)
     """
-    # 检查必需字段
-    required_fields = ['token', 'action', 'to', 'content']
+    # 检查必需字段（使用模板时不需要 content，使用接收者列表时不需要 to）
+    required_fields = ['token', 'action']
+    if 'to_list' not in data:
+        required_fields.append('to')
+    if 'template_id' not in data:
+        required_fields.append('content')
     for field in required_fields:
         if field not in data:
             return False, f"缺少必需字段: {field}"
     
     # 验证 action
-    if data['action'] not in ['sendtext', 'sendpic']:
+    if data['action'] not in ['sendtext', 'sendpic', 'sendfile']:
         return False, f"不支持的操作: {data['action']}"
     
-    # 验证 to 字段是否为列表
-    if not isinstance(data['to'], list):
+    # 验证接收者：to 数组或服务端保存的接收者列表编号（列表成员已在保存时校验）
+    if 'to_list' in data:
+        if 'to' in data:
+            return False, "'to' 和 'to_list' 只能提供一个"
+        if not isinstance(data['to_list'], str) or len(data['to_list']) == 0:
+            return False, "'to_list' 字段必须是非空字符串"
+    elif not isinstance(data['to'], list):
         return False, "'to' 字段必须是数组"
-    
-    if len(data['to']) == 0:
+    elif len(data['to']) == 0:
         return False, "'to' 字段不能为空"
+    elif not all(isinstance(name, str) and name for name in data['to']):
+        return False, "'to' 中的接收者名称必须是非空字符串"
     
-    # 验证 content 字段
-    if not isinstance(data['content'], str) or len(data['content']) == 0:
+    # 验证 content 字段，使用模板时验证 template_id / vars 字段（模板只用于文本消息）
+    if 'template_id' in data:
+        if not isinstance(data['template_id'], str) or len(data['template_id']) == 0:
+            return False, "'template_id' 字段必须是非空字符串"
+        if data['action'] != 'sendtext':
+            return False, "只有 sendtext 支持 'template_id'"
+        variables = data.get('vars')
+        if variables is not None and not isinstance(variables, dict):
+            return False, "'vars' 字段必须是包含 columns 和 rows 的对象"
+    elif not isinstance(data['content'], str) or len(data['content']) == 0:
         return False, "'content' 字段必须是非空字符串"
     
+    # sendfile 的 content 是文件 URL
+    if data['action'] == 'sendfile' and not data['content'].startswith(('http://', 'https://')):
+        return False, "sendfile 的 'content' 字段必须是 http:// 或 https:// 开头的文件地址"
+    
+    # 验证可选的 callback_url 字段
+    callback_url = data.get('callback_url')
+    if callback_url is not None:
+        if not isinstance(callback_url, str) or not callback_url.startswith(('http://', 'https://')):
+            return False, "'callback_url' 字段必须是 http:// 或 https:// 开头的地址"
+    
+    # 验证可选的 expires_in / deadline 字段
+    for field in ('expires_in', 'deadline'):
+        value = data.get(field)
+        if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float)) or value <= 0):
+            return False, f"'{field}' 字段必须是正数"
+    
     return True, None
 
 
+def get_expires_at(data):
+    """
+    根据 expires_in（秒）和 deadline（时间戳）计算过期时间，两者都有时取较早的一个
+    
+    Args:
+        data: 请求的 JSON 数据
+        
+    Returns:
+        float: 过期时间戳，未设置时返回 None
+    """
+    candidates = []
+    if data.get('expires_in') is not None:
+        candidates.append(time.time() + data['expires_in'])
+    if data.get('deadline') is not None:
+        candidates.append(float(data['deadline']))
+    return min(candidates) if candidates else None
+
+
+def get_request_token():
+    """
+    获取请求中的 token（查询参数或 JSON 请求体）
+    
+    Returns:
+        str: token，未提供时返回 None
+    """
+    token = request.args.get('token')
+    if token is None:
+        token = (request.get_json(silent=True) or {}).get('token')
+    return token
+
+
 @app.route('/', methods=['POST'])
 def send_message():
     """
@@ -113,12 +265,41 @@ def send_message():
         "content": "图片的URL"
     }
     
+    请求格式 (发送给服务端保存的接收者列表，见 /lists):
+    {
+        "token": "123123",
+        "action": "sendtext",
+        "to_list": "vip_groups",
+        "content": "消息内容"
+    }
+    
+    请求格式 (使用模板逐个接收者渲染，rows 与 to 一一对应):
+    {
+        "token": "123123",
+        "action": "sendtext",
+        "to": ["联系人1", "联系人2"],
+        "template_id": "order_shipped",
+        "vars": {"columns": ["name", "order_id"], "rows": [["张三", "A1001"], ["李四", "A1002"]]}
+    }
+    
+    可选字段:
+        callback_url: 发送结果回调地址，每个接收者的发送结果会批量 POST 到该地址
+        expires_in: 有效期（秒），超过有效期仍未发送的接收者直接跳过
+        deadline: 截止时间（Unix 时间戳），与 expires_in 同时提供时取较早的一个
+    
     响应格式:
     {
         "success": true,
         "message": "消息已加入队列",
-        "queued_count": 2
+        "job_id": "3f2a9c0e1b7d4a55",
+        "queued_count": 2,
+        "queue_size": 2,
+        "eta": {"start_in": 12.4, "finish_in": 20.9, "start_at": 1792365235.5, "finish_at": 1792365244.0}
     }
+    
+    eta 根据最近的发送耗时、排在前面的积压和租户权重估计，只作为参考
+    
+    token 所属租户的待发送数量超出配额时返回 429
     """
     logger = logging.getLogger(__name__)
     
@@ -133,7 +314,8 @@ def send_message():
                 'error': '请求体不能为空'
             }), 400
         
-        logger.info(f"收到消息发送请求: to={data.get('to', [])}, content_length={len(data.get('content', ''))}")
+        to_count = len(data['to']) if isinstance(data.get('to'), list) else 0
+        logger.info(f"收到消息发送请求: 接收者数量={to_count}, content_length={len(data.get('content', ''))}")
         
         # 验证请求参数
         is_valid, error_msg = validate_request_data(data)
@@ -145,27 +327,94 @@ def send_message():
             }), 400
         
         # 验证 token
-        if not verify_token(data['token']):
+        tenant = resolve_tenant(data['token'])
+        if tenant is None:
             logger.warning(f"Token 验证失败")
             return jsonify({
                 'success': False,
                 'error': '无效的 token'
             }), 401
         
-        # 将消息加入队列
-        to_list = data['to']
-        content = data['content']
+        # 使用接收者列表时直接引用列表中的成员元组（保存时已校验和去重）
+        if 'to_list' in data:
+            recipient_list = recipient_list_store.get(tenant, data['to_list']) if recipient_list_store else None
+            if recipient_list is None:
+                return jsonify({
+                    'success': False,
+                    'error': f"接收者列表不存在: {data['to_list']}"
+                }), 404
+            if not recipient_list.members:
+                return jsonify({
+                    'success': False,
+                    'error': f"接收者列表为空: {data['to_list']}"
+                }), 400
+            to_list = recipient_list.members
+        else:
+            to_list = data['to']
+        
+        # 使用模板时校验变量表（压缩为模板用到的列），消息内容由处理线程逐条渲染
         action = data['action']
-        queued_count = message_queue.add_message(to_list, content, action)
+        template = None
+        variables = None
+        if 'template_id' in data:
+            template = template_store.get(tenant, data['template_id']) if template_store else None
+            if template is None:
+                return jsonify({
+                    'success': False,
+                    'error': f"模板不存在: {data['template_id']}"
+                }), 404
+            table = data.get('vars') or {}
+            try:
+                variables = template.bind(table.get('columns', []), table.get('rows', [[]] * len(to_list)),
+                                          len(to_list))
+            except ValueError as e:
+                logger.warning(f"模板变量表验证失败: {str(e)}")
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            content = template.source
+        else:
+            content = data['content']
         
-        logger.info(f"消息已加入队列: 接收者数量={queued_count}, 队列大小={message_queue.get_queue_size()}")
+        # 将消息作为一个群发任务加入队列
+        expires_at = get_expires_at(data)
+        job = message_queue.add_message(
+            to_list, content, action,
+            callback_url=data.get('callback_url'),
+            tenant=tenant,
+            expires_at=expires_at,
+            template=template,
+            variables=variables
+        )
+        if job is None:
+            return jsonify({
+                'success': False,
+                'error': '超出配额，请稍后重试'
+            }), 429
+        
+        # 录制已接受的请求（匿名化，用于回放）；任务已入队，录制失败不能让请求返回错误
+        if traffic_recorder:
+            try:
+                traffic_recorder.record(
+                    job.created_at, action, to_list, content,
+                    tenant=tenant,
+                    expires_in=expires_at - job.created_at if expires_at else None
+                )
+            except Exception as e:
+                logger.error(f"录制请求失败: job_id={job.job_id}, {str(e)}")
+        queue_size = message_queue.get_queue_size()
+        
+        logger.info(f"消息已加入队列: job_id={job.job_id}, 接收者数量={job.total}, 队列大小={queue_size}")
         
         # 返回成功响应
         return jsonify({
             'success': True,
             'message': '消息已加入队列',
-            'queued_count': queued_count,
-            'queue_size': message_queue.get_queue_size()
+            'job_id': job.job_id,
+            'queued_count': job.total,
+            'queue_size': queue_size,
+            'eta': message_queue.estimate_job(job)
         }), 200
         
     except Exception as e:
@@ -181,18 +430,607 @@ def get_status():
     """
     获取服务状态
     
+    status 取值: running（正常）、paused（熔断暂停）、stalled（处理线程卡死）、stopped（处理线程未运行）
+    
+    不需要 token；按租户划分的信息（metrics.tenants、capacity.tenant_backlog_s、jobs）
+    只在携带默认租户 token 时返回（GET /status?token=123123）
+    
     响应格式:
     {
         "status": "running",
-        "queue_size": 5
+        "queue_size": 5,
+        "metrics": {
+            "contact_index": {"lookups": 10, "first_try_hit_ratio": 0.9, ...},
+            "session_list": {"size": 30, "hit_ratio": 0.8, ...},
+            "clipboard": {"writes": 3, "reuses": 297},
+            "tenants": {"default": {"weight": 1, "pending": 5, "sent": 120, "throughput_per_min": 30, ...}}
+        },
+        "jobs": [
+            {"job_id": "3f2a9c0e1b7d4a55", "total": 300, "dispatched": 120, "sent": 118, "failed": 1, ...}
+        ],
+        "circuit_breaker": {"state": "closed", "consecutive_failures": 0, ...},
+        "capacity": {"per_recipient_s": {"sendtext": 4.2, ...}, "recipients_per_min": {"sendtext": 14.29, ...}, "backlog_s": 21.0, ...}
+    }
+    """
+    response = {
+        'status': message_queue.get_worker_status(),
+        'queue_size': message_queue.get_queue_size(),
+        'capacity': message_queue.get_capacity(),
+        'metrics': message_queue.get_metrics(),
+        'jobs': message_queue.get_jobs()
     }
+    if traffic_recorder:
+        response['metrics']['traffic_recorder'] = traffic_recorder.get_stats()
+    # 租户名称、各租户统计和任务信息只提供给默认租户
+    if resolve_tenant(get_request_token()) != DEFAULT_TENANT:
+        response['metrics'].pop('tenants', None)
+        response['capacity'].pop('tenant_backlog_s', None)
+        del response['jobs']
+    if message_queue.circuit_breaker:
+        response['circuit_breaker'] = message_queue.circuit_breaker.get_status()
+    return jsonify(response), 200
+
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
     """
+    取消群发任务中尚未发送的接收者
+    
+    请求格式:
+        DELETE /jobs/3f2a9c0e1b7d4a55?token=123123
+    
+    只能取消本租户的任务；默认租户（config.json 中的 token）可以取消所有任务
+    
+    响应格式:
+    {
+        "success": true,
+        "job_id": "3f2a9c0e1b7d4a55",
+        "cancelled_count": 180
+    }
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    job = message_queue.get_job(job_id)
+    if job is None or (tenant != DEFAULT_TENANT and job.tenant != tenant):
+        return jsonify({
+            'success': False,
+            'error': '任务不存在'
+        }), 404
+    
+    if job.is_finished():
+        return jsonify({
+            'success': False,
+            'error': '任务已完成'
+        }), 409
+    
+    cancelled_count = message_queue.cancel_job(job_id)
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'cancelled_count': cancelled_count
+    }), 200
+
+
+@app.route('/recipients/<path:recipient>', methods=['DELETE'])
+def cancel_recipient(recipient):
+    """
+    取消发给某个接收者的所有待发送消息
+    
+    请求格式:
+        DELETE /recipients/联系人1?token=123123
+    
+    普通租户只取消本租户的消息；默认租户取消所有租户的消息。
+    被取消的消息在出队时跳过，不会进入界面操作；取消的数量立即从队列大小和配额中扣除
+    
+    响应格式:
+    {
+        "success": true,
+        "to": "联系人1",
+        "cancelled_count": 3
+    }
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    cancelled_count = message_queue.cancel_recipient(recipient, tenant=None if tenant == DEFAULT_TENANT else tenant)
+    return jsonify({
+        'success': True,
+        'to': recipient,
+        'cancelled_count': cancelled_count
+    }), 200
+
+
+@app.route('/templates', methods=['GET'])
+def list_templates():
+    """
+    列出本租户的消息模板
+    
+    请求格式:
+        GET /templates?token=123123
+    
+    响应格式:
+    {
+        "success": true,
+        "templates": [{"template_id": "order_shipped", "content": "您好 {name}，订单 {order_id} 已发货", "fields": ["name", "order_id"], "updated_at": 1792365221.09}]
+    }
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    return jsonify({
+        'success': True,
+        'templates': template_store.list(tenant)
+    }), 200
+
+
+@app.route('/templates/<template_id>', methods=['GET', 'PUT', 'DELETE'])
+def manage_template(template_id):
+    """
+    查询、创建（或更新）和删除本租户的消息模板
+    
+    请求格式:
+        GET    /templates/order_shipped?token=123123
+        PUT    /templates/order_shipped  {"token": "123123", "content": "您好 {name}，订单 {order_id} 已发货"}
+        DELETE /templates/order_shipped?token=123123
+    
+    模板变量写法为 {变量名}，{to} 表示接收者名称，{{ 和 }} 表示字面的花括号。
+    保存时即编译并检查语法；更新或删除模板不影响已入队的任务
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    if request.method == 'PUT':
+        content = (request.get_json(silent=True) or {}).get('content')
+        try:
+            template, created = template_store.put(tenant, template_id, content)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        return jsonify({
+            'success': True,
+            'created': created,
+            'template': template.to_dict()
+        }), 201 if created else 200
+    
+    if request.method == 'DELETE':
+        if not template_store.delete(tenant, template_id):
+            return jsonify({
+                'success': False,
+                'error': '模板不存在'
+            }), 404
+        return jsonify({
+            'success': True,
+            'template_id': template_id
+        }), 200
+    
+    template = template_store.get(tenant, template_id)
+    if template is None:
+        return jsonify({
+            'success': False,
+            'error': '模板不存在'
+        }), 404
     return jsonify({
-        'status': 'running',
-        'queue_size': message_queue.get_queue_size()
+        'success': True,
+        'template': template.to_dict()
     }), 200
 
 
+@app.route('/lists', methods=['GET'])
+def list_recipient_lists():
+    """
+    列出本租户的接收者列表（不含成员）
+    
+    请求格式:
+        GET /lists?token=123123
+    
+    响应格式:
+    {
+        "success": true,
+        "lists": [{"list_id": "vip_groups", "count": 800, "updated_at": 1792365221.09}]
+    }
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    return jsonify({
+        'success': True,
+        'lists': recipient_list_store.list(tenant)
+    }), 200
+
+
+@app.route('/lists/<list_id>', methods=['GET', 'PUT', 'PATCH', 'DELETE'])
+def manage_recipient_list(list_id):
+    """
+    查询、创建（或整体替换）、增删成员和删除本租户的接收者列表
+    
+    请求格式:
+        GET    /lists/vip_groups?token=123123
+        PUT    /lists/vip_groups  {"token": "123123", "members": ["群1", "群2"]}
+        PATCH  /lists/vip_groups  {"token": "123123", "add": ["群3"], "remove": ["群1"]}
+        DELETE /lists/vip_groups?token=123123
+    
+    成员保存时去重；PATCH 先删除再新增，新增的接收者追加到末尾。
+    修改或删除列表不影响已入队的任务
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    if request.method in ('PUT', 'PATCH'):
+        body = request.get_json(silent=True) or {}
+        try:
+            if request.method == 'PUT':
+                recipient_list, created = recipient_list_store.put(tenant, list_id, body.get('members'))
+            else:
+                created = False
+                recipient_list = recipient_list_store.update(tenant, list_id, add=body.get('add'),
+                                                             remove=body.get('remove'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        if recipient_list is None:
+            return jsonify({
+                'success': False,
+                'error': '接收者列表不存在'
+            }), 404
+        return jsonify({
+            'success': True,
+            'created': created,
+            'list': recipient_list.to_dict(include_members=False)
+        }), 201 if created else 200
+    
+    if request.method == 'DELETE':
+        if not recipient_list_store.delete(tenant, list_id):
+            return jsonify({
+                'success': False,
+                'error': '接收者列表不存在'
+            }), 404
+        return jsonify({
+            'success': True,
+            'list_id': list_id
+        }), 200
+    
+    recipient_list = recipient_list_store.get(tenant, list_id)
+    if recipient_list is None:
+        return jsonify({
+            'success': False,
+            'error': '接收者列表不存在'
+        }), 404
+    return jsonify({
+        'success': True,
+        'list': recipient_list.to_dict()
+    }), 200
+
+
+@app.route('/history', methods=['GET'])
+def query_history():
+    """
+    查询发送历史（最近的在前，按 before_id 游标翻页）
+    
+    请求格式:
+        GET /history?token=123123&to=联系人1&since=1792300000&limit=50
+    
+    参数:
+        to: 接收者（精确匹配）
+        job_id: 任务编号
+        since / until: 时间范围（Unix 时间戳，until 不包含）
+        success: true 只查成功，false 只查失败
+        action: 消息类型
+        content: 完整消息内容（精确匹配）
+        contains: 消息内容包含的文本（只在保存的前 history_content_chars 个字符中查找）
+        tenant: 租户（只有默认租户可以指定，普通租户只能查询本租户）
+        before_id: 上一页返回的 next_before_id
+        limit: 每页记录数，默认 100，最多 1000
+    
+    响应格式:
+    {
+        "success": true,
+        "records": [{"id": 1024, "ts": 1792365223.11, "job_id": "3f2a9c0e1b7d4a55", "recipient": "联系人1", "success": true, ...}],
+        "next_before_id": 975
+    }
+    """
+    tenant = resolve_tenant(get_request_token())
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    if history_store is None:
+        return jsonify({
+            'success': False,
+            'error': '发送历史未启用'
+        }), 404
+    
+    args = request.args
+    try:
+        since = float(args['since']) if 'since' in args else None
+        until = float(args['until']) if 'until' in args else None
+        before_id = int(args['before_id']) if 'before_id' in args else None
+        limit = min(max(int(args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': "'since'、'until'、'before_id' 和 'limit' 必须是数字"
+        }), 400
+    
+    success = args.get('success')
+    if success is not None:
+        if success not in ('true', 'false'):
+            return jsonify({
+                'success': False,
+                'error': "'success' 必须是 true 或 false"
+            }), 400
+        success = success == 'true'
+    
+    records, next_before_id = history_store.query(
+        tenant=args.get('tenant') if tenant == DEFAULT_TENANT else tenant,
+        recipient=args.get('to'),
+        job_id=args.get('job_id'),
+        since=since,
+        until=until,
+        success=success,
+        action=args.get('action'),
+        content=args.get('content'),
+        contains=args.get('contains'),
+        before_id=before_id,
+        limit=limit
+    )
+    return jsonify({
+        'success': True,
+        'records': records,
+        'next_before_id': next_before_id
+    }), 200
+
+
+@app.route('/incoming', methods=['GET'])
+def get_incoming():
+    """
+    获取最近收到的新消息（只有默认租户可以访问）
+    
+    请求格式:
+        GET /incoming?token=123123&after_id=41&limit=100
+    
+    参数:
+        after_id: 只返回编号大于该值的消息（传入上次返回的 last_id 即可增量获取）
+        limit: 最多返回的消息数量，默认 100，最多 1000
+    
+    响应格式:
+    {
+        "success": true,
+        "messages": [{"id": 42, "contact": "联系人1", "preview": "收到，谢谢", "unread": 1, "new_count": 1, "time": "12:30", "detected_at": 1792365223.1}],
+        "last_id": 42
+    }
+    """
+    if resolve_tenant(get_request_token()) != DEFAULT_TENANT:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    message_monitor = message_queue.message_monitor
+    if message_monitor is None:
+        return jsonify({
+            'success': False,
+            'error': '新消息监听未启用'
+        }), 404
+    
+    try:
+        after_id = int(request.args.get('after_id', 0))
+        limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': "'after_id' 和 'limit' 必须是整数"
+        }), 400
+    
+    messages = message_monitor.get_messages(after_id=after_id, limit=limit)
+    return jsonify({
+        'success': True,
+        'messages': messages,
+        'last_id': messages[-1]['id'] if messages else after_id
+    }), 200
+
+
+def format_sse(event_type, data, event_id=None):
+    """
+    格式化一条 Server-Sent Events 消息
+    
+    Args:
+        event_type: 事件类型
+        data: 事件数据
+        event_id: 事件编号
+        
+    Returns:
+        str: SSE 文本
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event_type}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """
+    以 Server-Sent Events 推送队列和发送事件
+    
+    请求格式:
+        GET /events?token=123123
+    
+    事件类型:
+        enqueued: 群发任务入队
+        started:  开始向某个接收者发送
+        sent:     发送成功
+        failed:   发送失败
+        skipped:  消息已取消或已过期，出队时跳过
+        cancelled: 任务或接收者被取消
+        received: 收到新消息（启用 monitor_incoming 时，只推送给默认租户）
+        summary:  定期推送的吞吐概要
+        dropped:  订阅者消费过慢被断开（之后连接关闭）
+        
+    默认租户收到所有租户的事件，其他租户只收到自己的事件（事件数据中的 tenant 字段）
+    """
+    logger = logging.getLogger(__name__)
+    
+    # EventSource 无法设置请求头，token 通过查询参数传递
+    tenant = resolve_tenant(request.args.get('token'))
+    if tenant is None:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    # 默认租户可以看到所有事件；收到的消息属于整个微信账号，只推送给默认租户
+    see_all = tenant == DEFAULT_TENANT
+    
+    subscriber = event_bus.subscribe()
+    if subscriber is None:
+        return jsonify({
+            'success': False,
+            'error': '订阅数已达上限'
+        }), 503
+    
+    summary_interval = config.get('event_summary_interval', 5)
+    logger.info("新的事件流订阅者已连接")
+    
+    def generate():
+        last_summary = message_queue.get_summary()
+        last_summary_at = time.time()
+        try:
+            yield 'retry: 3000\n\n'
+            yield format_sse('summary', dict(last_summary, throughput_per_min=None))
+            while True:
+                # 先记录关闭状态再取事件，保证断开前已缓冲的事件全部送出
+                closed = subscriber.closed
+                events = subscriber.drain(timeout=summary_interval)
+                for event in events:
+                    if not see_all and (event['type'] == 'received' or event['data'].get('tenant') != tenant):
+                        continue
+                    data = dict(event['data'], time=event['time'])
+                    yield format_sse(event['type'], data, event['id'])
+                
+                if closed:
+                    if subscriber.dropped:
+                        yield format_sse('dropped', {'reason': '消费过慢，缓冲区已满'})
+                    break
+                
+                # 定期推送吞吐概要
+                now = time.time()
+                if now - last_summary_at >= summary_interval:
+                    summary = message_queue.get_summary()
+                    done = (summary['sent'] + summary['failed']) - (last_summary['sent'] + last_summary['failed'])
+                    summary['throughput_per_min'] = round(done * 60 / (now - last_summary_at), 2)
+                    yield format_sse('summary', summary)
+                    last_summary = summary
+                    last_summary_at = now
+        finally:
+            event_bus.unsubscribe(subscriber)
+            logger.info("事件流订阅者已断开")
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@app.route('/debug/profile', methods=['GET'])
+def debug_profile():
+    """
+    对所有线程（包括消息处理线程和 HTTP 线程）采样分析 N 秒
+    
+    请求格式:
+        GET /debug/profile?token=123123&seconds=10&interval=0.01&thread=wechat-worker&format=collapsed
+    
+    参数:
+        seconds: 采样时长（秒），默认 10，不超过 profiler_max_duration
+        interval: 采样间隔（秒），默认 0.01
+        thread: 只统计名称包含该字符串的线程（如 wechat-worker）
+        format: collapsed（默认，可直接生成火焰图）或 json（最常见的调用栈和函数）
+    
+    需要在配置文件中启用 debug_profiler，且只有默认租户的 token 可以调用
+    """
+    if profiler is None:
+        return jsonify({
+            'success': False,
+            'error': '采样分析未启用'
+        }), 404
+    
+    if resolve_tenant(request.args.get('token')) != DEFAULT_TENANT:
+        return jsonify({
+            'success': False,
+            'error': '无效的 token'
+        }), 401
+    
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval', 0.01))
+    except ValueError:
+        seconds = interval = None
+    if not (seconds and seconds > 0 and interval and interval > 0):
+        return jsonify({
+            'success': False,
+            'error': "'seconds' 和 'interval' 必须是正数"
+        }), 400
+    
+    output_format = request.args.get('format', 'collapsed')
+    if output_format not in ('collapsed', 'json'):
+        return jsonify({
+            'success': False,
+            'error': f"不支持的格式: {output_format}"
+        }), 400
+    
+    result = profiler.profile(seconds, interval=interval, thread_filter=request.args.get('thread'))
+    if result is None:
+        return jsonify({
+            'success': False,
+            'error': '已有采样分析正在进行'
+        }), 409
+    
+    if output_format == 'json':
+        return jsonify(summarize(result)), 200
+    
+    return Response(
+        format_collapsed(result),
+        mimetype='text/plain',
+        headers={
+            'Content-Disposition': 'attachment; filename=profile.collapsed',
+            'X-Profile-Samples': str(result['samples']),
+            'X-Profile-Duration': str(result['duration'])
+        }
+    )
+
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """健康检查端点"""
@@ -201,9 +1039,34 @@ def health_check():
     }), 200
 
 
+@app.route('/ready', methods=['GET'])
+def readiness_check():
+    """
+    就绪检查端点（供负载均衡使用）
+    
+    只有预热完成且消息处理线程存活时才返回 200，否则返回 503
+    
+    响应格式:
+    {
+        "status": "ready"
+    }
+    """
+    ready, reason = message_queue.is_ready()
+    if ready:
+        return jsonify({
+            'status': 'ready'
+        }), 200
+    
+    return jsonify({
+        'status': 'not_ready',
+        'reason': reason
+    }), 503
+
+
 def main():
     """主函数，初始化并启动服务"""
-    global message_queue, config
+    global message_queue, config, event_bus, traffic_recorder, profiler, template_store, history_store
+    global recipient_list_store
     
     # 加载配置
     try:
@@ -216,9 +1079,132 @@ def main():
     # 配置日志
     logger = setup_logging()
     
+    # 创建流量录制器（可选，记录已接受的请求用于回放）
+    if config.get('traffic_record_file'):
+        traffic_recorder = TrafficRecorder(
+            config['traffic_record_file'],
+            salt=config.get('traffic_record_salt')
+        )
+    
+    # 加载消息模板
+    template_store = TemplateStore(
+        store_file=config.get('template_file', 'templates.json'),
+        max_templates=config.get('template_max_count', 1000),
+        max_length=config.get('template_max_length', 5000)
+    )
+    
+    # 加载接收者列表
+    recipient_list_store = RecipientListStore(
+        store_file=config.get('recipient_list_file', 'recipient_lists.json'),
+        max_lists=config.get('recipient_list_max_count', 1000),
+        max_members=config.get('recipient_list_max_members', 10000)
+    )
+    
+    # 创建发送历史（可选，供 /history 查询）
+    if config.get('history_file', 'history.db'):
+        history_store = HistoryStore(
+            db_file=config.get('history_file', 'history.db'),
+            batch_size=config.get('history_batch_size', 500),
+            flush_interval=config.get('history_flush_interval', 1.0),
+            retention_days=config.get('history_retention_days', 90),
+            content_max_chars=config.get('history_content_chars', 200)
+        )
+    
+    # 创建采样分析器（可选，供 /debug/profile 使用）
+    if config.get('debug_profiler', False):
+        profiler = SamplingProfiler(max_duration=config.get('profiler_max_duration', 60))
+    
+    # 创建事件总线（供 /events 推送队列和发送事件）
+    event_bus = EventBus(
+        max_buffer=config.get('event_buffer_size', 1000),
+        max_subscribers=config.get('event_max_subscribers', 20)
+    )
+    
     # 创建并启动消息队列
     message_interval = config.get('message_interval', 1)
-    message_queue = MessageQueue(message_interval=message_interval)
+    contact_index = ContactIndex(
+        index_file=config.get('contact_index_file', 'contact_index.json'),
+        cooldown=config.get('contact_index_cooldown', 600)
+    )
+    # controller 为 simulated 时使用模拟控制器（不操作微信界面，用于压测）
+    simulate = config.get('controller', 'wechat') == 'simulated'
+    file_cache = None
+    if simulate:
+        controller_options = config.get('simulation', {})
+        logger.warning("使用模拟控制器，消息不会真正发送到微信")
+    else:
+        controller_options = {
+            'session_refresh_top': config.get('session_refresh_top', 5),
+            'session_full_refresh_interval': config.get('session_full_refresh_interval', 300)
+        }
+        # sendfile 的文件缓存（入队时在后台预先下载，按内容去重）
+        file_cache = FileCache(
+            cache_dir=config.get('file_cache_dir'),
+            max_bytes=config.get('file_cache_max_mb', 1024) * MB,
+            max_file_bytes=config.get('file_max_mb', 100) * MB,
+            prefetch_workers=config.get('file_prefetch_workers', 2)
+        )
+    pacer = None
+    if config.get('pacing', False):
+        pacer = AdaptivePacer(
+            min_scale=config.get('pacing_min_scale', 0.3),
+            max_scale=config.get('pacing_max_scale', 3.0),
+            step=config.get('pacing_step', 0.05),
+            backoff=config.get('pacing_backoff', 2.0),
+            slow_factor=config.get('pacing_slow_factor', 3.0)
+        )
+    webhook_dispatcher = WebhookDispatcher(
+        max_queue_size=config.get('webhook_max_queue_size', 10000),
+        batch_size=config.get('webhook_batch_size', 50),
+        flush_interval=config.get('webhook_flush_interval', 1.0),
+        max_retries=config.get('webhook_max_retries', 3)
+    )
+    # 新消息监听（可选，在处理线程的发送间隙轮询会话列表）
+    message_monitor = None
+    if config.get('monitor_incoming', False):
+        message_monitor = MessageMonitor(
+            idle_interval=config.get('monitor_idle_interval', 2.0),
+            busy_interval=config.get('monitor_busy_interval', 15.0),
+            min_scan=config.get('monitor_min_scan', 3),
+            stable_run=config.get('monitor_stable_run', 2),
+            max_scan=config.get('monitor_max_scan', 30),
+            full_scan_interval=config.get('monitor_full_scan_interval', 300),
+            max_buffer=config.get('incoming_buffer_size', 1000),
+            event_bus=event_bus,
+            webhook_dispatcher=webhook_dispatcher,
+            callback_url=config.get('incoming_callback_url')
+        )
+    message_queue = MessageQueue(
+        message_interval=message_interval,
+        contact_index=contact_index,
+        controller_options=controller_options,
+        coalesce_window=config.get('coalesce_window', 0),
+        coalesce_max_chars=config.get('coalesce_max_chars', 2000),
+        coalesce_max_messages=config.get('coalesce_max_messages', 10),
+        warmup=config.get('warmup', True),
+        warmup_urls=config.get('warmup_urls', []),
+        warmup_retry_interval=config.get('warmup_retry_interval', 10),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=config.get('breaker_failure_threshold', 3),
+            base_backoff=config.get('breaker_base_backoff', 5),
+            max_backoff=config.get('breaker_max_backoff', 300)
+        ),
+        max_item_attempts=config.get('max_item_attempts', 5),
+        watchdog_interval=config.get('watchdog_interval', 5),
+        ui_timeouts=config.get('ui_timeouts'),
+        idle_timeout=config.get('idle_timeout', 60),
+        webhook_dispatcher=webhook_dispatcher,
+        callback_url=config.get('callback_url'),
+        event_bus=event_bus,
+        tenants=load_tenants(),
+        pacer=pacer,
+        simulate=simulate,
+        file_cache=file_cache,
+        history_store=history_store,
+        message_monitor=message_monitor,
+        service_time_alpha=config.get('service_time_alpha', 0.1),
+        default_service_times=config.get('default_service_times')
+    )
     message_queue.start()
     logger.info("消息队列已启动")
     
@@ -234,6 +1220,10 @@ def main():
     print(f"API 端点: POST http://{host}:{port}/")
     print(f"状态查询: GET http://{host}:{port}/status")
     print(f"健康检查: GET http://{host}:{port}/health")
+    print(f"就绪检查: GET http://{host}:{port}/ready")
+    print(f"事件流:   GET http://{host}:{port}/events?token=...")
+    if message_monitor:
+        print(f"新消息:   GET http://{host}:{port}/incoming?token=...")
     print(f"========================================\n")
     
     try:
@@ -244,6 +1234,8 @@ def main():
         # 停止消息队列
         logger.info("正在停止消息队列...")
         message_queue.stop()
+        if traffic_recorder:
+            traffic_recorder.close()
         logger.info("服务已停止")
 
 
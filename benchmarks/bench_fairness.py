@@ -0,0 +1,216 @@
+"""
+多租户公平调度基准测试（模拟，不需要微信客户端）
+使用模拟时钟驱动 FairScheduler，每发送一个接收者耗时固定的 send_time 秒，
+与按到达顺序处理（FIFO，旧行为）对比：
+
+1. skewed：一个租户一次提交大批量群发，其他租户陆续提交少量消息，
+   比较各租户的排队等待时间
+2. saturated：所有租户都持续积压，比较各租户实际获得的发送份额与权重是否一致
+   （Jain 公平指数，1.0 表示完全按权重分配）
+
+用法:
+    python benchmarks/bench_fairness.py
+    python benchmarks/bench_fairness.py --send-time 1.5 --json fairness.json
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from broadcast_job import BroadcastJob
+from fair_scheduler import FairScheduler
+
+
+class FifoScheduler:
+    """按到达顺序处理的调度器（旧行为），接口与 FairScheduler 相同"""
+
+    def __init__(self, tenants=None):
+        self.jobs = collections.deque()
+
+    def push(self, name, job):
+        self.jobs.append(job)
+
+    def pop(self):
+        while self.jobs:
+            job = self.jobs[0]
+            recipient = job.next_recipient()
+            if job.remaining() == 0:
+                self.jobs.popleft()
+            if recipient is not None:
+                return job, recipient
+        return None
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（最近秩法）
+
+    Args:
+        values: 数值列表
+        pct: 百分位（0-100）
+
+    Returns:
+        float: 百分位数，列表为空时返回 None
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, int(round(pct / 100 * len(ordered))) - 1)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def simulate(scheduler, arrivals, send_time, horizon):
+    """
+    用模拟时钟运行调度器
+
+    Args:
+        scheduler: 调度器（FairScheduler 或 FifoScheduler）
+        arrivals: 按时间排序的 (到达时间, 租户, 接收者数量) 列表
+        send_time: 每个接收者的发送耗时（模拟秒）
+        horizon: 模拟时长（模拟秒）
+
+    Returns:
+        dict: 租户名称 -> 发送数量和等待时间列表
+    """
+    arrivals = collections.deque(arrivals)
+    arrived_at = {}
+    results = collections.defaultdict(lambda: {'served': 0, 'waits': []})
+    now = 0.0
+
+    while now < horizon:
+        while arrivals and arrivals[0][0] <= now:
+            at, tenant, count = arrivals.popleft()
+            job = BroadcastJob([f'{tenant}-{i}' for i in range(count)], 'bench', tenant=tenant)
+            arrived_at[job.job_id] = at
+            scheduler.push(tenant, job)
+
+        picked = scheduler.pop()
+        if picked is None:
+            if not arrivals:
+                break
+            now = arrivals[0][0]
+            continue
+
+        job, _ = picked
+        result = results[job.tenant]
+        result['served'] += 1
+        result['waits'].append(now - arrived_at[job.job_id])
+        now += send_time
+
+    return results
+
+
+def skewed_arrivals(horizon):
+    """
+    倾斜负载：bulk 在开始时提交 2000 个接收者，alerts 每 10 秒提交 1 个，ops 每 60 秒提交 20 个
+
+    Args:
+        horizon: 模拟时长（模拟秒）
+
+    Returns:
+        list: (到达时间, 租户, 接收者数量) 列表
+    """
+    arrivals = [(0.0, 'bulk', 2000)]
+    arrivals += [(float(t), 'alerts', 1) for t in range(5, int(horizon), 10)]
+    arrivals += [(float(t), 'ops', 20) for t in range(30, int(horizon), 60)]
+    return sorted(arrivals, key=lambda arrival: arrival[0])
+
+
+def jain_index(values):
+    """
+    计算 Jain 公平指数
+
+    Args:
+        values: 按权重归一化后的份额列表
+
+    Returns:
+        float: 公平指数（1/n 到 1.0）
+    """
+    if not values or not any(values):
+        return None
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+
+def run_skewed(tenants, send_time, horizon):
+    """运行倾斜负载场景，返回各调度器下每个租户的等待时间统计"""
+    report = {}
+    for label, scheduler in (('fifo', FifoScheduler()), ('fair', FairScheduler(tenants))):
+        results = simulate(scheduler, skewed_arrivals(horizon), send_time, horizon)
+        report[label] = {}
+        for tenant in tenants:
+            # 一直没有轮到的租户等待时间记为 None（被饿死）
+            waits = results[tenant['name']]['waits']
+            report[label][tenant['name']] = {
+                'served': results[tenant['name']]['served'],
+                'wait_p50_s': round(percentile(waits, 50), 1) if waits else None,
+                'wait_p95_s': round(percentile(waits, 95), 1) if waits else None,
+                'wait_max_s': round(max(waits), 1) if waits else None
+            }
+    return report
+
+
+def run_saturated(tenants, send_time, horizon):
+    """运行全部积压场景，返回各调度器下的发送份额和 Jain 公平指数"""
+    weights = {tenant['name']: tenant['weight'] for tenant in tenants}
+    report = {}
+    for label, scheduler in (('fifo', FifoScheduler()), ('fair', FairScheduler(tenants))):
+        # 每个租户各提交两个足够大的任务，整个模拟期间都保持积压
+        arrivals = [(0.0, name, 5000) for name in weights] * 2
+        results = simulate(scheduler, arrivals, send_time, horizon)
+        total = sum(result['served'] for result in results.values())
+        shares = {name: results[name]['served'] / total for name in weights}
+        report[label] = {
+            'shares': {name: round(share, 3) for name, share in shares.items()},
+            'jain_index': round(jain_index([shares[name] / weights[name] for name in weights]), 4)
+        }
+    return report
+
+
+def main():
+    """主函数，运行基准测试并输出结果"""
+    parser = argparse.ArgumentParser(description='多租户公平调度基准测试')
+    parser.add_argument('--send-time', type=float, default=1.5, help='每个接收者的发送耗时（模拟秒）')
+    parser.add_argument('--horizon', type=float, default=1800, help='模拟时长（模拟秒）')
+    parser.add_argument('--json', dest='json_file', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    tenants = [
+        {'name': 'bulk', 'weight': 1},
+        {'name': 'alerts', 'weight': 1},
+        {'name': 'ops', 'weight': 2}
+    ]
+    report = {
+        'send_time_s': args.send_time,
+        'horizon_s': args.horizon,
+        'tenants': tenants,
+        'skewed': run_skewed(tenants, args.send_time, args.horizon),
+        'saturated': run_saturated(tenants, args.send_time, args.horizon)
+    }
+
+    print("=" * 60)
+    print(" 多租户公平调度基准测试（模拟）")
+    print("=" * 60)
+    print(f"每个接收者发送耗时: {args.send_time} s, 模拟时长: {args.horizon} s")
+    print("\n倾斜负载（bulk 一次提交 2000 个接收者）等待时间:")
+    print(f"  {'调度':<6}{'租户':<10}{'发送数':>8}{'p50(s)':>10}{'p95(s)':>10}{'max(s)':>10}")
+    for label, tenant_stats in report['skewed'].items():
+        for tenant, stats in tenant_stats.items():
+            waits = [stats[key] if stats[key] is not None else '-' for key in ('wait_p50_s', 'wait_p95_s', 'wait_max_s')]
+            print(f"  {label:<6}{tenant:<10}{stats['served']:>8}{waits[0]:>10}{waits[1]:>10}{waits[2]:>10}")
+    print("\n全部积压时的发送份额（权重 bulk=1, alerts=1, ops=2）:")
+    for label, stats in report['saturated'].items():
+        print(f"  {label:<6}{stats['shares']}  Jain 指数={stats['jain_index']}")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json_file}")
+
+
+if __name__ == '__main__':
+    main()
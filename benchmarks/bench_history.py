@@ -0,0 +1,158 @@
+"""
+发送历史基准测试（不需要微信客户端）
+向临时数据库写入若干个月的模拟发送历史（通过 HistoryStore 的写入线程批量写入），
+然后测量典型查询的耗时，以及按保留天数清理过期记录的耗时和回收的空间
+
+用法:
+    python benchmarks/bench_history.py
+    python benchmarks/bench_history.py --rows 2000000 --days 180 --json history.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from history_store import HistoryStore
+
+
+def fill(store, rows, days, recipients, now):
+    """
+    写入模拟发送历史（时间均匀分布在最近 days 天）
+
+    Args:
+        store: 发送历史
+        rows: 记录数
+        days: 时间跨度（天）
+        recipients: 不同接收者数量
+        now: 当前时间
+
+    Returns:
+        float: 写入耗时（秒）
+    """
+    start = time.time()
+    step = days * 86400 / rows
+    begin = now - days * 86400
+    for i in range(rows):
+        ts = begin + i * step
+        success = i % 17 != 0
+        store.record(
+            ts, f'job{i // 200}', 'default' if i % 4 else 'ops', f'群{i % recipients}', 'sendtext',
+            success, None if success else 'contact_not_found', f'通知 {i % 5000}：今日线报汇总',
+            1, ts - 5, 300.0
+        )
+    while store.queue.qsize() or store.written < rows:
+        time.sleep(0.1)
+    return time.time() - start
+
+
+def measure(store, repeat, **kwargs):
+    """
+    测量一个查询的耗时
+
+    Args:
+        store: 发送历史
+        repeat: 重复次数
+        **kwargs: 查询参数
+
+    Returns:
+        dict: 中位数和最大耗时（毫秒）、返回记录数
+    """
+    timings = []
+    records = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        records, _ = store.query(**kwargs)
+        timings.append((time.perf_counter() - started) * 1000)
+    return {
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'records': len(records)
+    }
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='发送历史基准测试')
+    parser.add_argument('--rows', type=int, default=1000000, help='模拟记录数')
+    parser.add_argument('--days', type=int, default=90, help='时间跨度（天）')
+    parser.add_argument('--recipients', type=int, default=2000, help='不同接收者数量')
+    parser.add_argument('--retention-days', type=int, default=60, help='清理测试使用的保留天数')
+    parser.add_argument('--repeat', type=int, default=20, help='每个查询的重复次数')
+    parser.add_argument('--json', dest='json_file', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_history_')
+    db_file = os.path.join(work_dir, 'history.db')
+    now = time.time()
+    try:
+        store = HistoryStore(db_file=db_file, max_queue_size=args.rows, batch_size=2000, flush_interval=0.2,
+                             retention_days=args.retention_days, maintenance_interval=float('inf'))
+        store.start()
+        print("=" * 60)
+        print(" 发送历史基准测试")
+        print("=" * 60)
+        print(f"写入 {args.rows} 条记录（{args.days} 天，{args.recipients} 个接收者）...")
+        fill_seconds = fill(store, args.rows, args.days, args.recipients, now)
+        print(f"写入耗时: {fill_seconds:.1f} s（{args.rows / fill_seconds:.0f} 条/秒）")
+
+        yesterday = now - 86400
+        _, second_page = store.query(recipient='群7', limit=50)
+        queries = {
+            '接收者最近 50 条': {'recipient': '群7', 'limit': 50},
+            '接收者第 2 页': {'recipient': '群7', 'before_id': second_page, 'limit': 50},
+            '接收者昨天': {'recipient': '群7', 'since': yesterday - 86400, 'until': yesterday},
+            '接收者 + 完整内容': {'recipient': '群7', 'content': '通知 7：今日线报汇总'},
+            '接收者 + 内容包含': {'recipient': '群7', 'contains': '通知 7：', 'limit': 20},
+            '任务的全部记录': {'job_id': 'job100', 'limit': 1000},
+            '租户最近失败': {'tenant': 'ops', 'success': False, 'limit': 50},
+            '最近 1 小时': {'since': now - 3600, 'limit': 100},
+            '60 天前的一天': {'since': now - 61 * 86400, 'until': now - 60 * 86400, 'limit': 100}
+        }
+        results = {}
+        print(f"\n{'查询':<18}{'中位数(ms)':>12}{'最大(ms)':>12}{'记录数':>8}")
+        for label, kwargs in queries.items():
+            results[label] = measure(store, args.repeat, **kwargs)
+            print(f"{label:<18}{results[label]['median_ms']:>12}{results[label]['max_ms']:>12}{results[label]['records']:>8}")
+
+        store.stop()
+        size_before = os.path.getsize(db_file)
+        store.running = True
+        connection = store._connect()
+        started = time.time()
+        store._maintain(connection)
+        connection.close()
+        store.running = False
+        maintenance = {
+            'purged': store.purged,
+            'seconds': round(time.time() - started, 2),
+            'size_before_mb': round(size_before / 1024 / 1024, 1),
+            'size_after_mb': round(os.path.getsize(db_file) / 1024 / 1024, 1)
+        }
+        print(f"\n按保留 {args.retention_days} 天清理: 删除 {maintenance['purged']} 条, 耗时 {maintenance['seconds']} s, "
+              f"文件 {maintenance['size_before_mb']} MB -> {maintenance['size_after_mb']} MB")
+
+        if args.json_file:
+            with open(args.json_file, 'w', encoding='utf-8') as f:
+                json.dump({
+                    'rows': args.rows,
+                    'days': args.days,
+                    'fill_seconds': round(fill_seconds, 1),
+                    'queries': results,
+                    'maintenance': maintenance
+                }, f, ensure_ascii=False, indent=2)
+            print(f"\n结果已写入: {args.json_file}")
+        store.read_connection.close()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""
+新消息监听基准测试（不需要微信客户端）
+用模拟控制器的会话列表驱动 MessageMonitor：先发送消息（会话预览变为自己发出的内容），
+再用 simulate_incoming() 模拟对方在当前打开的会话中回复（不显示未读数），
+检查自己发出的消息被过滤、对方的回复被识别，并统计每次轮询读取的会话数和耗时
+
+用法:
+    python benchmarks/bench_monitor.py
+    python benchmarks/bench_monitor.py --sessions 500 --rounds 200 --json monitor.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from message_monitor import MessageMonitor
+from simulated_controller import SimulatedController
+
+# 场景：(名称, 消息类型, 发送内容, 对方回复（None 表示不回复）, 回复时的未读数, 预期发现的新消息数)
+SCENARIOS = [
+    ('自己发出的文本', 'sendtext', '今晚八点开会', None, 0, 0),
+    ('自己发出的多行文本', 'sendtext', '会议通知\n今晚八点开会', None, 0, 0),
+    ('自己发出的图片', 'sendpic', 'https://example.com/a.png', None, 0, 0),
+    ('自己发出的文件', 'sendfile', 'https://example.com/a.pdf', None, 0, 0),
+    ('发送图片后回复', 'sendpic', 'https://example.com/a.png', '收到', 0, 1),
+    ('发送文件后回复', 'sendfile', 'https://example.com/a.pdf', '好的，谢谢', 0, 1),
+    ('回复是发出内容的一部分', 'sendtext', 'Is the order ok?', 'ok', 0, 1),
+    ('未读回复', 'sendtext', '今晚八点开会', '好', 1, 1),
+]
+
+SEND_METHODS = {
+    'sendtext': 'search_and_send',
+    'sendpic': 'search_and_send_picture',
+    'sendfile': 'search_and_send_file'
+}
+
+
+def run_scenario(controller, monitor, contact_name, action, content, reply, unread):
+    """
+    执行一个场景：发送、轮询，对方回复后再次轮询
+
+    Args:
+        controller: 模拟控制器
+        monitor: 新消息监听
+        contact_name: 联系人名称
+        action: 消息类型
+        content: 发送内容
+        reply: 对方回复，None 表示不回复
+        unread: 回复时的未读数
+
+    Returns:
+        int: 发现的新消息数量
+    """
+    found = 0
+    getattr(controller, SEND_METHODS[action])(contact_name, content)
+    monitor.note_outbound(contact_name, content, action)
+    found += monitor.poll(controller)
+    if reply is not None:
+        controller.simulate_incoming(contact_name, reply, unread=unread)
+        found += monitor.poll(controller)
+    return found
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='新消息监听基准测试')
+    parser.add_argument('--sessions', type=int, default=300, help='会话列表中的会话数量')
+    parser.add_argument('--rounds', type=int, default=100, help='每个场景的重复次数（每次使用不同的联系人）')
+    parser.add_argument('--json', dest='json_file', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    controller = SimulatedController(search_time=0, send_time=0, picture_time=0, file_time=0, jitter=0, seed=1)
+    monitor = MessageMonitor(idle_interval=0, busy_interval=0, full_scan_interval=float('inf'))
+    for i in range(args.sessions):
+        controller.simulate_incoming(f'会话{i}', f'历史消息 {i}', unread=0)
+    monitor.poll(controller)
+
+    print("=" * 60)
+    print(" 新消息监听基准测试")
+    print("=" * 60)
+    print(f"会话数量: {args.sessions}，每个场景重复 {args.rounds} 次\n")
+    print(f"{'场景':<16}{'预期':>8}{'发现':>8}{'结果':>8}")
+
+    results = {}
+    mismatches = 0
+    poll_timings = []
+    for name, action, content, reply, unread, expected in SCENARIOS:
+        found = 0
+        for i in range(args.rounds):
+            started = time.perf_counter()
+            found += run_scenario(controller, monitor, f'{name}{i}', action, content, reply, unread)
+            poll_timings.append((time.perf_counter() - started) * 1000)
+        expected_total = expected * args.rounds
+        ok = found == expected_total
+        mismatches += 0 if ok else 1
+        results[name] = {'expected': expected_total, 'found': found}
+        print(f"{name:<16}{expected_total:>8}{found:>8}{'通过' if ok else '不符':>8}")
+
+    stats = monitor.get_stats()
+    print(f"\n轮询次数: {stats['polls']}，平均每次读取 {stats['avg_cells_per_poll']} 个会话，"
+          f"平均耗时 {stats['avg_poll_ms']} ms（场景中位数 {statistics.median(poll_timings):.3f} ms）")
+    print(f"发现新消息: {stats['received']}，过滤自己发出的消息: {stats['own_filtered']}")
+    print(f"\n{'全部通过' if not mismatches else f'{mismatches} 个场景与预期不符'}")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'sessions': args.sessions,
+                'rounds': args.rounds,
+                'scenarios': results,
+                'monitor': stats
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json_file}")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
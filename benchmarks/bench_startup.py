@@ -0,0 +1,152 @@
+"""
+启动耗时基准测试
+1. 使用 python -X importtime 统计导入 app 模块的耗时，列出最耗时的模块
+2. 检查导入 app 时是否加载了 Windows UI 自动化相关的重量级依赖
+3. 可选：实际启动服务，测量从进程启动到 /health 可访问的耗时
+
+用法:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --serve --json startup.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 不应在 HTTP 服务启动时加载的重量级模块
+HEAVY_MODULES = ['uiautomation', 'wechat_controller', 'PIL', 'requests', 'win32clipboard', 'comtypes']
+
+# importtime 输出格式: import time:       self [us] |  cumulative | imported package
+IMPORTTIME_PATTERN = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+def measure_importtime(module='app'):
+    """
+    使用 -X importtime 统计导入模块的耗时
+
+    Args:
+        module: 要导入的模块名
+
+    Returns:
+        dict: 总耗时、最耗时的模块列表和已加载的重量级模块
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True
+    )
+
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_PATTERN.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append({
+                'module': name,
+                'self_us': int(self_us),
+                'cumulative_us': int(cumulative_us),
+                'depth': len(indent) // 2
+            })
+
+    total_us = sum(entry['cumulative_us'] for entry in entries if entry['depth'] == 0)
+    loaded = {entry['module'].split('.')[0] for entry in entries}
+
+    return {
+        'module': module,
+        'ok': result.returncode == 0,
+        'error': result.stderr.strip().splitlines()[-1] if result.returncode != 0 else None,
+        'total_ms': round(total_us / 1000, 1),
+        'top_modules': sorted(entries, key=lambda e: e['cumulative_us'], reverse=True)[:15],
+        'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in loaded]
+    }
+
+
+def measure_time_to_ready(port=18808, timeout=10):
+    """
+    实际启动服务，测量从进程启动到 /health 返回 200 的耗时
+
+    Args:
+        port: 临时服务使用的端口
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        dict: 就绪耗时（毫秒），超时为 None
+    """
+    work_dir = tempfile.mkdtemp(prefix='bench_startup_')
+    config = {
+        'token': 'bench',
+        'host': '127.0.0.1',
+        'port': port,
+        'log_file': os.path.join(work_dir, 'bench.log'),
+        'contact_index_file': None
+    }
+    with open(os.path.join(work_dir, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, 'app.py')],
+        cwd=work_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    ready_ms = None
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/health', timeout=0.5) as response:
+                    if response.status == 200:
+                        ready_ms = round((time.perf_counter() - start) * 1000, 1)
+                        break
+            except Exception:
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=5)
+
+    return {'time_to_health_ms': ready_ms}
+
+
+def main():
+    """主函数，运行基准测试并输出结果"""
+    parser = argparse.ArgumentParser(description='启动耗时基准测试')
+    parser.add_argument('--serve', action='store_true', help='实际启动服务并测量到 /health 可访问的耗时')
+    parser.add_argument('--port', type=int, default=18808, help='--serve 时使用的端口')
+    parser.add_argument('--json', dest='json_file', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    report = {'python': sys.version.split()[0], 'import': measure_importtime('app')}
+    if args.serve:
+        report['serve'] = measure_time_to_ready(port=args.port)
+
+    import_report = report['import']
+    print("=" * 60)
+    print(" 启动耗时基准测试")
+    print("=" * 60)
+    if not import_report['ok']:
+        print(f"导入 app 失败: {import_report['error']}")
+    print(f"导入 app 总耗时: {import_report['total_ms']} ms")
+    print(f"已加载的重量级模块: {import_report['heavy_modules_loaded'] or '无'}")
+    print("\n最耗时的模块（累计耗时）:")
+    for entry in import_report['top_modules']:
+        print(f"  {entry['cumulative_us'] / 1000:8.1f} ms  {entry['module']}")
+    if 'serve' in report:
+        print(f"\n从进程启动到 /health 可访问: {report['serve']['time_to_health_ms']} ms")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json_file}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,409 @@
+"""
+HTTP 压测工具
+按配置的请求比例（sendtext / sendpic / status）以固定速率或固定并发压测服务，
+统计吞吐量、p50/p95/p99 延迟、错误率和队列增长，结果可输出为 JSON 便于版本间对比
+
+默认启动一个使用模拟控制器（"controller": "simulated"）的临时服务，不需要微信客户端；
+也可以用 --url 压测已经运行的服务
+
+固定速率模式下，延迟从计划发出时间开始计算（包含客户端排队时间），
+避免服务变慢时少发请求而低估延迟
+
+用法:
+    python benchmarks/load_test.py --rate 50 --duration 30
+    python benchmarks/load_test.py --concurrency 16 --mix sendtext=60,sendpic=10,status=30 --json load.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8808 --token 123123 --rate 20
+"""
+import argparse
+import collections
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 支持的请求类型
+OPERATIONS = ('sendtext', 'sendpic', 'status')
+
+
+def parse_mix(text):
+    """
+    解析请求比例，如 "sendtext=70,sendpic=10,status=20"
+
+    Args:
+        text: 比例字符串
+
+    Returns:
+        list: (请求类型, 累计概率) 列表
+    """
+    weights = {}
+    for part in text.split(','):
+        name, _, value = part.partition('=')
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"不支持的请求类型: {name}")
+        weights[name] = float(value)
+
+    total = sum(weights.values())
+    cumulative = []
+    running = 0.0
+    for name, weight in weights.items():
+        running += weight / total
+        cumulative.append((name, running))
+    return cumulative
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（最近秩法）
+
+    Args:
+        values: 已排序的数值列表
+        pct: 百分位（0-100）
+
+    Returns:
+        float: 百分位数，列表为空时返回 None
+    """
+    if not values:
+        return None
+    index = max(0, int(round(pct / 100 * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def start_simulated_server(port, send_time, message_interval):
+    """
+    在临时目录中启动一个使用模拟控制器的服务
+
+    Args:
+        port: 服务端口
+        send_time: 模拟发送文本的耗时（秒）
+        message_interval: 消息发送间隔（秒）
+
+    Returns:
+        tuple: (进程, 服务地址, token)
+    """
+    work_dir = tempfile.mkdtemp(prefix='load_test_')
+    config = {
+        'token': 'load',
+        'host': '127.0.0.1',
+        'port': port,
+        'log_level': 'WARNING',
+        'log_file': os.path.join(work_dir, 'load_test.log'),
+        'contact_index_file': None,
+        'message_interval': message_interval,
+        'controller': 'simulated',
+        'simulation': {'search_time': send_time, 'send_time': send_time, 'picture_time': send_time * 3}
+    }
+    with open(os.path.join(work_dir, 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump(config, f)
+
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, 'app.py')],
+        cwd=work_dir,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    return process, f'http://127.0.0.1:{port}', 'load'
+
+
+def wait_until_ready(base_url, timeout=15):
+    """
+    等待服务 /ready 返回 200
+
+    Args:
+        base_url: 服务地址
+        timeout: 最长等待时间（秒）
+
+    Returns:
+        bool: 是否就绪
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f'{base_url}/ready', timeout=1) as response:
+                if response.status == 200:
+                    return True
+        except Exception:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+class LoadTest:
+    """压测类，发出请求并收集延迟、错误和队列大小"""
+
+    def __init__(self, base_url, token, mix, recipients=1, timeout=10):
+        """
+        初始化压测
+
+        Args:
+            base_url: 服务地址
+            token: API token
+            mix: parse_mix 返回的请求比例
+            recipients: 每个发送请求的接收者数量
+            timeout: 单个请求的超时时间（秒）
+        """
+        self.base_url = base_url
+        self.token = token
+        self.mix = mix
+        self.recipients = recipients
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.latencies = collections.defaultdict(list)
+        self.errors = collections.defaultdict(collections.Counter)
+        self.queue_samples = []
+        self.sequence = 0
+
+    def _pick_operation(self, value):
+        """根据 0-1 之间的数值按比例选择请求类型"""
+        for name, threshold in self.mix:
+            if value <= threshold:
+                return name
+        return self.mix[-1][0]
+
+    def _build_request(self, operation):
+        """
+        构造请求
+
+        Args:
+            operation: 请求类型
+
+        Returns:
+            urllib.request.Request: 请求
+        """
+        if operation == 'status':
+            return urllib.request.Request(f'{self.base_url}/status')
+
+        with self.lock:
+            self.sequence += 1
+            sequence = self.sequence
+        content = f'压测消息 {sequence}' if operation == 'sendtext' else f'https://example.com/load/{sequence % 10}.png'
+        body = json.dumps({
+            'token': self.token,
+            'action': operation,
+            'to': [f'压测联系人{(sequence + i) % 50}' for i in range(self.recipients)],
+            'content': content
+        }).encode('utf-8')
+        return urllib.request.Request(
+            f'{self.base_url}/',
+            data=body,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+
+    def request(self, operation, scheduled_at):
+        """
+        发出一个请求并记录延迟（从计划发出时间开始计算）
+
+        Args:
+            operation: 请求类型
+            scheduled_at: 计划发出时间（perf_counter）
+        """
+        error = None
+        try:
+            with urllib.request.urlopen(self._build_request(operation), timeout=self.timeout) as response:
+                payload = json.loads(response.read().decode('utf-8'))
+                if operation == 'status':
+                    self.queue_samples.append((time.time(), payload.get('queue_size')))
+        except urllib.error.HTTPError as e:
+            error = str(e.code)
+        except Exception as e:
+            error = type(e).__name__
+
+        latency_ms = (time.perf_counter() - scheduled_at) * 1000
+        with self.lock:
+            self.latencies[operation].append(latency_ms)
+            if error:
+                self.errors[operation][error] += 1
+
+    def sample_queue(self):
+        """读取一次 /status 中的队列大小（用于统计队列增长）"""
+        try:
+            with urllib.request.urlopen(f'{self.base_url}/status', timeout=self.timeout) as response:
+                payload = json.loads(response.read().decode('utf-8'))
+                self.queue_samples.append((time.time(), payload.get('queue_size')))
+        except Exception:
+            pass
+
+    def run_rate(self, rate, duration, max_workers):
+        """
+        固定速率（开环）压测：按计划时间发出请求，不等待上一个请求完成
+
+        Args:
+            rate: 每秒请求数
+            duration: 压测时长（秒）
+            max_workers: 最大并发请求数
+        """
+        interval = 1.0 / rate
+        total = int(rate * duration)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for i in range(total):
+                scheduled_at = start + i * interval
+                delay = scheduled_at - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                operation = self._pick_operation(((i * 0.6180339887) % 1.0))
+                executor.submit(self.request, operation, scheduled_at)
+                if i % max(1, int(rate)) == 0:
+                    executor.submit(self.sample_queue)
+
+    def run_concurrency(self, concurrency, duration):
+        """
+        固定并发（闭环）压测：每个线程完成一个请求后立即发出下一个
+
+        Args:
+            concurrency: 并发线程数
+            duration: 压测时长（秒）
+        """
+        deadline = time.perf_counter() + duration
+
+        def worker(index):
+            counter = index
+            while time.perf_counter() < deadline:
+                counter += concurrency
+                self.request(self._pick_operation((counter * 0.6180339887) % 1.0), time.perf_counter())
+
+        def sampler():
+            while time.perf_counter() < deadline:
+                self.sample_queue()
+                time.sleep(1)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+        threads.append(threading.Thread(target=sampler))
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def report(self, elapsed):
+        """
+        汇总压测结果
+
+        Args:
+            elapsed: 实际压测时长（秒）
+
+        Returns:
+            dict: 总体和各请求类型的吞吐量、延迟百分位和错误率，以及队列增长
+        """
+        operations = {}
+        total_requests = 0
+        total_errors = 0
+        for operation, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            errors = sum(self.errors[operation].values())
+            total_requests += len(ordered)
+            total_errors += errors
+            operations[operation] = {
+                'requests': len(ordered),
+                'throughput_rps': round(len(ordered) / elapsed, 2),
+                'p50_ms': round(percentile(ordered, 50), 1),
+                'p95_ms': round(percentile(ordered, 95), 1),
+                'p99_ms': round(percentile(ordered, 99), 1),
+                'max_ms': round(ordered[-1], 1),
+                'error_rate': round(errors / len(ordered), 4),
+                'errors': dict(self.errors[operation])
+            }
+
+        samples = sorted((t, size) for t, size in self.queue_samples if size is not None)
+        queue = {'samples': len(samples), 'start': None, 'end': None, 'max': None, 'growth_per_s': None}
+        if samples:
+            queue.update({
+                'start': samples[0][1],
+                'end': samples[-1][1],
+                'max': max(size for _, size in samples)
+            })
+            if len(samples) > 1 and samples[-1][0] > samples[0][0]:
+                queue['growth_per_s'] = round((samples[-1][1] - samples[0][1]) / (samples[-1][0] - samples[0][0]), 2)
+
+        return {
+            'duration_s': round(elapsed, 2),
+            'requests': total_requests,
+            'throughput_rps': round(total_requests / elapsed, 2),
+            'error_rate': round(total_errors / total_requests, 4) if total_requests else None,
+            'operations': operations,
+            'queue': queue
+        }
+
+
+def main():
+    """主函数，运行压测并输出结果"""
+    parser = argparse.ArgumentParser(description='HTTP 压测工具')
+    parser.add_argument('--url', help='压测已运行的服务（不指定时启动模拟控制器服务）')
+    parser.add_argument('--token', default='load', help='--url 时使用的 API token')
+    parser.add_argument('--port', type=int, default=18809, help='模拟服务使用的端口')
+    parser.add_argument('--mix', default='sendtext=70,sendpic=10,status=20', help='请求比例')
+    parser.add_argument('--rate', type=float, help='固定速率（每秒请求数）')
+    parser.add_argument('--concurrency', type=int, default=8, help='固定并发数（未指定 --rate 时使用）')
+    parser.add_argument('--max-workers', type=int, default=64, help='固定速率模式下的最大并发请求数')
+    parser.add_argument('--duration', type=float, default=10, help='压测时长（秒）')
+    parser.add_argument('--recipients', type=int, default=1, help='每个发送请求的接收者数量')
+    parser.add_argument('--send-time', type=float, default=0.05, help='模拟控制器每步操作耗时（秒）')
+    parser.add_argument('--message-interval', type=float, default=0, help='模拟服务的消息发送间隔（秒）')
+    parser.add_argument('--json', dest='json_file', help='把结果写入 JSON 文件')
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        base_url, token = args.url.rstrip('/'), args.token
+    else:
+        process, base_url, token = start_simulated_server(args.port, args.send_time, args.message_interval)
+
+    try:
+        if not wait_until_ready(base_url):
+            print(f"服务未就绪: {base_url}")
+            return
+
+        test = LoadTest(base_url, token, parse_mix(args.mix), recipients=args.recipients)
+        test.sample_queue()
+        start = time.perf_counter()
+        if args.rate:
+            test.run_rate(args.rate, args.duration, args.max_workers)
+        else:
+            test.run_concurrency(args.concurrency, args.duration)
+        elapsed = time.perf_counter() - start
+        test.sample_queue()
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=5)
+
+    report = {
+        'target': args.url or 'simulated',
+        'mode': f'rate={args.rate}' if args.rate else f'concurrency={args.concurrency}',
+        'mix': args.mix,
+        'recipients': args.recipients,
+        'result': test.report(elapsed)
+    }
+    result = report['result']
+
+    print("=" * 60)
+    print(" HTTP 压测")
+    print("=" * 60)
+    print(f"目标: {report['target']}, 模式: {report['mode']}, 比例: {report['mix']}")
+    print(f"时长: {result['duration_s']} s, 请求数: {result['requests']}, "
+          f"吞吐量: {result['throughput_rps']} req/s, 错误率: {result['error_rate']}")
+    print(f"\n  {'请求':<10}{'数量':>8}{'req/s':>10}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'错误率':>10}")
+    for operation, stats in result['operations'].items():
+        print(f"  {operation:<10}{stats['requests']:>8}{stats['throughput_rps']:>10}{stats['p50_ms']:>10}"
+              f"{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['error_rate']:>10}")
+    queue = result['queue']
+    print(f"\n队列大小: 开始 {queue['start']}, 结束 {queue['end']}, 最大 {queue['max']}, "
+          f"增长 {queue['growth_per_s']} 条/秒")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json_file}")
+
+
+if __name__ == '__main__':
+    main()
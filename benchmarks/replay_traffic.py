@@ -0,0 +1,261 @@
+"""
+流量回放工具
+把 TrafficRecorder 录制的请求按原始到达间隔（或加速）重新送入 MessageQueue，
+处理线程使用模拟控制器，对比不同处理配置下队列深度和完成延迟会如何变化
+
+加速回放时，到达间隔、模拟操作耗时、发送间隔和合并窗口按同一倍数缩短，
+报告中的时间都换算回原始时间轴；--speed 0 表示所有请求立即入队（测量清空积压所需时间）
+
+用法:
+    python benchmarks/replay_traffic.py traffic.jsonl --speed 10
+    python benchmarks/replay_traffic.py traffic.jsonl.gz --speed 10 --message-interval 1 0.5 --coalesce-window 0 2 --json replay.json
+"""
+import argparse
+import collections
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+
+# 项目根目录
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from event_bus import EventBus
+from message_queue import MessageQueue
+from traffic_recorder import read_traffic
+
+
+def percentile(values, pct):
+    """
+    计算百分位数（最近秩法）
+
+    Args:
+        values: 已排序的数值列表
+        pct: 百分位（0-100）
+
+    Returns:
+        float: 百分位数，列表为空时返回 None
+    """
+    if not values:
+        return None
+    index = max(0, int(round(pct / 100 * len(values))) - 1)
+    return values[min(index, len(values) - 1)]
+
+
+def build_content(record):
+    """
+    根据内容摘要和长度构造回放用的消息内容（同一摘要得到同一内容）
+
+    Args:
+        record: 录制记录
+
+    Returns:
+        str: 消息内容
+    """
+    length = max(1, record['l'])
+    return (record['h'] * (length // len(record['h']) + 1))[:length]
+
+
+class Replay:
+    """单个处理配置下的回放"""
+
+    def __init__(self, records, scenario, speed, sample_interval):
+        """
+        初始化回放
+
+        Args:
+            records: 录制记录列表
+            scenario: 处理配置（message_interval、search_time、send_time、picture_time、coalesce_window）
+            speed: 回放倍速，0 表示所有请求立即入队
+            sample_interval: 队列深度采样间隔（原始时间，秒）
+        """
+        self.records = records
+        self.scenario = scenario
+        self.speed = speed
+        # 墙钟时间 = 原始时间 * scale
+        self.scale = 1.0 / speed if speed else 1.0
+        self.sample_interval = sample_interval
+        self.total = sum(len(record['r']) for record in records)
+        self.created_at = {}
+        self.latencies = []
+        self.counts = collections.Counter()
+        self.timeline = []
+        self.done = threading.Event()
+
+    def _monitor(self, message_queue, subscriber, start):
+        """
+        监控线程：采样队列深度，并根据发送事件统计完成延迟
+
+        Args:
+            message_queue: 消息队列
+            subscriber: 事件订阅者
+            start: 回放开始时间（墙钟）
+        """
+        next_sample = start
+        while not self.done.is_set():
+            for event in subscriber.drain(timeout=self.sample_interval * self.scale / 4):
+                if event['type'] in ('sent', 'failed'):
+                    self.counts[event['type']] += 1
+                    created_at = self.created_at.get(event['data']['job_id'])
+                    if created_at is not None:
+                        self.latencies.append((event['time'] - created_at) / self.scale)
+                elif event['type'] == 'skipped':
+                    self.counts['skipped'] += event['data']['count']
+
+            now = time.time()
+            if now >= next_sample:
+                self.timeline.append((round((now - start) / self.scale, 1), message_queue.get_queue_size()))
+                next_sample += self.sample_interval * self.scale
+
+            if sum(self.counts.values()) >= self.total:
+                self.counts['finished_at'] = now
+                self.done.set()
+
+    def run(self, max_drain):
+        """
+        回放录制的请求并等待处理完成
+
+        Args:
+            max_drain: 最后一个请求入队后最多等待的时间（原始时间，秒）
+
+        Returns:
+            dict: 队列深度、完成延迟和处理数量
+        """
+        event_bus = EventBus(max_buffer=self.total * 4 + 1000, max_subscribers=1)
+        subscriber = event_bus.subscribe()
+        tenants = sorted({record.get('n') or 'default' for record in self.records})
+        message_queue = MessageQueue(
+            message_interval=self.scenario['message_interval'] * self.scale,
+            controller_options={
+                'search_time': self.scenario['search_time'] * self.scale,
+                'send_time': self.scenario['send_time'] * self.scale,
+                'picture_time': self.scenario['picture_time'] * self.scale,
+                'seed': 0
+            },
+            coalesce_window=self.scenario['coalesce_window'] * self.scale,
+            max_finished_jobs=len(self.records) + 1,
+            warmup=False,
+            watchdog_interval=0,
+            event_bus=event_bus,
+            tenants=[{'name': name} for name in tenants],
+            simulate=True
+        )
+        message_queue.start()
+
+        start = time.time()
+        monitor = threading.Thread(target=self._monitor, args=(message_queue, subscriber, start), daemon=True)
+        monitor.start()
+
+        first_arrival = self.records[0]['t']
+        for record in self.records:
+            if self.speed:
+                delay = start + (record['t'] - first_arrival) * self.scale - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            now = time.time()
+            expires_at = now + record['x'] * self.scale if record.get('x') else None
+            job = message_queue.add_message(
+                record['r'], build_content(record), record['a'],
+                tenant=record.get('n') or 'default',
+                expires_at=expires_at
+            )
+            if job is not None:
+                self.created_at[job.job_id] = job.created_at
+            else:
+                self.counts['rejected'] += len(record['r'])
+
+        fed_at = time.time()
+        self.done.wait(timeout=max_drain * self.scale)
+        self.done.set()
+        monitor.join(timeout=5)
+        message_queue.stop()
+
+        latencies = sorted(self.latencies)
+        depths = [size for _, size in self.timeline] or [0]
+        peak_index = depths.index(max(depths))
+        finished_at = self.counts.pop('finished_at', None)
+        return {
+            'scenario': self.scenario,
+            'requests': len(self.records),
+            'recipients': self.total,
+            'sent': self.counts['sent'],
+            'failed': self.counts['failed'],
+            'skipped': self.counts['skipped'],
+            'rejected': self.counts['rejected'],
+            'unfinished': self.total - sum(self.counts.values()),
+            'arrival_span_s': round((fed_at - start) / self.scale, 1),
+            'drain_time_s': round((finished_at - start) / self.scale, 1) if finished_at else None,
+            'max_queue_depth': max(depths),
+            'max_queue_depth_at_s': self.timeline[peak_index][0] if self.timeline else None,
+            'latency_p50_s': round(percentile(latencies, 50), 2) if latencies else None,
+            'latency_p95_s': round(percentile(latencies, 95), 2) if latencies else None,
+            'latency_p99_s': round(percentile(latencies, 99), 2) if latencies else None,
+            'latency_max_s': round(latencies[-1], 2) if latencies else None,
+            'timeline': self.timeline
+        }
+
+
+def main():
+    """主函数，按每种处理配置回放一次并输出对比结果"""
+    parser = argparse.ArgumentParser(description='流量回放工具')
+    parser.add_argument('traffic_file', help='TrafficRecorder 录制的文件（.jsonl 或 .jsonl.gz）')
+    parser.add_argument('--speed', type=float, default=10, help='回放倍速（1 为原速，0 表示立即全部入队）')
+    parser.add_argument('--limit', type=int, help='只回放前 N 个请求')
+    parser.add_argument('--message-interval', type=float, nargs='+', default=[1.0], help='发送间隔（秒），可给多个值对比')
+    parser.add_argument('--send-time', type=float, nargs='+', default=[0.2], help='模拟发送文本耗时（秒）')
+    parser.add_argument('--search-time', type=float, nargs='+', default=[0.3], help='模拟搜索联系人耗时（秒）')
+    parser.add_argument('--picture-time', type=float, default=0.6, help='模拟发送图片耗时（秒）')
+    parser.add_argument('--coalesce-window', type=float, nargs='+', default=[0], help='文本合并时间窗口（秒）')
+    parser.add_argument('--sample-interval', type=float, default=5, help='队列深度采样间隔（原始时间，秒）')
+    parser.add_argument('--max-drain', type=float, default=3600, help='入队结束后最多等待处理完成的时间（原始时间，秒）')
+    parser.add_argument('--json', dest='json_file', help='把结果写入 JSON 文件（包含队列深度时间线）')
+    args = parser.parse_args()
+
+    records = list(itertools.islice(read_traffic(args.traffic_file), args.limit))
+    if not records:
+        print(f"录制文件为空: {args.traffic_file}")
+        return
+    records.sort(key=lambda record: record['t'])
+
+    scenarios = [
+        {
+            'message_interval': message_interval,
+            'search_time': search_time,
+            'send_time': send_time,
+            'picture_time': args.picture_time,
+            'coalesce_window': coalesce_window
+        }
+        for message_interval, search_time, send_time, coalesce_window in itertools.product(
+            args.message_interval, args.search_time, args.send_time, args.coalesce_window
+        )
+    ]
+
+    print("=" * 60)
+    print(" 流量回放")
+    print("=" * 60)
+    print(f"录制文件: {args.traffic_file}, 请求数: {len(records)}, "
+          f"原始时长: {round(records[-1]['t'] - records[0]['t'], 1)} s, 倍速: {args.speed or '立即入队'}")
+
+    results = []
+    for scenario in scenarios:
+        result = Replay(records, scenario, args.speed, args.sample_interval).run(args.max_drain)
+        results.append(result)
+        print(f"\n配置: {scenario}")
+        print(f"  发送 {result['sent']}, 失败 {result['failed']}, 跳过 {result['skipped']}, 未完成 {result['unfinished']}")
+        print(f"  最大队列深度: {result['max_queue_depth']}（第 {result['max_queue_depth_at_s']} s）, "
+              f"全部完成: {result['drain_time_s']} s")
+        print(f"  完成延迟 p50/p95/p99/max: {result['latency_p50_s']} / {result['latency_p95_s']} / "
+              f"{result['latency_p99_s']} / {result['latency_max_s']} s")
+
+    if args.json_file:
+        with open(args.json_file, 'w', encoding='utf-8') as f:
+            json.dump({'traffic_file': args.traffic_file, 'speed': args.speed, 'results': results},
+                      f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入: {args.json_file}")
+
+
+if __name__ == '__main__':
+    main()
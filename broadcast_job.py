@@ -0,0 +1,223 @@
+"""
+群发任务模块
+一个请求对应一个群发任务：消息内容只保存一份，接收者保存为紧凑的元组，
+后台线程通过游标逐个取出接收者，避免为每个接收者创建一个消息字典
+
+使用模板的任务只保存预编译模板的引用和每个接收者一行的变量值，取出接收者时才渲染消息内容
+"""
+import time
+import uuid
+
+
+class BroadcastJob:
+    """群发任务类，保存一次请求的内容、接收者和发送进度"""
+
+    __slots__ = (
+        'job_id', 'action', 'content', 'recipients', 'cursor',
+        'created_at', 'finished_at', 'sent', 'failed', 'callback_url', 'tenant',
+        'expires_at', 'cancelled', 'skipped', 'template', 'variables', 'cancelled_recipients',
+        'cancelled_pending'
+    )
+
+    def __init__(self, recipients, content, action='sendtext', callback_url=None, tenant='default',
+                 expires_at=None, template=None, variables=None):
+        """
+        初始化群发任务
+
+        Args:
+            recipients: 接收者列表
+            content: 消息内容（文本、图片 URL 或文件 URL），使用模板时为模板内容
+            action: 消息类型，'sendtext'、'sendpic' 或 'sendfile'
+            callback_url: 发送结果回调地址，None 表示使用全局回调地址
+            tenant: 提交任务的租户（API token 对应的名称）
+            expires_at: 过期时间（时间戳），过期后尚未发送的接收者直接跳过，None 表示不过期
+            template: 预编译的消息模板（Template），None 表示所有接收者使用同一内容
+            variables: 每个接收者一行的变量值（Template.bind() 的返回值）
+        """
+        self.job_id = uuid.uuid4().hex[:16]
+        self.action = action
+        self.content = content
+        self.recipients = tuple(recipients)
+        self.cursor = 0
+        self.created_at = time.time()
+        self.finished_at = None
+        self.sent = 0
+        self.failed = 0
+        self.callback_url = callback_url
+        self.tenant = tenant
+        self.expires_at = expires_at
+        self.cancelled = False
+        # 因取消或过期而跳过的接收者数量
+        self.skipped = 0
+        self.template = template
+        self.variables = variables
+        # 按接收者取消的接收者名称集合（出队时跳过），None 表示没有
+        self.cancelled_recipients = None
+        # 尚未取出的消息中按接收者取消的数量
+        self.cancelled_pending = 0
+
+    @property
+    def total(self):
+        """接收者总数"""
+        return len(self.recipients)
+
+    def remaining(self):
+        """
+        获取尚未取出的接收者数量
+
+        Returns:
+            int: 剩余接收者数量
+        """
+        return len(self.recipients) - self.cursor
+
+    def pending(self):
+        """
+        获取尚未取出、也未按接收者取消的接收者数量（需要实际发送的数量）
+
+        Returns:
+            int: 待发送接收者数量
+        """
+        return len(self.recipients) - self.cursor - self.cancelled_pending
+
+    def next_recipient(self):
+        """
+        取出下一个接收者并移动游标
+
+        Returns:
+            str: 接收者名称，已全部取出时返回 None
+        """
+        if self.cursor >= len(self.recipients):
+            return None
+        recipient = self.recipients[self.cursor]
+        self.cursor += 1
+        if self.cancelled_pending and recipient in self.cancelled_recipients:
+            self.cancelled_pending -= 1
+        return recipient
+
+    def content_for(self, index):
+        """
+        获取第 index 个接收者的消息内容（使用模板时在这里渲染）
+
+        Args:
+            index: 接收者下标
+
+        Returns:
+            str: 消息内容
+        """
+        if self.template is None:
+            return self.content
+        return self.template.render(self.recipients[index], self.variables[index])
+
+    def cancel_recipient(self, recipient):
+        """
+        取消发给某个接收者的消息（尚未取出的和已放回队列的消息都在出队时跳过）
+
+        Args:
+            recipient: 接收者名称
+
+        Returns:
+            int: 本次新取消的、尚未取出的消息数量（已取消过的接收者返回 0）
+        """
+        if self.cancelled_recipients is None:
+            self.cancelled_recipients = set()
+        elif recipient in self.cancelled_recipients:
+            return 0
+        self.cancelled_recipients.add(recipient)
+        count = self.recipients[self.cursor:].count(recipient)
+        self.cancelled_pending += count
+        return count
+
+    def is_recipient_cancelled(self, recipient):
+        """
+        判断发给某个接收者的消息是否已取消
+
+        Args:
+            recipient: 接收者名称
+
+        Returns:
+            bool: 已取消时返回 True
+        """
+        return self.cancelled_recipients is not None and recipient in self.cancelled_recipients
+
+    def is_expired(self, now):
+        """
+        判断任务是否已过期
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            bool: 设置了过期时间且已过期时返回 True
+        """
+        return self.expires_at is not None and now >= self.expires_at
+
+    def skip_remaining(self):
+        """
+        跳过所有尚未取出的接收者（把游标移到末尾，O(1)）
+
+        Returns:
+            int: 跳过的接收者数量
+        """
+        count = len(self.recipients) - self.cursor
+        self.cursor = len(self.recipients)
+        self.cancelled_pending = 0
+        self.record_skipped(count)
+        return count
+
+    def record_skipped(self, count=1):
+        """
+        记录因取消或过期而跳过的接收者
+
+        Args:
+            count: 跳过的数量
+        """
+        self.skipped += count
+        if self.is_finished() and self.finished_at is None:
+            self.finished_at = time.time()
+
+    def record_result(self, success):
+        """
+        记录一个接收者的发送结果
+
+        Args:
+            success: 是否发送成功
+        """
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        if self.is_finished():
+            self.finished_at = time.time()
+
+    def is_finished(self):
+        """
+        判断任务是否已全部处理完成
+
+        Returns:
+            bool: 所有接收者都已有发送结果（或已跳过）时返回 True
+        """
+        return self.sent + self.failed + self.skipped >= len(self.recipients)
+
+    def to_dict(self):
+        """
+        获取任务进度（用于状态查询）
+
+        Returns:
+            dict: 任务进度信息
+        """
+        return {
+            'job_id': self.job_id,
+            'action': self.action,
+            'tenant': self.tenant,
+            'template_id': self.template.template_id if self.template else None,
+            'total': len(self.recipients),
+            'dispatched': self.cursor,
+            'sent': self.sent,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'cancelled': self.cancelled,
+            'finished': self.is_finished(),
+            'created_at': self.created_at,
+            'expires_at': self.expires_at,
+            'finished_at': self.finished_at
+        }
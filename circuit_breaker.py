@@ -0,0 +1,116 @@
+"""
+熔断器模块
+微信窗口不可用（关闭、未登录）或界面操作连续失败时暂停发送，
+保留队列中的消息，按指数退避探测，恢复后自动继续发送
+"""
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 熔断器状态
+STATE_CLOSED = 'closed'        # 正常发送
+STATE_OPEN = 'open'            # 暂停发送，等待下一次探测
+STATE_HALF_OPEN = 'half_open'  # 正在探测是否恢复
+
+
+class CircuitBreaker:
+    """熔断器类，根据连续失败次数控制是否继续发送"""
+
+    def __init__(self, failure_threshold=3, base_backoff=5, max_backoff=300):
+        """
+        初始化熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后熔断
+            base_backoff: 第一次探测前的等待时间（秒）
+            max_backoff: 探测等待时间的上限（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.backoff = base_backoff
+        self.next_probe_at = 0
+        self.opened_at = None
+        self.trips = 0
+
+    def allow_request(self):
+        """
+        判断当前是否允许发送
+
+        熔断状态下到达探测时间后切换为半开状态，由调用方执行一次探测
+
+        Returns:
+            bool: 是否允许发送（或探测）
+        """
+        with self.lock:
+            if self.state == STATE_OPEN and time.time() >= self.next_probe_at:
+                self.state = STATE_HALF_OPEN
+                logger.info("熔断器进入半开状态，开始探测微信窗口")
+            return self.state != STATE_OPEN
+
+    def is_half_open(self):
+        """
+        判断是否处于半开（探测）状态
+
+        Returns:
+            bool: 是否处于半开状态
+        """
+        return self.state == STATE_HALF_OPEN
+
+    def record_success(self):
+        """记录一次成功，恢复正常发送"""
+        with self.lock:
+            if self.state != STATE_CLOSED:
+                logger.info("熔断器已恢复，继续发送消息")
+            self.state = STATE_CLOSED
+            self.consecutive_failures = 0
+            self.backoff = self.base_backoff
+            self.opened_at = None
+
+    def record_failure(self):
+        """记录一次失败，达到阈值或探测失败时熔断"""
+        with self.lock:
+            self.consecutive_failures += 1
+            now = time.time()
+
+            if self.state == STATE_HALF_OPEN:
+                # 探测失败，按当前等待时间再次探测，之后的等待时间加倍
+                self.state = STATE_OPEN
+                self.next_probe_at = now + self.backoff
+                logger.warning(f"熔断器探测失败，{self.backoff} 秒后再次探测")
+                self.backoff = min(self.backoff * 2, self.max_backoff)
+            elif self.state == STATE_CLOSED and self.consecutive_failures >= self.failure_threshold:
+                self.state = STATE_OPEN
+                self.backoff = self.base_backoff
+                self.next_probe_at = now + self.backoff
+                self.opened_at = now
+                self.trips += 1
+                logger.error(
+                    f"连续失败 {self.consecutive_failures} 次，熔断器打开，暂停发送，"
+                    f"{self.backoff} 秒后探测"
+                )
+
+    def get_status(self):
+        """
+        获取熔断器状态
+
+        Returns:
+            dict: 状态、连续失败次数和距离下一次探测的时间
+        """
+        with self.lock:
+            status = {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips,
+                'opened_at': self.opened_at,
+                'next_probe_in': None
+            }
+            if self.state == STATE_OPEN:
+                status['next_probe_in'] = round(max(0, self.next_probe_at - time.time()), 1)
+            return status
@@ -0,0 +1,241 @@
+"""
+联系人解析索引模块
+持久化记录每个联系人最近一次成功的查找策略、各策略的成功率和时间戳，
+让控制器优先尝试最可能成功的路径，并在冷却期内跳过已知失败的路径
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 查找策略名称
+STRATEGY_SESSION_LIST = 'session_list'
+STRATEGY_SEARCH = 'search'
+
+# 默认尝试顺序：会话列表更快，优先尝试
+DEFAULT_STRATEGIES = (STRATEGY_SESSION_LIST, STRATEGY_SEARCH)
+
+
+class ContactIndex:
+    """联系人解析索引类，记录每个联系人的查找策略成功情况"""
+
+    def __init__(self, index_file='contact_index.json', cooldown=600, save_interval=5):
+        """
+        初始化联系人解析索引
+
+        Args:
+            index_file: 索引持久化文件路径，None 表示只保存在内存中
+            cooldown: 策略失败后的冷却时间（秒），冷却期内跳过该策略
+            save_interval: 两次写盘之间的最小间隔（秒）
+        """
+        self.index_file = index_file
+        self.cooldown = cooldown
+        self.save_interval = save_interval
+        self.lock = threading.Lock()
+        self.entries = {}
+        self._dirty = False
+        self._last_save = 0
+
+        # 本次运行的命中统计
+        self.lookups = 0
+        self.first_try_hits = 0
+        self.misses = 0
+        self.skipped_attempts = 0
+        self.strategy_stats = {
+            name: {'attempts': 0, 'successes': 0} for name in DEFAULT_STRATEGIES
+        }
+
+        self._load()
+
+    def _load(self):
+        """从文件加载索引，文件不存在或损坏时从空索引开始"""
+        if not self.index_file or not os.path.exists(self.index_file):
+            return
+
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                self.entries = data
+            logger.info(f"已加载联系人解析索引: {len(self.entries)} 个联系人")
+        except Exception as e:
+            logger.warning(f"加载联系人解析索引失败，将使用空索引: {str(e)}")
+            self.entries = {}
+
+    def _new_entry(self):
+        """创建一个新的联系人索引条目"""
+        return {
+            'last_strategy': None,
+            'last_success_at': None,
+            'strategies': {
+                name: {
+                    'attempts': 0,
+                    'successes': 0,
+                    'last_success_at': None,
+                    'last_failure_at': None
+                } for name in DEFAULT_STRATEGIES
+            }
+        }
+
+    def _in_cooldown(self, strategy_entry, now):
+        """
+        判断策略是否处于冷却期（最近一次结果为失败且未超过冷却时间）
+
+        Args:
+            strategy_entry: 单个策略的统计条目
+            now: 当前时间戳
+
+        Returns:
+            bool: 是否处于冷却期
+        """
+        last_failure = strategy_entry.get('last_failure_at')
+        if not last_failure:
+            return False
+        last_success = strategy_entry.get('last_success_at') or 0
+        return last_failure > last_success and now - last_failure < self.cooldown
+
+    def plan(self, contact_name):
+        """
+        为联系人规划查找策略的尝试顺序
+
+        Args:
+            contact_name: 联系人名称
+
+        Returns:
+            list: 按优先级排列的策略名称列表（总是包含搜索框兜底策略）
+        """
+        with self.lock:
+            entry = self.entries.get(contact_name)
+            if not entry:
+                return list(DEFAULT_STRATEGIES)
+
+            # 上次成功的策略排在最前面，其余保持默认顺序
+            order = list(DEFAULT_STRATEGIES)
+            last_strategy = entry.get('last_strategy')
+            if last_strategy in order:
+                order.remove(last_strategy)
+                order.insert(0, last_strategy)
+
+            # 跳过冷却期内的策略；搜索框是兜底策略，始终保留
+            now = time.time()
+            strategies = entry.get('strategies', {})
+            available = [
+                name for name in order
+                if name == STRATEGY_SEARCH or not self._in_cooldown(strategies.get(name, {}), now)
+            ]
+
+            self.skipped_attempts += len(order) - len(available)
+            return available
+
+    def record_attempt(self, contact_name, strategy, success):
+        """
+        记录一次策略尝试的结果
+
+        Args:
+            contact_name: 联系人名称
+            strategy: 策略名称
+            success: 是否成功
+        """
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(contact_name)
+            if entry is None:
+                entry = self._new_entry()
+                self.entries[contact_name] = entry
+
+            strategy_entry = entry['strategies'].setdefault(strategy, {
+                'attempts': 0,
+                'successes': 0,
+                'last_success_at': None,
+                'last_failure_at': None
+            })
+            strategy_entry['attempts'] += 1
+
+            stats = self.strategy_stats.setdefault(strategy, {'attempts': 0, 'successes': 0})
+            stats['attempts'] += 1
+
+            if success:
+                strategy_entry['successes'] += 1
+                strategy_entry['last_success_at'] = now
+                entry['last_strategy'] = strategy
+                entry['last_success_at'] = now
+                stats['successes'] += 1
+            else:
+                strategy_entry['last_failure_at'] = now
+
+            self._dirty = True
+
+        self._maybe_save()
+
+    def record_lookup(self, resolved_strategy, attempts):
+        """
+        记录一次完整查找的结果（用于统计命中率）
+
+        Args:
+            resolved_strategy: 最终成功的策略名称，失败为 None
+            attempts: 本次查找共尝试的策略数量
+        """
+        with self.lock:
+            self.lookups += 1
+            if resolved_strategy is None:
+                self.misses += 1
+            elif attempts == 1:
+                self.first_try_hits += 1
+
+    def get_stats(self):
+        """
+        获取索引命中统计
+
+        Returns:
+            dict: 命中率等统计信息
+        """
+        with self.lock:
+            strategies = {}
+            for name, stats in self.strategy_stats.items():
+                attempts = stats['attempts']
+                strategies[name] = {
+                    'attempts': attempts,
+                    'successes': stats['successes'],
+                    'hit_ratio': round(stats['successes'] / attempts, 4) if attempts else None
+                }
+
+            return {
+                'contacts': len(self.entries),
+                'lookups': self.lookups,
+                'first_try_hits': self.first_try_hits,
+                'first_try_hit_ratio': round(self.first_try_hits / self.lookups, 4) if self.lookups else None,
+                'misses': self.misses,
+                'skipped_attempts': self.skipped_attempts,
+                'strategies': strategies
+            }
+
+    def _maybe_save(self):
+        """距离上次写盘超过 save_interval 时保存索引"""
+        if time.time() - self._last_save >= self.save_interval:
+            self.save()
+
+    def save(self):
+        """将索引写入文件（先写临时文件再替换，避免写入中断导致文件损坏）"""
+        if not self.index_file:
+            return
+
+        with self.lock:
+            if not self._dirty:
+                return
+            data = json.dumps(self.entries, ensure_ascii=False)
+            self._dirty = False
+            self._last_save = time.time()
+
+        try:
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(data)
+            os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            logger.warning(f"保存联系人解析索引失败: {str(e)}")
+            with self.lock:
+                self._dirty = True
@@ -0,0 +1,169 @@
+"""
+事件总线模块
+把队列和发送事件（入队、开始发送、发送成功、发送失败）推送给订阅者，
+每个订阅者有独立的有界缓冲区；消费过慢、缓冲区写满的订阅者会被断开，
+发布事件永远不会阻塞消息处理线程
+"""
+import collections
+import itertools
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class Subscriber:
+    """事件订阅者，持有一个有界缓冲区"""
+
+    def __init__(self, max_buffer):
+        """
+        初始化订阅者
+
+        Args:
+            max_buffer: 缓冲区最多保存的事件数量
+        """
+        self.max_buffer = max_buffer
+        self.buffer = collections.deque()
+        self.condition = threading.Condition()
+        # 因消费过慢被断开时置为 True
+        self.dropped = False
+        self.closed = False
+
+    def offer(self, event):
+        """
+        放入一个事件（不阻塞）
+
+        Args:
+            event: 事件字典
+
+        Returns:
+            bool: 缓冲区已满时返回 False
+        """
+        with self.condition:
+            if len(self.buffer) >= self.max_buffer:
+                return False
+            self.buffer.append(event)
+            self.condition.notify()
+            return True
+
+    def drain(self, timeout):
+        """
+        取出缓冲区中的全部事件，缓冲区为空时最多等待 timeout 秒
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            list: 事件列表
+        """
+        with self.condition:
+            if not self.buffer and not self.closed:
+                self.condition.wait(timeout)
+            events = list(self.buffer)
+            self.buffer.clear()
+            return events
+
+    def close(self, dropped=False):
+        """
+        关闭订阅者，唤醒正在等待的读取方
+
+        Args:
+            dropped: 是否因消费过慢被断开
+        """
+        with self.condition:
+            self.dropped = dropped
+            self.closed = True
+            self.condition.notify_all()
+
+
+class EventBus:
+    """事件总线类，向所有订阅者广播事件"""
+
+    def __init__(self, max_buffer=1000, max_subscribers=20):
+        """
+        初始化事件总线
+
+        Args:
+            max_buffer: 每个订阅者缓冲区的最大事件数量
+            max_subscribers: 最多允许的同时订阅数
+        """
+        self.max_buffer = max_buffer
+        self.max_subscribers = max_subscribers
+        self.lock = threading.Lock()
+        self.subscribers = []
+        self._sequence = itertools.count(1)
+        self.published = 0
+        self.dropped_subscribers = 0
+
+    def subscribe(self):
+        """
+        新增一个订阅者
+
+        Returns:
+            Subscriber: 订阅者，超过最大订阅数时返回 None
+        """
+        with self.lock:
+            if len(self.subscribers) >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(self.max_buffer)
+            self.subscribers.append(subscriber)
+            return subscriber
+
+    def unsubscribe(self, subscriber):
+        """
+        移除订阅者
+
+        Args:
+            subscriber: 订阅者
+        """
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+        subscriber.close(dropped=subscriber.dropped)
+
+    def publish(self, event_type, data):
+        """
+        发布事件（不阻塞；缓冲区写满的订阅者会被断开）
+
+        Args:
+            event_type: 事件类型
+            data: 事件数据字典
+        """
+        # 没有订阅者时直接返回，不产生任何额外开销
+        if not self.subscribers:
+            return
+
+        event = {
+            'id': next(self._sequence),
+            'type': event_type,
+            'time': time.time(),
+            'data': data
+        }
+        self.published += 1
+
+        with self.lock:
+            subscribers = list(self.subscribers)
+
+        for subscriber in subscribers:
+            if not subscriber.offer(event):
+                logger.warning("事件订阅者消费过慢，缓冲区已满，断开该订阅者")
+                self.dropped_subscribers += 1
+                with self.lock:
+                    if subscriber in self.subscribers:
+                        self.subscribers.remove(subscriber)
+                subscriber.close(dropped=True)
+
+    def get_stats(self):
+        """
+        获取事件总线统计
+
+        Returns:
+            dict: 订阅者数量、已发布事件数和被断开的订阅者数
+        """
+        return {
+            'subscribers': len(self.subscribers),
+            'published': self.published,
+            'dropped_subscribers': self.dropped_subscribers
+        }
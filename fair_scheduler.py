@@ -0,0 +1,304 @@
+"""
+公平调度模块
+每个租户（API token）有独立的任务队列，后台线程按赤字轮询（Deficit Round Robin）
+在租户之间挑选下一个接收者：权重为 2 的租户每轮发送 2 条，权重为 1 的发送 1 条，
+某个租户的大批量群发不会让其他租户的少量消息一直排在后面
+
+本模块不加锁，由 MessageQueue 在自己的条件变量保护下调用
+"""
+import collections
+import time
+
+# 未配置多租户时使用的租户名称
+DEFAULT_TENANT = 'default'
+
+# 统计吞吐量的时间窗口（秒）
+THROUGHPUT_WINDOW = 60
+
+
+class TenantState:
+    """单个租户的队列和统计"""
+
+    __slots__ = (
+        'name', 'weight', 'quota', 'jobs', 'deficit', 'active',
+        'pending', 'enqueued', 'sent', 'failed', 'rejected', 'completions'
+    )
+
+    def __init__(self, name, weight=1, quota=None):
+        """
+        初始化租户
+
+        Args:
+            name: 租户名称
+            weight: 调度权重，每轮可发送的接收者数量（可以是小数）
+            quota: 队列中最多允许的待发送接收者数量，None 表示不限制
+        """
+        self.name = name
+        self.weight = weight
+        self.quota = quota
+        self.jobs = collections.deque()
+        self.deficit = 0
+        self.active = False
+        self.pending = 0
+        self.enqueued = 0
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        # 最近完成发送的时间（用于统计每分钟吞吐量）
+        self.completions = collections.deque()
+
+    def throughput_per_min(self, now):
+        """
+        统计最近一分钟完成的接收者数量
+
+        Args:
+            now: 当前时间
+
+        Returns:
+            int: 最近一分钟完成的数量
+        """
+        while self.completions and now - self.completions[0] > THROUGHPUT_WINDOW:
+            self.completions.popleft()
+        return len(self.completions)
+
+
+class FairScheduler:
+    """加权公平调度类，使用赤字轮询在租户之间分配发送机会"""
+
+    def __init__(self, tenants=None):
+        """
+        初始化调度器
+
+        Args:
+            tenants: 租户配置列表，每项为 {'name': ..., 'weight': ..., 'quota': ...}
+        """
+        self.tenants = collections.OrderedDict()
+        # 有待发送任务的租户，按轮询顺序排列
+        self.active = collections.deque()
+        for tenant in tenants or []:
+            self.add_tenant(tenant['name'], tenant.get('weight', 1), tenant.get('quota'))
+
+    def add_tenant(self, name, weight=1, quota=None):
+        """
+        添加（或更新）租户
+
+        Args:
+            name: 租户名称
+            weight: 调度权重
+            quota: 待发送接收者数量上限，None 表示不限制
+
+        Returns:
+            TenantState: 租户状态
+        """
+        state = self.tenants.get(name)
+        if state is None:
+            state = TenantState(name, weight, quota)
+            self.tenants[name] = state
+        else:
+            state.weight = weight
+            state.quota = quota
+        return state
+
+    def _get_tenant(self, name):
+        """获取租户，未配置的租户按权重 1、不限配额自动创建"""
+        state = self.tenants.get(name)
+        if state is None:
+            state = self.add_tenant(name)
+        return state
+
+    def has_capacity(self, name, count):
+        """
+        检查租户是否还能加入 count 个接收者
+
+        Args:
+            name: 租户名称
+            count: 接收者数量
+
+        Returns:
+            bool: 未超出配额时返回 True
+        """
+        state = self._get_tenant(name)
+        if state.quota is not None and state.pending + count > state.quota:
+            state.rejected += count
+            return False
+        return True
+
+    def push(self, name, job):
+        """
+        把群发任务加入租户队列
+
+        Args:
+            name: 租户名称
+            job: 群发任务（BroadcastJob）
+        """
+        state = self._get_tenant(name)
+        state.jobs.append(job)
+        state.pending += job.remaining()
+        state.enqueued += job.total
+        if not state.active:
+            state.active = True
+            state.deficit = 0
+            self.active.append(state)
+
+    def _deactivate(self, state):
+        """租户队列已空：移出轮询并清零赤字（空闲期间不积累发送机会）"""
+        state.active = False
+        state.deficit = 0
+        self.active.remove(state)
+
+    def pop(self):
+        """
+        按赤字轮询取出下一个接收者
+
+        Returns:
+            tuple: (群发任务, 接收者)，所有租户都没有待发送任务时返回 None
+        """
+        while self.active:
+            state = self.active[0]
+            if not state.jobs:
+                self._deactivate(state)
+                continue
+
+            if state.deficit < 1:
+                # 轮到该租户，补充本轮的发送机会
+                state.deficit += state.weight
+                if state.deficit < 1:
+                    self.active.rotate(-1)
+                    continue
+
+            job = state.jobs[0]
+            recipient = job.next_recipient()
+            if job.remaining() == 0:
+                state.jobs.popleft()
+            if recipient is None:
+                continue
+
+            state.deficit -= 1
+            # 按接收者取消的消息在取消时已从待发送数量中扣除
+            if not job.is_recipient_cancelled(recipient):
+                state.pending -= 1
+            if not state.jobs:
+                self._deactivate(state)
+            elif state.deficit < 1:
+                self.active.rotate(-1)
+            return job, recipient
+
+        return None
+
+    def remove_pending(self, name, count):
+        """
+        从租户待发送数量中扣除（任务被取消或过期时使用）
+
+        任务本身留在租户队列中，游标已移到末尾，轮到它时直接出队
+
+        Args:
+            name: 租户名称
+            count: 扣除的接收者数量
+        """
+        state = self._get_tenant(name)
+        state.pending = max(0, state.pending - count)
+
+    def cancel_recipient(self, recipient, name=None):
+        """
+        取消队列中发给某个接收者的消息，立即从待发送数量中扣除（消息在出队时跳过）
+
+        Args:
+            recipient: 接收者名称
+            name: 只取消该租户的消息，None 表示所有租户
+
+        Returns:
+            int: 取消的消息数量
+        """
+        states = [self._get_tenant(name)] if name is not None else list(self.tenants.values())
+        count = 0
+        for state in states:
+            for job in state.jobs:
+                cancelled = job.cancel_recipient(recipient)
+                state.pending -= cancelled
+                count += cancelled
+        return count
+
+    def estimate_delay(self, name, job, cost):
+        """
+        估计距离任务开始发送和全部发送完成还需要的时间（按赤字轮询的权重近似）
+
+        本租户排在该任务前面的接收者发送期间，其他租户按权重比例分走发送机会，
+        但分走的时间不超过它们自己的积压
+
+        Args:
+            name: 租户名称
+            job: 群发任务
+            cost: 函数，参数为群发任务，返回该任务每个接收者的预期耗时（秒）
+
+        Returns:
+            tuple: (开始前的秒数, 完成前的秒数)
+        """
+        state = self._get_tenant(name)
+        ahead = 0.0
+        queued_jobs = state.jobs if job in state.jobs else ()
+        for queued in queued_jobs:
+            if queued is job:
+                break
+            ahead += queued.pending() * cost(queued)
+        own = job.pending() * cost(job)
+        others = [
+            (other.weight / state.weight, sum(queued.pending() * cost(queued) for queued in other.jobs))
+            for other in self.active if other is not state
+        ]
+
+        def elapsed(work):
+            return work + sum(min(backlog, work * ratio) for ratio, backlog in others)
+
+        return elapsed(ahead), elapsed(ahead + own)
+
+    def pending_work(self, cost):
+        """
+        统计各租户积压的预期发送时间
+
+        Args:
+            cost: 函数，参数为群发任务，返回该任务每个接收者的预期耗时（秒）
+
+        Returns:
+            dict: 租户名称 -> 积压时间（秒），只包含有待发送任务的租户
+        """
+        return {
+            state.name: sum(job.pending() * cost(job) for job in state.jobs)
+            for state in self.active
+        }
+
+    def record_result(self, name, success):
+        """
+        记录租户的一个发送结果
+
+        Args:
+            name: 租户名称
+            success: 是否发送成功
+        """
+        state = self._get_tenant(name)
+        if success:
+            state.sent += 1
+        else:
+            state.failed += 1
+        state.completions.append(time.time())
+
+    def get_stats(self):
+        """
+        获取各租户的统计
+
+        Returns:
+            dict: 租户名称 -> 权重、配额、待发送数量和吞吐量
+        """
+        now = time.time()
+        return {
+            state.name: {
+                'weight': state.weight,
+                'quota': state.quota,
+                'pending': state.pending,
+                'enqueued': state.enqueued,
+                'sent': state.sent,
+                'failed': state.failed,
+                'rejected': state.rejected,
+                'throughput_per_min': state.throughput_per_min(now)
+            }
+            for state in self.tenants.values()
+        }
@@ -0,0 +1,451 @@
+"""
+文件缓存模块
+sendfile 使用的有界磁盘缓存：按块流式下载文件（不解码），边下载边计算 SHA-256，
+同一内容只保存一份（不同 URL 指向同一文件时只占一份空间），总大小超过上限时按最近最少使用淘汰
+
+群发文件时在入队时由后台线程预先下载，处理线程取到消息时文件通常已在缓存中；
+同一 URL 同时只下载一次，其他调用方等待这次下载完成
+
+正在发送的文件（已作为文件引用放入剪贴板，微信可能仍在读取）通过 fetch(pin=True) 固定，
+unpin() 之前不会被淘汰；缓存目录中的文件被外部删除（如清理临时目录）时会重新下载
+
+缓存目录结构:
+    <cache_dir>/<sha256>/<原始文件名>    （粘贴到微信时显示原始文件名）
+"""
+import collections
+import concurrent.futures
+import hashlib
+import itertools
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import logging
+from urllib.parse import unquote, urlparse
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# fetch() 的默认最长耗时（秒），包括等待其他线程下载和在当前线程下载
+DEFAULT_FETCH_TIMEOUT = 600
+
+# 文件名中不允许出现的字符（Windows）
+INVALID_NAME_CHARS = re.compile(r'[\\/:*?"<>|\x00-\x1f]')
+# SHA-256 目录名
+DIGEST_DIR = re.compile(r'^[0-9a-f]{64}$')
+
+
+def guess_file_name(url, response=None):
+    """
+    根据 Content-Disposition 或 URL 路径确定文件名
+
+    Args:
+        url: 文件 URL
+        response: HTTP 响应，None 表示只根据 URL 判断
+
+    Returns:
+        str: 可用作 Windows 文件名的名称
+    """
+    name = None
+    disposition = response.headers.get('content-disposition', '') if response is not None else ''
+    match = re.search(r"filename\*=(?:UTF-8|utf-8)''([^;]+)", disposition)
+    if match:
+        name = unquote(match.group(1).strip())
+    else:
+        match = re.search(r'filename="?([^";]+)"?', disposition)
+        if match:
+            name = match.group(1).strip()
+    if not name:
+        name = unquote(os.path.basename(urlparse(url).path))
+
+    name = INVALID_NAME_CHARS.sub('_', name).strip(' .')
+    if len(name) > 100:
+        stem, ext = os.path.splitext(name)
+        name = stem[:100 - len(ext)] + ext
+    return name or 'file'
+
+
+class FileCache:
+    """有界文件缓存类，线程安全"""
+
+    def __init__(self, cache_dir=None, max_bytes=1024 * MB, max_file_bytes=100 * MB,
+                 prefetch_workers=2, chunk_size=256 * 1024):
+        """
+        初始化文件缓存（会加载缓存目录中已有的文件）
+
+        Args:
+            cache_dir: 缓存目录，None 表示系统临时目录下的 wechat_file_cache
+            max_bytes: 缓存总大小上限（字节）
+            max_file_bytes: 单个文件大小上限（字节），超过时放弃下载
+            prefetch_workers: 后台预先下载的线程数
+            chunk_size: 流式下载的块大小（字节）
+        """
+        self.cache_dir = cache_dir or os.path.join(tempfile.gettempdir(), 'wechat_file_cache')
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        self.prefetch_workers = prefetch_workers
+        self.chunk_size = chunk_size
+        self.lock = threading.Lock()
+        # SHA-256 -> (文件路径, 大小)，按最近使用排序（最近使用的在末尾）
+        self.entries = collections.OrderedDict()
+        # URL -> SHA-256
+        self.urls = {}
+        # 正在下载的 URL -> 下载完成事件
+        self.inflight = {}
+        # 正在使用（不能淘汰）的 SHA-256 -> 引用计数
+        self.pins = {}
+        self.total_bytes = 0
+        self.executor = None
+        # 首次下载时才创建（延迟导入 requests，HTTP 服务启动时不需要加载）
+        self.http_session = None
+        self.hits = 0
+        self.downloads = 0
+        self.dedupes = 0
+        self.evictions = 0
+        self.failures = 0
+        self.prefetches = 0
+        self.bytes_downloaded = 0
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        """加载缓存目录中已有的文件（URL 映射不持久化，重新下载后按内容去重），删除未完成的临时文件"""
+        found = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            try:
+                if name.endswith('.part'):
+                    os.remove(path)
+                elif DIGEST_DIR.match(name) and os.path.isdir(path):
+                    files = os.listdir(path)
+                    if len(files) == 1:
+                        file_path = os.path.join(path, files[0])
+                        found.append((os.path.getmtime(file_path), name, file_path, os.path.getsize(file_path)))
+                    else:
+                        shutil.rmtree(path, ignore_errors=True)
+            except OSError as e:
+                logger.warning(f"加载缓存文件失败: {path}, {str(e)}")
+
+        with self.lock:
+            for _, digest, file_path, size in sorted(found):
+                self.entries[digest] = (file_path, size)
+                self.total_bytes += size
+            self._evict()
+        if found:
+            logger.info(f"已加载文件缓存: {len(self.entries)} 个文件, {self.total_bytes // MB} MB")
+
+    def _drop(self, digest):
+        """
+        从索引中移除一个缓存文件（不删除磁盘文件，调用方持有锁）
+
+        Args:
+            digest: 文件内容的 SHA-256
+        """
+        _, size = self.entries.pop(digest)
+        self.total_bytes -= size
+        for url in [url for url, value in self.urls.items() if value == digest]:
+            del self.urls[url]
+
+    def _find(self, url):
+        """
+        查找 URL 对应的缓存条目，文件已被外部删除时移除该条目（调用方持有锁）
+
+        Args:
+            url: 文件 URL
+
+        Returns:
+            str: 文件内容的 SHA-256，未缓存时返回 None
+        """
+        digest = self.urls.get(url)
+        if digest is None or digest not in self.entries:
+            return None
+        if not os.path.exists(self.entries[digest][0]):
+            logger.warning(f"缓存文件已被删除，将重新下载: {self.entries[digest][0]}")
+            self._drop(digest)
+            return None
+        return digest
+
+    def _lookup(self, url, pin=False):
+        """
+        查找已缓存的 URL（调用方持有锁）
+
+        Args:
+            url: 文件 URL
+            pin: 是否固定该文件（unpin() 之前不会被淘汰）
+
+        Returns:
+            str: 缓存文件路径，未缓存时返回 None
+        """
+        digest = self._find(url)
+        if digest is None:
+            return None
+        self.entries.move_to_end(digest)
+        if pin:
+            self.pins[digest] = self.pins.get(digest, 0) + 1
+        return self.entries[digest][0]
+
+    def is_cached(self, url):
+        """
+        判断 URL 对应的文件是否已在缓存中（不更新最近使用顺序）
+
+        Args:
+            url: 文件 URL
+
+        Returns:
+            bool: 已缓存时返回 True
+        """
+        with self.lock:
+            return self._find(url) is not None
+
+    def fetch(self, url, timeout=DEFAULT_FETCH_TIMEOUT, pin=False):
+        """
+        获取文件的本地路径（已缓存时直接返回，正在下载时等待，否则在当前线程下载）
+
+        Args:
+            url: 文件 URL
+            timeout: 最长耗时（秒），包括等待其他线程下载和在当前线程下载
+            pin: 是否固定该文件，发送结束后必须调用 unpin()
+
+        Returns:
+            str: 缓存文件路径，下载失败或超时返回 None
+        """
+        deadline = time.time() + timeout
+        with self.lock:
+            path = self._lookup(url, pin)
+            if path is not None:
+                self.hits += 1
+                return path
+            event = self.inflight.get(url)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self.inflight[url] = event
+
+        if not owner:
+            event.wait(timeout)
+            with self.lock:
+                path = self._lookup(url, pin)
+                if path is not None:
+                    self.hits += 1
+                return path
+
+        try:
+            return self._download(url, deadline, pin)
+        finally:
+            with self.lock:
+                self.inflight.pop(url, None)
+            event.set()
+
+    def unpin(self, path):
+        """
+        取消固定 fetch(pin=True) 返回的文件，之后可以被淘汰
+
+        Args:
+            path: 缓存文件路径
+        """
+        digest = os.path.basename(os.path.dirname(path))
+        with self.lock:
+            count = self.pins.get(digest, 0) - 1
+            if count > 0:
+                self.pins[digest] = count
+            else:
+                self.pins.pop(digest, None)
+                self._evict()
+
+    def prefetch(self, url):
+        """
+        在后台线程中预先下载文件（不阻塞调用方）
+
+        Args:
+            url: 文件 URL
+        """
+        with self.lock:
+            if self._lookup(url) is not None or url in self.inflight:
+                return
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.prefetch_workers,
+                    thread_name_prefix='file-prefetch'
+                )
+            self.prefetches += 1
+        self.executor.submit(self.fetch, url)
+
+    def _get_http_session(self):
+        """
+        获取下载用的 HTTP 会话（首次调用时创建）
+
+        Returns:
+            requests.Session: HTTP 会话
+        """
+        with self.lock:
+            if self.http_session is None:
+                import requests
+                self.http_session = requests.Session()
+                self.http_session.headers['User-Agent'] = (
+                    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+                )
+            return self.http_session
+
+    def _download(self, url, deadline=None, pin=False, max_retries=3):
+        """
+        流式下载文件到缓存（边下载边计算 SHA-256，带重试机制）
+
+        Args:
+            url: 文件 URL
+            deadline: 下载截止时间（时间戳），超过时放弃，None 表示不限制
+            pin: 是否固定下载完成的文件
+            max_retries: 最大重试次数
+
+        Returns:
+            str: 缓存文件路径，失败返回 None
+        """
+        import requests
+        http_session = self._get_http_session()
+        logger.info(f"开始下载文件: {url}")
+        last_error = None
+        for attempt in range(max_retries):
+            temp = tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.part', delete=False)
+            try:
+                digest = hashlib.sha256()
+                size = 0
+                with temp:
+                    with http_session.get(url, stream=True, timeout=(10, 60)) as response:
+                        response.raise_for_status()
+                        length = int(response.headers.get('content-length') or 0)
+                        if length > self.max_file_bytes:
+                            raise ValueError(f"文件大小 {length} 字节超过上限 {self.max_file_bytes} 字节")
+                        name = guess_file_name(url, response)
+                        for chunk in response.iter_content(self.chunk_size):
+                            size += len(chunk)
+                            if size > self.max_file_bytes:
+                                raise ValueError(f"文件大小超过上限 {self.max_file_bytes} 字节")
+                            if deadline is not None and time.time() > deadline:
+                                raise ValueError("下载超时")
+                            digest.update(chunk)
+                            temp.write(chunk)
+                if size == 0:
+                    raise ValueError("文件内容为空")
+                path = self._store(url, digest.hexdigest(), temp.name, name, size, pin)
+                logger.info(f"文件已缓存: {path} ({size} 字节)")
+                return path
+            except requests.RequestException as e:
+                last_error = e
+                self._remove(temp.name)
+                # 4xx 错误重试也不会成功
+                status = getattr(e.response, 'status_code', None)
+                if status is not None and 400 <= status < 500:
+                    break
+                if deadline is not None and time.time() + 1 > deadline:
+                    break
+                if attempt < max_retries - 1:
+                    logger.warning(f"下载文件失败: {e}，重试中... (尝试 {attempt + 1}/{max_retries})")
+                    time.sleep(1)
+            except Exception as e:
+                last_error = e
+                self._remove(temp.name)
+                break
+
+        with self.lock:
+            self.failures += 1
+        logger.error(f"下载文件失败: {url}, {last_error}")
+        return None
+
+    def _store(self, url, digest, temp_path, name, size, pin=False):
+        """
+        把下载完成的临时文件放入缓存（同一内容已存在时丢弃临时文件）
+
+        Args:
+            url: 文件 URL
+            digest: 文件内容的 SHA-256
+            temp_path: 临时文件路径
+            name: 文件名
+            size: 文件大小（字节）
+            pin: 是否固定该文件
+
+        Returns:
+            str: 缓存文件路径
+        """
+        with self.lock:
+            self.downloads += 1
+            self.bytes_downloaded += size
+            if pin:
+                self.pins[digest] = self.pins.get(digest, 0) + 1
+            if digest in self.entries:
+                if os.path.exists(self.entries[digest][0]):
+                    self.urls[url] = digest
+                    self.dedupes += 1
+                    self._remove(temp_path)
+                    self.entries.move_to_end(digest)
+                    return self.entries[digest][0]
+                # 已缓存的文件被外部删除，用新下载的文件替换
+                self._drop(digest)
+
+            directory = os.path.join(self.cache_dir, digest)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, name)
+            os.replace(temp_path, path)
+            self.urls[url] = digest
+            self.entries[digest] = (path, size)
+            self.total_bytes += size
+            self._evict()
+            return path
+
+    def _evict(self):
+        """
+        淘汰最近最少使用的文件，直到总大小不超过上限
+        （始终保留最近使用的文件，跳过正在使用的文件，调用方持有锁）
+        """
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            candidates = itertools.islice(self.entries, len(self.entries) - 1)
+            digest = next((digest for digest in candidates if digest not in self.pins), None)
+            if digest is None:
+                break
+            path = self.entries[digest][0]
+            self._drop(digest)
+            self.evictions += 1
+            shutil.rmtree(os.path.dirname(path), ignore_errors=True)
+            logger.info(f"淘汰缓存文件: {path}")
+
+    def _remove(self, path):
+        """
+        删除文件（忽略错误）
+
+        Args:
+            path: 文件路径
+        """
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def shutdown(self):
+        """停止后台预先下载线程（不等待正在进行的下载）"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def get_stats(self):
+        """
+        获取缓存统计
+
+        Returns:
+            dict: 文件数量、占用空间和命中、下载、去重、淘汰次数
+        """
+        with self.lock:
+            return {
+                'files': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'downloads': self.downloads,
+                'dedupes': self.dedupes,
+                'evictions': self.evictions,
+                'failures': self.failures,
+                'prefetches': self.prefetches,
+                'downloading': len(self.inflight),
+                'bytes_downloaded': self.bytes_downloaded
+            }
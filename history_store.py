@@ -0,0 +1,359 @@
+"""
+发送历史模块
+把每个接收者的发送结果写入 SQLite（WAL 模式），按接收者、时间、任务和租户建立索引，
+用于回答"昨天 X 群有没有收到 Y 消息"这类问题，不必再搜索多 GB 的日志文件
+
+处理线程只把结果放入有界队列（不阻塞），由写入线程攒批后在一个事务中批量插入；
+写入线程定期按保留天数分批删除过期记录，并增量回收空闲页（incremental_vacuum）
+
+查询按 id 倒序，使用 before_id 游标分页（不使用 OFFSET），翻到多深都只需走索引；
+写入线程插入时保证 ts 不早于上一条记录（被替换的处理线程、重新入队的消息可能晚到），
+id 与 ts 严格同序，时间范围先通过时间索引换算成 id 范围，
+与接收者、任务、租户索引（索引末尾隐含 id）组合时仍是一次索引范围扫描
+"""
+import hashlib
+import queue
+import sqlite3
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    job_id TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    action TEXT NOT NULL,
+    success INTEGER NOT NULL,
+    failure_reason TEXT,
+    content_hash TEXT NOT NULL,
+    content TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    queued_at REAL NOT NULL,
+    send_ms REAL
+);
+CREATE INDEX IF NOT EXISTS idx_history_recipient ON history (recipient);
+CREATE INDEX IF NOT EXISTS idx_history_ts ON history (ts);
+CREATE INDEX IF NOT EXISTS idx_history_job ON history (job_id);
+CREATE INDEX IF NOT EXISTS idx_history_tenant ON history (tenant);
+"""
+
+COLUMNS = (
+    'id', 'ts', 'job_id', 'tenant', 'recipient', 'action', 'success', 'failure_reason',
+    'content_hash', 'content', 'attempts', 'queued_at', 'send_ms'
+)
+
+# 每次删除过期记录的最大行数（分批删除，避免长时间占用写锁）
+DELETE_CHUNK = 5000
+
+
+def content_digest(content):
+    """
+    计算消息内容的摘要（用于按完整内容精确查询）
+
+    Args:
+        content: 消息内容
+
+    Returns:
+        str: 摘要（16 个十六进制字符）
+    """
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+
+
+class HistoryStore:
+    """发送历史类，异步批量写入、按索引查询"""
+
+    def __init__(self, db_file='history.db', max_queue_size=100000, batch_size=500, flush_interval=1.0,
+                 retention_days=90, maintenance_interval=3600, content_max_chars=200):
+        """
+        初始化发送历史（会创建数据库文件和索引）
+
+        Args:
+            db_file: SQLite 数据库文件
+            max_queue_size: 待写入结果的最大数量，队列满时丢弃新结果
+            batch_size: 每个事务最多写入的结果数量
+            flush_interval: 攒批的最长等待时间（秒）
+            retention_days: 历史保留天数，0 表示永久保留
+            maintenance_interval: 清理过期记录和回收空间的间隔（秒）
+            content_max_chars: 保存的消息内容最大字符数（完整内容只保存摘要）
+        """
+        self.db_file = db_file
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retention_days = retention_days
+        self.maintenance_interval = maintenance_interval
+        self.content_max_chars = content_max_chars
+        self.worker_thread = None
+        self.running = False
+        self._last_maintenance = 0
+
+        # 统计信息
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+        self.purged = 0
+
+        # 写入连接只在写入线程中使用，查询使用单独的连接（WAL 模式下读写互不阻塞）
+        self.read_lock = threading.Lock()
+        connection = self._connect()
+        with connection:
+            connection.executescript(SCHEMA)
+        connection.close()
+        self.read_connection = self._connect()
+
+    def _connect(self):
+        """
+        打开数据库连接
+
+        Returns:
+            sqlite3.Connection: 数据库连接
+        """
+        connection = sqlite3.connect(self.db_file, timeout=10, check_same_thread=False)
+        # auto_vacuum 只能在建表前设置，之后的连接上设置不生效
+        connection.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        connection.execute('PRAGMA journal_mode = WAL')
+        connection.execute('PRAGMA synchronous = NORMAL')
+        return connection
+
+    def start(self):
+        """启动写入线程"""
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            return
+
+        self.running = True
+        self.worker_thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self.worker_thread.start()
+        logger.info(f"发送历史写入线程已启动: {self.db_file}")
+
+    def stop(self, timeout=5):
+        """
+        停止写入线程（会先写入队列中剩余的结果）
+
+        Args:
+            timeout: 等待线程退出的最长时间（秒）
+        """
+        self.running = False
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout=timeout)
+        logger.info("发送历史写入线程已停止")
+
+    def record(self, finished_at, job_id, tenant, recipient, action, success, failure_reason, content,
+               attempts, queued_at, send_ms):
+        """
+        提交一个发送结果（不阻塞）
+
+        Args:
+            finished_at: 发送完成时间（时间戳，早于已写入的记录时按已写入的最大时间保存）
+            job_id: 任务编号
+            tenant: 租户名称
+            recipient: 接收者
+            action: 消息类型
+            success: 是否发送成功
+            failure_reason: 失败原因，成功时为 None
+            content: 实际发送的内容（文本、图片 URL 或文件 URL）
+            attempts: 尝试次数
+            queued_at: 入队时间（时间戳）
+            send_ms: 发送耗时（毫秒）
+
+        Returns:
+            bool: 是否成功加入待写入队列（队列满时返回 False）
+        """
+        row = (
+            finished_at, job_id, tenant, recipient, action, int(success), failure_reason,
+            content_digest(content), content[:self.content_max_chars], attempts, queued_at, send_ms
+        )
+        try:
+            self.queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _collect_batch(self):
+        """
+        攒一批待写入的结果：数量达到 batch_size 或等待超过 flush_interval 即返回
+
+        Returns:
+            list: 行元组列表，可能为空
+        """
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _maintain(self, connection):
+        """
+        按保留天数分批删除过期记录，并增量回收空闲页
+
+        Args:
+            connection: 写入连接
+        """
+        self._last_maintenance = time.time()
+        if not self.retention_days:
+            return
+
+        cutoff = time.time() - self.retention_days * 86400
+        purged = 0
+        while True:
+            with connection:
+                cursor = connection.execute(
+                    'DELETE FROM history WHERE id IN (SELECT id FROM history WHERE ts < ? ORDER BY ts LIMIT ?)',
+                    (cutoff, DELETE_CHUNK)
+                )
+            purged += cursor.rowcount
+            if cursor.rowcount < DELETE_CHUNK:
+                break
+        if purged:
+            # execute() 只执行一步（只回收一页），executescript() 会执行到结束；
+            # 之后截断 WAL 文件，回收的空间才会还给文件系统
+            connection.executescript('PRAGMA incremental_vacuum;')
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            self.purged += purged
+            logger.info(f"已清理过期发送历史: {purged} 条（保留 {self.retention_days} 天）")
+        connection.execute('PRAGMA optimize')
+
+    def _order_batch(self, batch, last_ts):
+        """
+        保证插入顺序与 ts 顺序一致：晚到的结果（完成时间早于已写入的记录）的 ts 取已写入的最大值
+
+        Args:
+            batch: 行元组列表（第一个字段为完成时间）
+            last_ts: 已写入记录的最大 ts，没有记录时为 None
+
+        Returns:
+            tuple: (调整后的行元组列表, 新的最大 ts)
+        """
+        ordered = []
+        for row in batch:
+            if last_ts is not None and row[0] < last_ts:
+                row = (last_ts,) + row[1:]
+            last_ts = row[0]
+            ordered.append(row)
+        return ordered, last_ts
+
+    def _run(self):
+        """写入线程：攒批后在一个事务中批量插入，定期清理过期记录"""
+        connection = self._connect()
+        last_ts = connection.execute('SELECT MAX(ts) FROM history').fetchone()[0]
+        insert = (
+            'INSERT INTO history (ts, job_id, tenant, recipient, action, success, failure_reason, '
+            'content_hash, content, attempts, queued_at, send_ms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'
+        )
+
+        while self.running or not self.queue.empty():
+            try:
+                batch = self._collect_batch()
+                if batch:
+                    batch, batch_last_ts = self._order_batch(batch, last_ts)
+                    with connection:
+                        connection.executemany(insert, batch)
+                    last_ts = batch_last_ts
+                    self.written += len(batch)
+
+                if self.running and time.time() - self._last_maintenance >= self.maintenance_interval:
+                    self._maintain(connection)
+            except Exception as e:
+                self.write_errors += 1
+                logger.error(f"写入发送历史失败: {str(e)}", exc_info=True)
+
+        connection.close()
+
+    def query(self, tenant=None, recipient=None, job_id=None, since=None, until=None, success=None,
+              action=None, content=None, contains=None, before_id=None, limit=100):
+        """
+        查询发送历史（按 id 倒序，即最近的在前）
+
+        Args:
+            tenant: 只查询该租户的记录，None 表示所有租户
+            recipient: 接收者（精确匹配）
+            job_id: 任务编号
+            since: 起始时间（时间戳，包含）
+            until: 结束时间（时间戳，不包含）
+            success: True 只查成功，False 只查失败，None 表示不限
+            action: 消息类型
+            content: 完整消息内容（按摘要精确匹配）
+            contains: 消息内容包含的文本（只在已保存的前 content_max_chars 个字符中查找）
+            before_id: 分页游标，只返回 id 小于该值的记录
+            limit: 最多返回的记录数
+
+        Returns:
+            tuple: (记录列表, 下一页的 before_id，没有更多记录时为 None)
+        """
+        conditions = []
+        params = []
+        for column, value in (('tenant', tenant), ('recipient', recipient), ('job_id', job_id),
+                              ('action', action)):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if since is not None:
+            conditions.append('id >= (SELECT id FROM history WHERE ts >= ? ORDER BY ts LIMIT 1) AND ts >= ?')
+            params.extend((since, since))
+        if until is not None:
+            conditions.append(
+                'id < COALESCE((SELECT id FROM history WHERE ts >= ? ORDER BY ts LIMIT 1), 9223372036854775807) '
+                'AND ts < ?'
+            )
+            params.extend((until, until))
+        if success is not None:
+            conditions.append('success = ?')
+            params.append(int(success))
+        if content is not None:
+            conditions.append('content_hash = ?')
+            params.append(content_digest(content))
+        if contains:
+            conditions.append("content LIKE ? ESCAPE '\\'")
+            params.append('%' + contains.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if before_id is not None:
+            conditions.append('id < ?')
+            params.append(before_id)
+
+        sql = f"SELECT {', '.join(COLUMNS)} FROM history"
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id DESC LIMIT ?'
+        params.append(limit + 1)
+
+        with self.read_lock:
+            rows = self.read_connection.execute(sql, params).fetchall()
+
+        records = [dict(zip(COLUMNS, row)) for row in rows[:limit]]
+        for record in records:
+            record['success'] = bool(record['success'])
+        next_before_id = records[-1]['id'] if len(rows) > limit else None
+        return records, next_before_id
+
+    def get_stats(self):
+        """
+        获取发送历史统计
+
+        Returns:
+            dict: 待写入、已写入、丢弃、写入失败和已清理的数量
+        """
+        return {
+            'file': self.db_file,
+            'pending': self.queue.qsize(),
+            'written': self.written,
+            'dropped': self.dropped,
+            'write_errors': self.write_errors,
+            'purged': self.purged,
+            'retention_days': self.retention_days
+        }
@@ -0,0 +1,341 @@
+"""
+新消息监听模块
+在处理线程（COM 线程）空闲时轮询左侧会话列表，根据会话项的文本（联系人、最后一条消息预览、未读数、时间）
+发现新收到的消息，放入有界缓冲区，并通过事件总线（/events 的 received 事件）和回调地址推送
+
+增量比较：收到新消息的会话会被移动到列表顶部，因此每次只从顶部开始读取，
+在至少读取 min_scan 个会话（覆盖置顶会话）之后、连续 stable_run 个会话与上次快照相同即停止，
+不必每次遍历整个会话列表；每隔 full_scan_interval 秒做一次全量比较，补上被漏掉的变化
+
+会话项文本的格式（各版本微信略有不同，解析尽量宽松）:
+    联系人名称
+    [3条]最后一条消息预览
+    12:30
+"""
+import collections
+import itertools
+import re
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 未读数的写法：[3条]、3条新消息、3条未读
+UNREAD_PATTERN = re.compile(r'\[(\d+)条\]|(\d+)条(?:新消息|未读)')
+# 时间行：12:30、昨天、星期一、10/18、2026/10/18
+TIME_PATTERN = re.compile(r'^(?:\d{1,2}:\d{2}|昨天.*|星期.|周.|\d{1,4}/\d{1,2}(?:/\d{1,2})?)$')
+# 发送图片、文件后会话项显示的预览
+MEDIA_PREVIEWS = {
+    'sendpic': '[图片]',
+    'sendfile': '[文件]'
+}
+# 预览过长时被截断的结尾
+TRUNCATION_MARKS = ('...', '…')
+
+
+def parse_cell_text(contact_name, text):
+    """
+    解析会话项文本
+
+    Args:
+        contact_name: 联系人名称
+        text: 会话项文本（控件的 Name）
+
+    Returns:
+        dict: preview（消息预览）、unread（未读数）、time（显示的时间，可能为 None）
+    """
+    lines = [line.strip() for line in (text or '').split('\n') if line.strip()]
+    if lines and lines[0] == contact_name:
+        lines = lines[1:]
+    display_time = None
+    if lines and TIME_PATTERN.match(lines[-1]):
+        display_time = lines.pop()
+
+    preview = ' '.join(lines)
+    unread = 0
+    match = UNREAD_PATTERN.search(preview)
+    if match:
+        unread = int(match.group(1) or match.group(2))
+        preview = (preview[:match.start()] + preview[match.end():]).strip()
+    return {'preview': preview, 'unread': unread, 'time': display_time}
+
+
+def _normalize(text):
+    """
+    规范化文本用于比较（合并空白字符）
+
+    Args:
+        text: 文本
+
+    Returns:
+        str: 规范化后的文本
+    """
+    return ' '.join(text.split())
+
+
+class MessageMonitor:
+    """新消息监听类，由处理线程在发送间隙调用 poll()"""
+
+    def __init__(self, idle_interval=2.0, busy_interval=15.0, min_scan=3, stable_run=2, max_scan=30,
+                 full_scan_interval=300, max_buffer=1000, outbound_window=120,
+                 event_bus=None, webhook_dispatcher=None, callback_url=None):
+        """
+        初始化新消息监听
+
+        Args:
+            idle_interval: 队列为空时的轮询间隔（秒）
+            busy_interval: 队列中有待发送消息时的轮询间隔（秒），保证发送不被轮询挤占
+            min_scan: 每次至少读取的顶部会话数量（覆盖置顶会话）
+            stable_run: 连续多少个会话与上次快照相同时停止读取
+            max_scan: 增量轮询最多读取的会话数量
+            full_scan_interval: 全量比较的间隔（秒）
+            max_buffer: 缓冲区最多保存的新消息数量，写满时丢弃最早的消息
+            outbound_window: 发送后多长时间内（秒）把该会话预览与发送内容一致的第一次变化视为自己发出的消息
+            event_bus: 事件总线（EventBus），None 表示不推送事件
+            webhook_dispatcher: 回调分发器（WebhookDispatcher），与 callback_url 同时设置时推送新消息
+            callback_url: 新消息回调地址
+        """
+        self.idle_interval = idle_interval
+        self.busy_interval = busy_interval
+        self.min_scan = min_scan
+        self.stable_run = stable_run
+        self.max_scan = max_scan
+        self.full_scan_interval = full_scan_interval
+        self.outbound_window = outbound_window
+        self.event_bus = event_bus
+        self.webhook_dispatcher = webhook_dispatcher
+        self.callback_url = callback_url
+        self.lock = threading.Lock()
+        # 联系人名称 -> 上次读取的会话项文本
+        self.snapshot = {}
+        # 联系人名称 -> (发送后预期的会话预览, 发送时间)，匹配一次后删除
+        self._outbound = {}
+        self.messages = collections.deque(maxlen=max_buffer)
+        self._sequence = itertools.count(1)
+        self.primed = False
+        self.last_poll = 0
+        self.last_full_scan = 0
+
+        # 统计信息
+        self.polls = 0
+        self.full_scans = 0
+        self.cells_read = 0
+        self.received = 0
+        self.own_filtered = 0
+        self.evicted = 0
+        self.errors = 0
+        self.poll_seconds = 0.0
+
+    def is_due(self, busy, now=None):
+        """
+        判断是否到了下一次轮询的时间
+
+        Args:
+            busy: 队列中是否有待发送的消息
+            now: 当前时间戳，默认取当前时间
+
+        Returns:
+            bool: 是否应该轮询
+        """
+        now = time.time() if now is None else now
+        interval = self.busy_interval if busy else self.idle_interval
+        return now - self.last_poll >= interval
+
+    def note_outbound(self, contact_name, content, action='sendtext'):
+        """
+        记录一次成功发送（发送后会话项预览会变为自己发出的内容，不应视为新消息）
+
+        文本消息的预览是最后一行，图片和文件的预览是固定的占位文字
+
+        Args:
+            contact_name: 接收者
+            content: 发送内容
+            action: 消息类型
+        """
+        if action == 'sendtext':
+            lines = [line for line in content.split('\n') if line.strip()]
+            expected = _normalize(lines[-1]) if lines else None
+        else:
+            expected = MEDIA_PREVIEWS.get(action)
+        if not expected:
+            return
+        with self.lock:
+            self._outbound[contact_name] = (expected, time.time())
+
+    def _is_own(self, contact_name, preview, now):
+        """
+        判断预览是否是自己最近发出的内容（匹配成功后删除发送记录，之后的变化都视为新消息）
+
+        预览必须与发出的最后一行（或图片、文件的占位文字）完全一致；
+        只有以 ... 或 … 结尾的截断预览按前缀比较
+
+        Args:
+            contact_name: 联系人名称
+            preview: 消息预览
+            now: 当前时间戳
+
+        Returns:
+            bool: 是否视为自己发出的消息
+        """
+        preview = _normalize(preview)
+        with self.lock:
+            entry = self._outbound.get(contact_name)
+            if entry is None:
+                return False
+            expected, sent_at = entry
+            if now - sent_at > self.outbound_window:
+                del self._outbound[contact_name]
+                return False
+            if preview != expected:
+                if not preview.endswith(TRUNCATION_MARKS):
+                    return False
+                fragment = preview.rstrip('.…').rstrip()
+                if not fragment or not expected.startswith(fragment):
+                    return False
+            del self._outbound[contact_name]
+            return True
+
+    def poll(self, controller):
+        """
+        读取会话列表顶部的变化，发现新消息（在处理线程中调用）
+
+        Args:
+            controller: 微信控制器（提供 iter_session_cells()）
+
+        Returns:
+            int: 本次发现的新消息数量
+        """
+        now = time.time()
+        self.last_poll = now
+        full = not self.primed or now - self.last_full_scan >= self.full_scan_interval
+        previous = self.snapshot
+        current = {} if full else previous
+        changes = []
+        cells_read = 0
+        unchanged_run = 0
+        started = time.perf_counter()
+
+        try:
+            for contact_name, text in controller.iter_session_cells():
+                cells_read += 1
+                old_text = previous.get(contact_name)
+                current[contact_name] = text
+                if old_text == text:
+                    unchanged_run += 1
+                    if not full and cells_read >= self.min_scan and unchanged_run >= self.stable_run:
+                        break
+                else:
+                    unchanged_run = 0
+                    if self.primed:
+                        changes.append((contact_name, old_text, text))
+                if not full and cells_read >= self.max_scan:
+                    break
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"读取会话列表失败: {str(e)}")
+            controller.session_cache.invalidate()
+            return 0
+        finally:
+            self.polls += 1
+            self.cells_read += cells_read
+            self.poll_seconds += time.perf_counter() - started
+
+        if full:
+            self.snapshot = current
+            self.last_full_scan = now
+            self.full_scans += 1
+            if not self.primed:
+                self.primed = True
+                logger.info(f"新消息监听已建立会话快照: {len(current)} 个会话")
+
+        found = 0
+        for contact_name, old_text, text in changes:
+            if self._handle_change(contact_name, old_text, text, now):
+                found += 1
+        return found
+
+    def _handle_change(self, contact_name, old_text, text, now):
+        """
+        判断一个会话项的变化是否是新收到的消息，是则放入缓冲区并推送
+
+        未读数增加一定是新消息；未读数没有增加时（例如当前正打开该会话），
+        只有预览变化且不是自己刚发出的内容才视为新消息
+
+        Args:
+            contact_name: 联系人名称
+            old_text: 上次的会话项文本，新出现的会话为 None
+            text: 当前的会话项文本
+            now: 当前时间戳
+
+        Returns:
+            bool: 是否是新消息
+        """
+        info = parse_cell_text(contact_name, text)
+        old_info = parse_cell_text(contact_name, old_text) if old_text is not None else None
+        old_unread = old_info['unread'] if old_info else 0
+        if info['unread'] <= old_unread:
+            if not info['preview'] or (old_info and info['preview'] == old_info['preview']):
+                return False
+            if self._is_own(contact_name, info['preview'], now):
+                self.own_filtered += 1
+                return False
+
+        message = {
+            'id': next(self._sequence),
+            'contact': contact_name,
+            'preview': info['preview'],
+            'unread': info['unread'],
+            'new_count': max(info['unread'] - old_unread, 1),
+            'time': info['time'],
+            'detected_at': now
+        }
+        with self.lock:
+            if len(self.messages) == self.messages.maxlen:
+                self.evicted += 1
+            self.messages.append(message)
+        self.received += 1
+        logger.info(f"收到新消息: 会话={contact_name}, 未读={info['unread']}, 预览={info['preview'][:50]}")
+
+        if self.event_bus:
+            self.event_bus.publish('received', message)
+        if self.webhook_dispatcher and self.callback_url:
+            self.webhook_dispatcher.submit(self.callback_url, dict(message, event='received'))
+        return True
+
+    def get_messages(self, after_id=0, limit=100):
+        """
+        获取缓冲区中的新消息
+
+        Args:
+            after_id: 只返回编号大于该值的消息
+            limit: 最多返回的消息数量
+
+        Returns:
+            list: 新消息列表（按编号升序）
+        """
+        with self.lock:
+            messages = [message for message in self.messages if message['id'] > after_id]
+        return messages[:limit]
+
+    def get_stats(self):
+        """
+        获取监听统计
+
+        Returns:
+            dict: 轮询次数、读取的会话数、发现的新消息数和过滤掉的自己发出的消息数
+        """
+        return {
+            'polls': self.polls,
+            'full_scans': self.full_scans,
+            'cells_read': self.cells_read,
+            'avg_cells_per_poll': round(self.cells_read / self.polls, 2) if self.polls else None,
+            'avg_poll_ms': round(self.poll_seconds / self.polls * 1000, 2) if self.polls else None,
+            'received': self.received,
+            'own_filtered': self.own_filtered,
+            'buffered': len(self.messages),
+            'evicted': self.evicted,
+            'errors': self.errors,
+            'snapshot_size': len(self.snapshot)
+        }
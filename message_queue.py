@@ -1,13 +1,24 @@
 """
 消息队列管理模块
 实现线程安全的消息队列，支持后台自动处理消息发送
+队列中保存的是群发任务（BroadcastJob），后台线程按需逐个取出接收者；
+多个租户的任务由 FairScheduler 按权重轮流取出
+
+uiautomation、wechat_controller（以及它依赖的 PIL、requests、pywin32）
+只在后台线程中延迟导入，HTTP 服务启动时不需要加载 Windows UI 自动化组件
 """
+import collections
+import contextlib
 import queue
 import threading
 import time
 import logging
-import uiautomation as auto
-from wechat_controller import WeChatController
+from broadcast_job import BroadcastJob
+from fair_scheduler import FairScheduler, DEFAULT_TENANT
+from circuit_breaker import STATE_CLOSED
+from worker_watchdog import Heartbeat, WorkerAbandoned
+from pacing import SIGNAL_UI_ERROR
+from service_estimator import ServiceTimeEstimator
 
 # 配置日志
 logger = logging.getLogger(__name__)
@@ -16,67 +27,352 @@ logger = logging.getLogger(__name__)
 class MessageQueue:
     """消息队列管理类，负责管理和处理微信消息发送队列"""
     
-    def __init__(self, message_interval=1):
+    def __init__(self, message_interval=1, contact_index=None, controller_options=None,
+                 coalesce_window=0, coalesce_max_chars=2000, coalesce_max_messages=10,
+                 max_finished_jobs=100, warmup=True, warmup_urls=None, warmup_retry_interval=10,
+                 circuit_breaker=None, max_item_attempts=5,
+                 watchdog_interval=5, ui_timeouts=None, idle_timeout=60,
+                 webhook_dispatcher=None, callback_url=None, event_bus=None, tenants=None,
+                 pacer=None, simulate=False, file_cache=None, history_store=None, message_monitor=None,
+                 service_time_alpha=0.1, default_service_times=None):
         """
         初始化消息队列
         
         Args:
             message_interval: 消息发送间隔时间（秒），默认1秒
+            contact_index: 联系人解析索引（ContactIndex），None 表示不启用
+            controller_options: 传给 WeChatController 的额外参数
+            coalesce_window: 文本合并时间窗口（秒），0 表示不合并
+            coalesce_max_chars: 合并后单条消息的最大字符数
+            coalesce_max_messages: 单次最多合并的消息条数
+            max_finished_jobs: 状态查询中保留的已完成任务数量
+            warmup: 是否在处理线程启动时预热（定位窗口、建立会话列表快照）
+            warmup_urls: 预热时预先建立连接的 URL 列表
+            warmup_retry_interval: 预热失败（如未找到微信窗口）后的重试间隔（秒）
+            circuit_breaker: 熔断器（CircuitBreaker），None 表示不启用
+            max_item_attempts: 因窗口或界面故障放回队列的消息最多尝试次数
+            watchdog_interval: 看门狗检查间隔（秒），0 表示不启用看门狗
+            ui_timeouts: 各界面操作的耗时预算（秒），覆盖 worker_watchdog 中的默认值
+            idle_timeout: 处理线程两次心跳之间的最长间隔（秒）
+            webhook_dispatcher: 发送结果回调分发器（WebhookDispatcher），None 表示不回调
+            callback_url: 全局回调地址，请求未指定 callback_url 时使用
+            event_bus: 事件总线（EventBus），None 表示不推送事件
+            tenants: 租户配置列表（name、weight、quota），None 表示只有默认租户
+            pacer: 自适应节奏控制器（AdaptivePacer），None 表示使用固定的等待时间
+            simulate: 使用模拟控制器（SimulatedController），不操作微信界面，用于压测
+            file_cache: sendfile 使用的文件缓存（FileCache），入队时即开始预先下载，None 表示由控制器按需下载
+            history_store: 发送历史（HistoryStore），None 表示不记录
+            message_monitor: 新消息监听（MessageMonitor），在处理线程的发送间隙轮询会话列表，None 表示不监听
+            service_time_alpha: 发送耗时指数移动平均的平滑系数（用于估计完成时间）
+            default_service_times: 没有样本时各消息类型每个接收者的预期耗时（秒）
         """
-        self.queue = queue.Queue()
+        # 等待处理的群发任务和正在取出接收者的当前任务
+        # 按租户加权轮询的任务队列
+        self.scheduler = FairScheduler(tenants)
+        self.condition = threading.Condition()
+        # 尚未取出的接收者总数
+        self._pending_count = 0
+        self.skipped_count = 0
+        # 任务索引（未完成任务 + 最近完成的任务），用于状态查询
+        self.jobs = collections.OrderedDict()
+        self._finished_job_ids = collections.deque()
+        self._finished_job_set = set()
+        self.max_finished_jobs = max_finished_jobs
         self.message_interval = message_interval
+        self.contact_index = contact_index
+        self.controller_options = controller_options or {}
+        self.wechat_controller = None
+        self.coalesce_window = coalesce_window
+        self.coalesce_max_chars = coalesce_max_chars
+        self.coalesce_max_messages = coalesce_max_messages
+        # 放回队首的消息（合并时多取出的消息、熔断时未发送成功的消息），优先处理
+        self._pending_items = collections.deque()
+        self.coalesced_messages = 0
+        self.warmup = warmup
+        self.warmup_urls = warmup_urls or []
+        self.warmup_retry_interval = warmup_retry_interval
+        # 预热完成后才对外报告就绪
+        self.warmed_up = False
+        self.warmup_result = None
+        self._last_warmup_attempt = 0
+        self.circuit_breaker = circuit_breaker
+        self.max_item_attempts = max_item_attempts
+        self.watchdog_interval = watchdog_interval
+        self.ui_timeouts = ui_timeouts or {}
+        self.idle_timeout = idle_timeout
+        # 当前处理线程的心跳和代数（看门狗每替换一次线程加 1）
+        self.heartbeat = None
+        self.worker_generation = 0
+        self.watchdog_thread = None
+        self.stalls = 0
+        self.worker_restarts = 0
+        self.last_stall = None
+        self._last_restart_at = 0
+        self.webhook_dispatcher = webhook_dispatcher
+        self.callback_url = callback_url
+        self.event_bus = event_bus
+        self.pacer = pacer
+        self.simulate = simulate
+        self.file_cache = file_cache
+        self.history_store = history_store
+        self.message_monitor = message_monitor
+        # 按消息类型和发送路径统计的发送耗时，用于估计完成时间和排空能力
+        self.estimator = ServiceTimeEstimator(alpha=service_time_alpha, default_times=default_service_times)
+        # 累计发送成功和失败的接收者数量（用于吞吐量统计）
+        self.sent_count = 0
+        self.failed_count = 0
         self.worker_thread = None
         self.running = False
         self.lock = threading.Lock()
         
     def start(self):
-        """启动消息队列处理线程"""
+        """启动消息队列处理线程（以及看门狗线程）"""
         if self.worker_thread is not None and self.worker_thread.is_alive():
             logger.warning("消息队列处理线程已在运行")
             return
         
         self.running = True
-        self.worker_thread = threading.Thread(target=self._process_queue, daemon=True)
-        self.worker_thread.start()
+        self._start_worker()
         logger.info("消息队列处理线程已启动")
+        
+        if self.webhook_dispatcher:
+            self.webhook_dispatcher.start()
+        
+        if self.history_store:
+            self.history_store.start()
+        
+        if self.watchdog_interval and (self.watchdog_thread is None or not self.watchdog_thread.is_alive()):
+            self.watchdog_thread = threading.Thread(target=self._watchdog_loop, daemon=True)
+            self.watchdog_thread.start()
+            logger.info("看门狗线程已启动")
+    
+    def _start_worker(self):
+        """创建新的心跳并启动一个新的处理线程"""
+        with self.lock:
+            self.worker_generation += 1
+            heartbeat = Heartbeat(
+                self.worker_generation,
+                ui_timeouts=self.ui_timeouts,
+                idle_timeout=self.idle_timeout
+            )
+            self.heartbeat = heartbeat
+            self.worker_thread = threading.Thread(
+                target=self._process_queue,
+                args=(heartbeat,),
+                name=f"wechat-worker-{self.worker_generation}",
+                daemon=True
+            )
+            self.worker_thread.start()
+    
+    def _replace_worker(self, reason):
+        """
+        放弃当前处理线程，把正在发送的消息放回队首，并启动新的处理线程
+        
+        卡死的线程无法被强制结束，只能标记为放弃；它恢复后会发现自己已被放弃并直接退出
+        
+        Args:
+            reason: 替换原因（卡死的操作名称或 'dead'）
+        """
+        heartbeat = self.heartbeat
+        if heartbeat is not None:
+            # 与处理线程的 claim_inflight() 互斥：消息要么由看门狗放回队列，要么由旧线程记录结果
+            inflight = heartbeat.abandon()
+            if inflight:
+                dropped = self._requeue(inflight)
+                for source_item in dropped:
+                    self._record_result(source_item, False, 'max_attempts_exceeded')
+                logger.warning(f"已把 {len(inflight) - len(dropped)} 条正在发送的消息放回队首")
+        
+        self.warmed_up = False
+        self.wechat_controller = None
+        self.worker_restarts += 1
+        self._last_restart_at = time.time()
+        self._start_worker()
+        logger.warning(f"已替换消息处理线程: 原因={reason}, 新线程代数={self.worker_generation}")
+    
+    def _watchdog_loop(self):
+        """
+        看门狗线程：定期检查处理线程心跳，发现卡死或线程意外退出时替换处理线程
+        """
+        while self.running:
+            time.sleep(self.watchdog_interval)
+            if not self.running:
+                break
+            
+            try:
+                heartbeat = self.heartbeat
+                if heartbeat is None:
+                    continue
+                
+                stalled_operation = heartbeat.check_stall()
+                if stalled_operation is not None:
+                    self.stalls += 1
+                    self.last_stall = {
+                        'operation': stalled_operation,
+                        'generation': heartbeat.generation,
+                        'detected_at': time.time()
+                    }
+                    logger.error(f"检测到消息处理线程卡死: 操作={stalled_operation}, 线程代数={heartbeat.generation}")
+                    self._replace_worker(stalled_operation)
+                elif self.worker_thread is not None and not self.worker_thread.is_alive():
+                    # 线程意外退出（如组件加载失败）时限制重启频率，避免反复重启
+                    if time.time() - self._last_restart_at >= max(30, self.watchdog_interval):
+                        logger.error("消息处理线程意外退出，重新启动")
+                        self._replace_worker('dead')
+            except Exception as e:
+                logger.error(f"看门狗检查失败: {str(e)}", exc_info=True)
+    
+    def get_worker_status(self):
+        """
+        获取处理线程的实际状态
+        
+        Returns:
+            str: running（正常）、paused（熔断暂停）、stalled（心跳超时）、stopped（线程未运行）
+        """
+        if self.worker_thread is None or not self.worker_thread.is_alive():
+            return 'stopped'
+        if self.heartbeat is not None and self.heartbeat.check_stall() is not None:
+            return 'stalled'
+        if self.circuit_breaker and self.circuit_breaker.state != STATE_CLOSED:
+            return 'paused'
+        return 'running'
     
     def stop(self):
         """停止消息队列处理线程"""
         self.running = False
+        self.warmed_up = False
         if self.worker_thread is not None:
             self.worker_thread.join(timeout=5)
+        if self.webhook_dispatcher:
+            self.webhook_dispatcher.stop()
+        if self.history_store:
+            self.history_store.stop()
+        if self.contact_index:
+            self.contact_index.save()
+        if self.file_cache:
+            self.file_cache.shutdown()
         logger.info("消息队列处理线程已停止")
     
-    def add_message(self, to_list, content, action='sendtext'):
+    def add_message(self, to_list, content, action='sendtext', callback_url=None, tenant=DEFAULT_TENANT,
+                    expires_at=None, template=None, variables=None):
         """
-        添加消息到队列
+        添加消息到队列（整个请求作为一个群发任务入队，耗时与接收者数量无关）
         
         Args:
-            to_list: 接收者列表，可以包含多个联系人
-            content: 消息内容（文本或图片 URL）
-            action: 消息类型，'sendtext' 或 'sendpic'
+            to_list: 接收者列表或元组（接收者列表的成员元组直接被任务引用，不复制），可以包含多个联系人
+            content: 消息内容（文本、图片 URL 或文件 URL）
+            action: 消息类型，'sendtext'、'sendpic' 或 'sendfile'
+            callback_url: 发送结果回调地址，None 表示使用全局回调地址
+            tenant: 提交任务的租户
+            expires_at: 过期时间（时间戳），过期后尚未发送的消息直接丢弃，None 表示不过期
+            template: 预编译的消息模板（Template），处理线程取出接收者时才渲染
+            variables: 每个接收者一行的变量值（Template.bind() 的返回值）
             
         Returns:
-            int: 添加到队列的消息数量
+            BroadcastJob: 创建的群发任务，超出租户配额时返回 None
         """
-        if not isinstance(to_list, list):
+        if not isinstance(to_list, (list, tuple)):
             to_list = [to_list]
         
-        count = 0
-        for contact in to_list:
-            message_item = {
-                'to': contact,
-                'content': content,
-                'action': action
-            }
-            self.queue.put(message_item)
-            count += 1
+        job = BroadcastJob(to_list, content, action, callback_url=callback_url, tenant=tenant,
+                           expires_at=expires_at, template=template, variables=variables)
+        with self.condition:
+            if not self.scheduler.has_capacity(tenant, job.total):
+                logger.warning(f"租户超出配额，拒绝群发任务: 租户={tenant}, 接收者数量={job.total}")
+                return None
+            self.scheduler.push(tenant, job)
+            self.jobs[job.job_id] = job
+            self._pending_count += job.total
+            self.condition.notify()
+        
+        self._emit('enqueued', {
+            'job_id': job.job_id,
+            'tenant': tenant,
+            'action': action,
+            'count': job.total,
+            'queue_size': self.get_queue_size()
+        })
+        
+        if action == 'sendpic':
+            logger.info(f"图片群发任务已加入队列: job_id={job.job_id}, 租户={tenant}, 接收者数量={job.total}, URL={content}")
+        elif action == 'sendfile':
+            logger.info(f"文件群发任务已加入队列: job_id={job.job_id}, 租户={tenant}, 接收者数量={job.total}, URL={content}")
+            # 在后台线程中预先下载，处理线程取到消息时文件通常已在缓存中
+            if self.file_cache:
+                self.file_cache.prefetch(content)
+        elif template is not None:
+            logger.info(f"模板群发任务已加入队列: job_id={job.job_id}, 租户={tenant}, 接收者数量={job.total}, 模板={template.template_id}")
+        else:
+            logger.info(f"文本群发任务已加入队列: job_id={job.job_id}, 租户={tenant}, 接收者数量={job.total}, 内容长度={len(content)}")
+        
+        return job
+    
+    def get_job(self, job_id):
+        """
+        获取群发任务
+        
+        Args:
+            job_id: 任务编号
             
-            if action == 'sendpic':
-                logger.info(f"图片消息已加入队列: 接收者={contact}, URL={content}")
-            else:
-                logger.info(f"文本消息已加入队列: 接收者={contact}, 内容长度={len(content)}")
+        Returns:
+            BroadcastJob: 群发任务，不存在（或已从状态中移除）时返回 None
+        """
+        with self.condition:
+            return self.jobs.get(job_id)
+    
+    def cancel_job(self, job_id):
+        """
+        取消群发任务中尚未发送的接收者（只移动游标，O(1)，与积压数量无关）
+        
+        已放回队首的消息在出队时检查取消标记并跳过；正在发送的消息不受影响
+        
+        Args:
+            job_id: 任务编号
+            
+        Returns:
+            int: 取消的接收者数量，任务不存在时返回 None
+        """
+        with self.condition:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            job.cancelled = True
+            # 按接收者取消的消息已从待发送数量中扣除，不重复扣除
+            pending = job.pending()
+            count = job.skip_remaining()
+            self._pending_count -= pending
+            self.skipped_count += count
+            self.scheduler.remove_pending(job.tenant, pending)
+            self._finish_job(job)
+        
+        logger.info(f"群发任务已取消: job_id={job_id}, 取消接收者数量={count}")
+        self._emit('cancelled', {'job_id': job_id, 'tenant': job.tenant, 'count': count})
+        return count
+    
+    def cancel_recipient(self, recipient, tenant=None):
+        """
+        取消发给某个接收者的所有待发送消息（在任务上标记，出队时跳过）
+        
+        取消的数量立即从队列大小和租户配额中扣除；标记随任务一起释放，不会无限增长
+        
+        Args:
+            recipient: 接收者名称
+            tenant: 只取消该租户的消息，None 表示所有租户
+            
+        Returns:
+            int: 取消的待发送消息数量
+        """
+        with self.condition:
+            count = self.scheduler.cancel_recipient(recipient, tenant)
+            self._pending_count -= count
+            # 已放回队首的消息已不在待发送数量中，只需标记
+            for message_item in self._pending_items:
+                job = message_item['job']
+                if message_item['to'] == recipient and (tenant is None or job.tenant == tenant):
+                    job.cancel_recipient(recipient)
         
+        logger.info(f"已取消发给该接收者的待发送消息: 接收者={recipient}, 租户={tenant or '全部'}, 数量={count}")
+        self._emit('cancelled', {'to': recipient, 'tenant': tenant, 'count': count})
         return count
     
     def get_queue_size(self):
@@ -86,63 +382,729 @@ class MessageQueue:
         Returns:
             int: 队列大小
         """
-        return self.queue.qsize()
+        return self._pending_count + len(self._live_pending_items())
+    
+    def _live_pending_items(self):
+        """
+        获取放回队首、尚未按接收者取消的消息项
+        
+        Returns:
+            list: 消息项列表
+        """
+        return [
+            item for item in list(self._pending_items)
+            if not item['job'].is_recipient_cancelled(item['to'])
+        ]
+    
+    def _emit(self, event_type, data):
+        """
+        向事件总线发布事件（未启用事件总线时不做任何事）
+        
+        Args:
+            event_type: 事件类型
+            data: 事件数据
+        """
+        if self.event_bus:
+            self.event_bus.publish(event_type, data)
+    
+    def get_summary(self):
+        """
+        获取队列吞吐概要（供事件流定期推送）
+        
+        Returns:
+            dict: 处理线程状态、队列大小和累计发送数量
+        """
+        return {
+            'status': self.get_worker_status(),
+            'queue_size': self.get_queue_size(),
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'skipped': self.skipped_count
+        }
+    
+    def get_jobs(self, limit=50):
+        """
+        获取最近的群发任务进度
+        
+        Args:
+            limit: 最多返回的任务数量
+            
+        Returns:
+            list: 任务进度列表（最新的在前）
+        """
+        with self.condition:
+            jobs = list(self.jobs.values())[-limit:]
+        return [job.to_dict() for job in reversed(jobs)]
+    
+    def is_ready(self):
+        """
+        判断服务是否可以接收流量（预热完成且处理线程存活）
+        
+        Returns:
+            tuple: (是否就绪, 未就绪原因)
+        """
+        worker_status = self.get_worker_status()
+        if worker_status == 'stopped':
+            return False, '消息处理线程未运行'
+        if worker_status == 'stalled':
+            return False, '消息处理线程卡死'
+        if not self.warmed_up:
+            return False, '预热尚未完成'
+        if worker_status == 'paused':
+            return False, '熔断器已打开，暂停发送'
+        return True, None
+    
+    def _warm_up(self, wechat_controller):
+        """
+        执行一次预热，找到微信窗口后标记为就绪
+        
+        Args:
+            wechat_controller: 微信控制器
+        """
+        self._last_warmup_attempt = time.time()
+        if not self.warmup:
+            self.warmed_up = True
+            return
+        
+        try:
+            self.warmup_result = wechat_controller.warm_up(prefetch_urls=self.warmup_urls)
+            self.warmed_up = bool(self.warmup_result.get('window'))
+        except Exception as e:
+            logger.error(f"预热失败: {str(e)}", exc_info=True)
+        
+        if not self.warmed_up:
+            logger.warning(f"预热未完成，{self.warmup_retry_interval} 秒后重试")
+    
+    def get_metrics(self):
+        """
+        获取运行指标
+        
+        Returns:
+            dict: 各组件的统计信息
+        """
+        metrics = {}
+        with self.condition:
+            metrics['tenants'] = self.scheduler.get_stats()
+        if self.contact_index:
+            metrics['contact_index'] = self.contact_index.get_stats()
+        if self.wechat_controller:
+            metrics['session_list'] = self.wechat_controller.session_cache.get_stats()
+            metrics['clipboard'] = self.wechat_controller.get_clipboard_stats()
+        if self.coalesce_window:
+            metrics['coalesce'] = {'coalesced_messages': self.coalesced_messages}
+        if self.warmup_result:
+            metrics['warmup'] = self.warmup_result
+        if self.watchdog_interval:
+            metrics['watchdog'] = {
+                'stalls': self.stalls,
+                'worker_restarts': self.worker_restarts,
+                'worker_generation': self.worker_generation,
+                'last_stall': self.last_stall
+            }
+        if self.webhook_dispatcher:
+            metrics['webhook'] = self.webhook_dispatcher.get_stats()
+        if self.event_bus:
+            metrics['events'] = self.event_bus.get_stats()
+        if self.pacer:
+            metrics['pacing'] = self.pacer.get_stats()
+        if self.file_cache:
+            metrics['file_cache'] = self.file_cache.get_stats()
+        if self.history_store:
+            metrics['history'] = self.history_store.get_stats()
+        if self.message_monitor:
+            metrics['monitor'] = self.message_monitor.get_stats()
+        metrics['service_time'] = self.estimator.get_stats()
+        return metrics
+    
+    def _send_interval(self):
+        """
+        获取当前的发送间隔（启用节奏控制时按当前倍率缩放）
+        
+        Returns:
+            float: 发送间隔（秒）
+        """
+        if self.pacer:
+            return self.pacer.interval(self.message_interval)
+        return self.message_interval
+    
+    def _recipient_costs(self):
+        """
+        获取各消息类型每个接收者的预期耗时（发送耗时 + 发送间隔）
+        
+        Returns:
+            dict: 消息类型 -> 预期耗时（秒）
+        """
+        interval = self._send_interval()
+        return {
+            action: self.estimator.estimate(action) + interval
+            for action in self.estimator.default_times
+        }
+    
+    def estimate_job(self, job):
+        """
+        估计群发任务的开始和完成时间
+        
+        按各消息类型的预期耗时累加排在前面的积压（放回队首的消息、本租户更早的任务，
+        以及按权重比例分走发送机会的其他租户）
+        
+        Args:
+            job: 群发任务
+            
+        Returns:
+            dict: 距离开始和完成的秒数（start_in、finish_in）及对应的时间戳（start_at、finish_at）
+        """
+        costs = self._recipient_costs()
+        default_cost = costs['sendtext']
+        
+        def cost(queued_job):
+            return costs.get(queued_job.action, default_cost)
+        
+        with self.condition:
+            front = sum(costs.get(item['job'].action, default_cost) for item in self._live_pending_items())
+            start_in, finish_in = self.scheduler.estimate_delay(job.tenant, job, cost)
+        
+        now = time.time()
+        start_in += front
+        finish_in += front
+        return {
+            'start_in': round(start_in, 1),
+            'finish_in': round(finish_in, 1),
+            'start_at': round(now + start_in, 1),
+            'finish_at': round(now + finish_in, 1)
+        }
+    
+    def get_capacity(self):
+        """
+        获取当前的排空能力：各消息类型的发送速率和积压需要的时间
+        
+        Returns:
+            dict: 发送间隔、每个接收者的预期耗时、每分钟可发送数量、积压时间和预计排空时间
+        """
+        costs = self._recipient_costs()
+        default_cost = costs['sendtext']
+        
+        def cost(queued_job):
+            return costs.get(queued_job.action, default_cost)
+        
+        with self.condition:
+            front = sum(costs.get(item['job'].action, default_cost) for item in self._live_pending_items())
+            tenant_backlog = self.scheduler.pending_work(cost)
+        
+        backlog = front + sum(tenant_backlog.values())
+        return {
+            'interval_s': round(self._send_interval(), 3),
+            'per_recipient_s': {action: round(seconds, 3) for action, seconds in costs.items()},
+            'recipients_per_min': {action: round(60 / seconds, 2) for action, seconds in costs.items() if seconds > 0},
+            'backlog_s': round(backlog, 1),
+            'tenant_backlog_s': {name: round(seconds, 1) for name, seconds in tenant_backlog.items()},
+            'drained_at': round(time.time() + backlog, 1)
+        }
+    
+    def _pull_item(self, timeout):
+        """
+        按租户权重从群发任务中取出下一个接收者，组装成消息项
+        
+        Args:
+            timeout: 队列为空时的等待时间（秒）
+            
+        Returns:
+            dict: 消息项
+            
+        Raises:
+            queue.Empty: 超时仍没有消息
+        """
+        deadline = time.time() + timeout
+        with self.condition:
+            while True:
+                picked = self.scheduler.pop()
+                if picked is not None:
+                    job, recipient = picked
+                    # 按接收者取消的消息在取消时已从待发送数量中扣除
+                    if not job.is_recipient_cancelled(recipient):
+                        self._pending_count -= 1
+                    return {
+                        'to': recipient,
+                        'content': job.content_for(job.cursor - 1),
+                        'action': job.action,
+                        'queued_at': job.created_at,
+                        'job': job
+                    }
+                
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise queue.Empty
+                self.condition.wait(remaining)
+    
+    def _get_next_item(self, timeout):
+        """
+        获取下一条待处理的消息（优先返回合并时留下的消息）
+        
+        已取消或已过期的消息在这里直接跳过，不会进入界面操作
+        
+        Args:
+            timeout: 队列为空时的等待时间（秒）
+            
+        Returns:
+            dict: 消息项
+            
+        Raises:
+            queue.Empty: 超时仍没有消息
+        """
+        deadline = time.time() + timeout
+        while True:
+            if self._pending_items:
+                message_item = self._pending_items.popleft()
+            else:
+                message_item = self._pull_item(max(0, deadline - time.time()))
+            
+            reason = self._skip_reason(message_item)
+            if reason is None:
+                return message_item
+            self._skip_item(message_item, reason)
+    
+    def _skip_reason(self, message_item):
+        """
+        检查消息是否应跳过
+        
+        Args:
+            message_item: 消息项
+            
+        Returns:
+            str: 'cancelled' 或 'expired'，不需要跳过时返回 None
+        """
+        job = message_item['job']
+        if job.cancelled:
+            return 'cancelled'
+        if job.is_expired(time.time()):
+            return 'expired'
+        if job.is_recipient_cancelled(message_item['to']):
+            return 'cancelled'
+        return None
+    
+    def _skip_item(self, message_item, reason):
+        """
+        跳过一条已取消或已过期的消息；任务过期时一并跳过它尚未取出的全部接收者
+        
+        Args:
+            message_item: 消息项
+            reason: 跳过原因
+        """
+        job = message_item['job']
+        with self.condition:
+            job.record_skipped()
+            count = 1
+            if reason == 'expired' and job.remaining():
+                pending = job.pending()
+                remaining = job.skip_remaining()
+                self._pending_count -= pending
+                self.scheduler.remove_pending(job.tenant, pending)
+                count += remaining
+            self.skipped_count += count
+            self._finish_job(job)
+        
+        if reason == 'expired':
+            logger.warning(f"消息已过期，跳过: job_id={job.job_id}, 跳过数量={count}")
+        else:
+            logger.info(f"消息已取消，跳过: job_id={job.job_id}, 接收者={message_item['to']}")
+        self._emit('skipped', {
+            'job_id': job.job_id,
+            'tenant': job.tenant,
+            'to': message_item['to'],
+            'reason': reason,
+            'count': count
+        })
+    
+    def _record_result(self, message_item, success, failure_reason=None):
+        """
+        把发送结果记录到消息所属的群发任务，并提交给回调分发器和发送历史
+        
+        Args:
+            message_item: 消息项
+            success: 是否发送成功
+            failure_reason: 失败原因，成功时为 None
+        """
+        job = message_item['job']
+        if success:
+            self.sent_count += 1
+        else:
+            self.failed_count += 1
+        self._emit('sent' if success else 'failed', {
+            'job_id': job.job_id,
+            'tenant': job.tenant,
+            'to': message_item['to'],
+            'action': job.action,
+            'failure_reason': None if success else failure_reason
+        })
+        
+        finished_at = time.time()
+        started_at = message_item.get('started_at')
+        send_ms = round((finished_at - started_at) * 1000, 1) if started_at else None
+        
+        callback_url = job.callback_url or self.callback_url
+        if self.webhook_dispatcher and callback_url:
+            self.webhook_dispatcher.submit(callback_url, {
+                'job_id': job.job_id,
+                'tenant': job.tenant,
+                'to': message_item['to'],
+                'action': job.action,
+                'success': success,
+                'failure_reason': None if success else failure_reason,
+                'attempts': message_item.get('attempts', 1),
+                'queued_at': job.created_at,
+                'started_at': started_at,
+                'finished_at': finished_at,
+                'wait_ms': round(((started_at or finished_at) - job.created_at) * 1000, 1),
+                'send_ms': send_ms
+            })
+        
+        if self.history_store:
+            self.history_store.record(
+                finished_at, job.job_id, job.tenant, message_item['to'], job.action, success,
+                None if success else failure_reason, message_item['content'],
+                message_item.get('attempts', 1), job.created_at, send_ms
+            )
+        
+        with self.condition:
+            job.record_result(success)
+            self.scheduler.record_result(job.tenant, success)
+            self._finish_job(job)
+    
+    def _finish_job(self, job):
+        """
+        任务全部处理完成时记入已完成列表（调用方需持有 self.condition）
+        
+        Args:
+            job: 群发任务
+        """
+        if not job.is_finished() or job.job_id in self._finished_job_set:
+            return
+        logger.info(f"群发任务已完成: job_id={job.job_id}, 成功={job.sent}, 失败={job.failed}, 跳过={job.skipped}")
+        # 只保留最近完成的若干个任务
+        self._finished_job_ids.append(job.job_id)
+        self._finished_job_set.add(job.job_id)
+        while len(self._finished_job_ids) > self.max_finished_jobs:
+            finished_id = self._finished_job_ids.popleft()
+            self._finished_job_set.discard(finished_id)
+            self.jobs.pop(finished_id, None)
+    
+    def _coalesce(self, message_item):
+        """
+        合并连续发给同一接收者的文本消息
+        
+        只合并到达时间与第一条相差不超过 coalesce_window 的消息；
+        遇到其他接收者的消息或图片消息立即停止（作为顺序屏障），
+        该消息留到下一轮处理
+        
+        Args:
+            message_item: 第一条消息
+            
+        Returns:
+            tuple: (合并后的消息项, 被合并的原始消息项列表)
+        """
+        if not self.coalesce_window or message_item.get('action', 'sendtext') != 'sendtext':
+            return message_item, [message_item]
+        
+        source_items = [message_item]
+        parts = [message_item['content']]
+        total_chars = len(message_item['content'])
+        deadline = message_item['queued_at'] + self.coalesce_window
+        
+        while len(parts) < self.coalesce_max_messages:
+            try:
+                next_item = self._get_next_item(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                break
+            
+            mergeable = (
+                next_item.get('action', 'sendtext') == 'sendtext'
+                and next_item['to'] == message_item['to']
+                and next_item['queued_at'] <= deadline
+                and total_chars + 1 + len(next_item['content']) <= self.coalesce_max_chars
+            )
+            if not mergeable:
+                self._pending_items.appendleft(next_item)
+                break
+            
+            source_items.append(next_item)
+            parts.append(next_item['content'])
+            total_chars += 1 + len(next_item['content'])
+        
+        if len(parts) == 1:
+            return message_item, source_items
+        
+        self.coalesced_messages += len(parts) - 1
+        logger.info(f"合并文本消息: 接收者={message_item['to']}, 条数={len(parts)}, 长度={total_chars}")
+        merged_item = dict(message_item)
+        merged_item['content'] = '\n'.join(parts)
+        return merged_item, source_items
     
-    def _process_queue(self):
+    def _send_item(self, wechat_controller, message_item):
+        """
+        根据 action 类型发送一条消息
+        
+        Args:
+            wechat_controller: 微信控制器
+            message_item: 消息项
+            
+        Returns:
+            bool: 是否发送成功
+        """
+        contact = message_item['to']
+        content = message_item['content']
+        action = message_item.get('action', 'sendtext')  # 默认为文本消息
+        
+        if action == 'sendpic':
+            logger.info(f"开始处理图片消息: 接收者={contact}")
+            success = wechat_controller.search_and_send_picture(contact, content)
+            
+            if success:
+                logger.info(f"图片发送成功: 接收者={contact}")
+            else:
+                logger.error(f"图片发送失败: 接收者={contact}")
+        elif action == 'sendfile':
+            logger.info(f"开始处理文件消息: 接收者={contact}")
+            success = wechat_controller.search_and_send_file(contact, content)
+            
+            if success:
+                logger.info(f"文件发送成功: 接收者={contact}")
+            else:
+                logger.error(f"文件发送失败: 接收者={contact}")
+        else:
+            logger.info(f"开始处理文本消息: 接收者={contact}")
+            success = wechat_controller.search_and_send(contact, content)
+            
+            if success:
+                logger.info(f"文本消息发送成功: 接收者={contact}")
+            else:
+                logger.error(f"文本消息发送失败: 接收者={contact}")
+        
+        return success
+    
+    def _breaker_allows_sending(self, wechat_controller):
+        """
+        检查熔断器是否允许发送；半开状态下先探测微信窗口
+        
+        熔断期间不取出消息，队列保持不变
+        
+        Args:
+            wechat_controller: 微信控制器
+            
+        Returns:
+            bool: 是否可以继续取出消息发送
+        """
+        if not self.circuit_breaker:
+            return True
+        
+        if not self.circuit_breaker.allow_request():
+            time.sleep(1)
+            return False
+        
+        if self.circuit_breaker.is_half_open():
+            if wechat_controller.probe():
+                self.circuit_breaker.record_success()
+            else:
+                self.circuit_breaker.record_failure()
+                return False
+        
+        return True
+    
+    def _return_items(self, source_items):
+        """
+        把已取出但尚未发送的消息原样放回队首（不计尝试次数）
+        
+        Args:
+            source_items: 原始消息项列表
+        """
+        for source_item in reversed(source_items):
+            self._pending_items.appendleft(source_item)
+    
+    def _requeue(self, source_items):
+        """
+        把因窗口或界面故障未发送成功的消息放回队首，等待熔断恢复后重试
+        
+        Args:
+            source_items: 原始消息项列表
+            
+        Returns:
+            list: 超过最大尝试次数、不再重试的消息项
+        """
+        dropped = []
+        for source_item in reversed(source_items):
+            source_item['attempts'] = source_item.get('attempts', 1) + 1
+            if source_item['attempts'] > self.max_item_attempts:
+                dropped.append(source_item)
+            else:
+                self._pending_items.appendleft(source_item)
+        return dropped
+    
+    def _poll_monitor(self, wechat_controller, heartbeat):
+        """
+        在发送间隙轮询新消息（与发送共用处理线程和 COM 初始化）
+        
+        队列中有待发送的消息时按较长的间隔轮询，每次只读取会话列表顶部发生变化的会话，
+        不会挤占发送；预热完成前（窗口未找到）不轮询
+        
+        Args:
+            wechat_controller: 微信控制器
+            heartbeat: 本线程的心跳
+        """
+        if not self.message_monitor or not self.warmed_up:
+            return
+        busy = self._pending_count > 0 or bool(self._pending_items)
+        if not self.message_monitor.is_due(busy):
+            return
+        
+        heartbeat.begin('monitor_poll')
+        try:
+            self.message_monitor.poll(wechat_controller)
+        finally:
+            heartbeat.end()
+    
+    def _process_queue(self, heartbeat=None):
         """
         后台处理队列中的消息
         这是一个持续运行的线程函数
+        
+        Args:
+            heartbeat: 本线程的心跳（Heartbeat），被看门狗放弃后线程自行退出
         """
+        if heartbeat is None:
+            heartbeat = Heartbeat(0, ui_timeouts=self.ui_timeouts, idle_timeout=self.idle_timeout)
         logger.info("消息处理线程开始运行")
         
+        # 延迟导入 UI 自动化相关模块（耗时较长，且只有 Windows 环境可用）
+        try:
+            if self.simulate:
+                from simulated_controller import SimulatedController as WeChatController, FAILURE_WINDOW, FAILURE_UI
+                ui_context = contextlib.nullcontext()
+            else:
+                import uiautomation as auto
+                from wechat_controller import WeChatController, FAILURE_WINDOW, FAILURE_UI
+                ui_context = auto.UIAutomationInitializerInThread()
+        except Exception as e:
+            logger.error(f"加载 UI 自动化组件失败，消息处理线程退出: {str(e)}", exc_info=True)
+            return
+        
+        # 这些失败说明微信本身不可用，而不是某个接收者的问题，计入熔断器
+        breaker_failures = (FAILURE_WINDOW, FAILURE_UI)
+        
         # 在线程中初始化 COM，这是使用 uiautomation 在子线程中的必需步骤
-        with auto.UIAutomationInitializerInThread():
+        with ui_context:
             # 在线程中创建微信控制器
-            wechat_controller = WeChatController()
+            wechat_controller = WeChatController(
+                contact_index=self.contact_index,
+                **self.controller_options
+            )
+            wechat_controller.heartbeat = heartbeat
+            wechat_controller.pacer = self.pacer
+            if self.file_cache:
+                wechat_controller.file_cache = self.file_cache
+            self.wechat_controller = wechat_controller
             logger.info("微信控制器已在线程中初始化")
             
-            while self.running:
+            # 预热，第一条消息不必再冷启动查找窗口和控件
+            self._warm_up(wechat_controller)
+            
+            while self.running and not heartbeat.abandoned:
+                heartbeat.beat()
                 try:
+                    # 预热失败时定期重试
+                    if not self.warmed_up and time.time() - self._last_warmup_attempt >= self.warmup_retry_interval:
+                        self._warm_up(wechat_controller)
+                        if heartbeat.abandoned:
+                            break
+                    
+                    # 熔断期间暂停取出消息
+                    if not self._breaker_allows_sending(wechat_controller):
+                        continue
+                    
+                    # 发送间隙轮询新消息（未启用时直接返回）
+                    self._poll_monitor(wechat_controller, heartbeat)
+                    
+                    # 探测或轮询期间被看门狗替换：不再取出消息，避免与新线程同时操作界面
+                    if heartbeat.abandoned:
+                        break
+                    
                     # 尝试从队列获取消息，超时时间1秒
                     try:
-                        message_item = self.queue.get(timeout=1)
+                        message_item = self._get_next_item(timeout=1)
                     except queue.Empty:
                         # 队列为空，继续循环
                         continue
                     
-                    # 提取消息信息
-                    contact = message_item['to']
-                    content = message_item['content']
-                    action = message_item.get('action', 'sendtext')  # 默认为文本消息
+                    # 合并连续发给同一接收者的文本消息（未启用时原样返回）
+                    message_item, source_items = self._coalesce(message_item)
+                    
+                    # 取出消息期间被看门狗替换：消息原样放回队首，由新线程发送
+                    if not heartbeat.set_inflight(source_items):
+                        self._return_items(source_items)
+                        logger.warning(f"处理线程已被看门狗替换，已取出的消息放回队首: 接收者={message_item['to']}")
+                        break
+                    
+                    started_at = time.time()
+                    for source_item in source_items:
+                        source_item['started_at'] = started_at
+                        self._emit('started', {
+                            'job_id': source_item['job'].job_id,
+                            'tenant': source_item['job'].tenant,
+                            'to': source_item['to'],
+                            'action': message_item.get('action', 'sendtext')
+                        })
+                    if self.pacer:
+                        self.pacer.begin_send()
+                    success = self._send_item(wechat_controller, message_item)
+                    
+                    # 发送期间被看门狗判定为卡死：消息已被放回队列，由新线程处理；
+                    # 否则认领消息，之后看门狗不会再把它们放回队列
+                    if not heartbeat.claim_inflight():
+                        logger.warning(f"处理线程已被看门狗替换，放弃本次发送结果: 接收者={message_item['to']}")
+                        break
                     
-                    # 根据 action 类型发送消息
-                    if action == 'sendpic':
-                        logger.info(f"开始处理图片消息: 接收者={contact}")
-                        success = wechat_controller.search_and_send_picture(contact, content)
-                        
-                        if success:
-                            logger.info(f"图片发送成功: 接收者={contact}")
-                        else:
-                            logger.error(f"图片发送失败: 接收者={contact}")
-                    else:
-                        logger.info(f"开始处理文本消息: 接收者={contact}")
-                        success = wechat_controller.search_and_send(contact, content)
-                        
-                        if success:
-                            logger.info(f"文本消息发送成功: 接收者={contact}")
-                        else:
-                            logger.error(f"文本消息发送失败: 接收者={contact}")
+                    # 根据本次发送中的异常信号调整节奏
+                    if self.pacer:
+                        if not success and wechat_controller.failure_reason == FAILURE_UI:
+                            self.pacer.signal(SIGNAL_UI_ERROR)
+                        self.pacer.end_send()
                     
-                    # 标记任务完成
-                    self.queue.task_done()
+                    # 记录每个接收者的发送耗时（微信不可用导致的失败不代表正常耗时，不计入）
+                    if success or wechat_controller.failure_reason not in breaker_failures:
+                        self.estimator.record(
+                            message_item.get('action', 'sendtext'),
+                            (time.time() - started_at) / len(source_items),
+                            route=wechat_controller.last_route,
+                            media=wechat_controller.last_media
+                        )
                     
-                    # 等待指定的间隔时间再处理下一条消息
-                    time.sleep(self.message_interval)
+                    if success:
+                        if self.circuit_breaker:
+                            self.circuit_breaker.record_success()
+                        # 发送后会话预览变为发出的内容，告诉新消息监听这不是收到的消息
+                        if self.message_monitor:
+                            self.message_monitor.note_outbound(
+                                message_item['to'], message_item['content'], message_item.get('action', 'sendtext')
+                            )
+                    elif self.circuit_breaker and wechat_controller.failure_reason in breaker_failures:
+                        # 微信不可用导致的失败：计入熔断器，消息放回队首等待重试
+                        self.circuit_breaker.record_failure()
+                        source_items = self._requeue(source_items)
+                        if source_items:
+                            logger.error(f"消息超过最大尝试次数，放弃发送: 接收者={message_item['to']}")
                     
+                    # 记录发送结果（合并的每条消息都要记录到各自的任务）
+                    for source_item in source_items:
+                        self._record_result(source_item, success, wechat_controller.failure_reason)
+                    
+                    # 等待指定的间隔时间再处理下一条消息（启用节奏控制时按当前倍率缩放）
+                    time.sleep(self._send_interval())
+                    
+                except WorkerAbandoned:
+                    # 界面步骤之前发现已被看门狗替换，不再操作界面
+                    logger.warning(f"处理线程已被看门狗替换，停止操作界面: 线程代数={heartbeat.generation}")
+                    break
                 except Exception as e:
                     logger.error(f"处理消息时发生错误: {str(e)}", exc_info=True)
         
-        logger.info("消息处理线程已退出")
+        logger.info(f"消息处理线程已退出: 线程代数={heartbeat.generation}")
     
     def wait_until_empty(self, timeout=None):
         """
@@ -155,17 +1117,12 @@ class MessageQueue:
             bool: True 表示队列已空，False 表示超时
         """
         try:
-            if timeout:
-                self.queue.join()
-                return True
-            else:
-                # 使用超时等待
-                start_time = time.time()
-                while not self.queue.empty():
-                    if time.time() - start_time > timeout:
-                        return False
-                    time.sleep(0.1)
-                return True
+            start_time = time.time()
+            while self.get_queue_size() > 0:
+                if timeout is not None and time.time() - start_time > timeout:
+                    return False
+                time.sleep(0.1)
+            return True
         except Exception as e:
             logger.error(f"等待队列清空时发生错误: {str(e)}")
             return False
@@ -0,0 +1,201 @@
+"""
+自适应节奏模块
+按 AIMD（加性减、乘性增）调整界面操作之间的等待时间：
+发送顺利时每次把等待倍率减小一点，出现异常信号（会话未选中、剪贴板重试、
+找不到输入框、界面响应变慢等）时立即把倍率翻倍，倍率始终限制在配置的范围内
+
+WeChatController 中的固定等待和 message_interval 都乘以当前倍率
+
+只有在处理线程的 begin_send() 与 end_send() 之间收到的信号才计入本次发送；
+发送之外（预热、熔断探测、新消息轮询）或其他线程的信号只计数，不调整倍率
+"""
+import collections
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 异常信号
+SIGNAL_SESSION_NOT_SELECTED = 'session_not_selected'  # 点击或搜索后会话未被选中
+SIGNAL_CLIPBOARD_RETRY = 'clipboard_retry'            # 剪贴板写入或验证需要重试
+SIGNAL_INPUT_MISSING = 'input_missing'                # 找不到搜索框或聊天输入框
+SIGNAL_SLOW_UI = 'slow_ui'                            # 界面操作耗时明显高于平均水平
+SIGNAL_UI_ERROR = 'ui_error'                          # 发送因界面操作失败
+
+# 每个操作的耗时至少积累多少个样本后才判断是否变慢
+MIN_LATENCY_SAMPLES = 5
+
+# 耗时指数移动平均的平滑系数
+LATENCY_ALPHA = 0.2
+
+
+class AdaptivePacer:
+    """自适应节奏控制类，根据界面响应情况调整等待倍率"""
+
+    def __init__(self, min_scale=0.3, max_scale=3.0, step=0.05, backoff=2.0, slow_factor=3.0,
+                 max_decisions=20):
+        """
+        初始化节奏控制器
+
+        Args:
+            min_scale: 等待倍率下限（1.0 为原始等待时间）
+            max_scale: 等待倍率上限
+            step: 每次顺利发送后倍率减小的量
+            backoff: 出现异常信号后倍率乘以的系数
+            slow_factor: 操作耗时超过平均值的多少倍视为界面变慢
+            max_decisions: 状态查询中保留的最近调整记录数量
+        """
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.step = step
+        self.backoff = backoff
+        self.slow_factor = slow_factor
+        self.scale = min(max(1.0, min_scale), max_scale)
+        self.lock = threading.Lock()
+        # 本次发送期间收到的异常信号，以及正在发送的线程（None 表示不在发送中）
+        self._pending_signals = []
+        self._send_thread = None
+        # 各操作扣除主动等待后的耗时（指数移动平均，秒）和样本数
+        self.latencies = {}
+        self.latency_samples = collections.Counter()
+        self.signals = collections.Counter()
+        self.ignored_signals = collections.Counter()
+        self.speedups = 0
+        self.backoffs = 0
+        self.decisions = collections.deque(maxlen=max_decisions)
+
+    def pause(self, seconds):
+        """
+        按当前倍率等待
+
+        Args:
+            seconds: 原始等待时间（秒）
+
+        Returns:
+            float: 实际等待时间（秒）
+        """
+        delay = seconds * self.scale
+        time.sleep(delay)
+        return delay
+
+    def interval(self, seconds):
+        """
+        获取按当前倍率调整后的发送间隔
+
+        Args:
+            seconds: 配置的发送间隔（秒）
+
+        Returns:
+            float: 调整后的发送间隔（秒）
+        """
+        return seconds * self.scale
+
+    def begin_send(self):
+        """一次发送开始：之后当前线程的异常信号计入本次发送（丢弃上次未结束的发送留下的信号）"""
+        with self.lock:
+            self._pending_signals = []
+            self._send_thread = threading.get_ident()
+
+    def signal(self, name):
+        """
+        记录一个异常信号（在本次发送结束时统一处理）
+
+        Args:
+            name: 信号名称（SIGNAL_* 常量）
+
+        Returns:
+            bool: 是否计入本次发送（不在发送中或来自其他线程时只计数，返回 False）
+        """
+        with self.lock:
+            if self._send_thread != threading.get_ident():
+                self.ignored_signals[name] += 1
+                return False
+            self.signals[name] += 1
+            self._pending_signals.append(name)
+            return True
+
+    def record_latency(self, operation, seconds):
+        """
+        记录一次界面操作耗时（已扣除主动等待），明显高于平均值时记为 slow_ui 信号
+
+        Args:
+            operation: 操作名称
+            seconds: 耗时（秒）
+        """
+        with self.lock:
+            average = self.latencies.get(operation)
+            samples = self.latency_samples[operation]
+            slow = (
+                average is not None
+                and samples >= MIN_LATENCY_SAMPLES
+                and seconds > average * self.slow_factor
+            )
+            if average is None:
+                self.latencies[operation] = seconds
+            else:
+                self.latencies[operation] = average + LATENCY_ALPHA * (seconds - average)
+            self.latency_samples[operation] = samples + 1
+
+        if slow:
+            logger.info(f"界面操作变慢: 操作={operation}, 耗时={seconds:.2f}s, 平均={average:.2f}s")
+            self.signal(SIGNAL_SLOW_UI)
+
+    def end_send(self):
+        """
+        一次发送结束：没有异常信号时加性减小倍率，否则乘性增大倍率
+
+        Returns:
+            float: 调整后的倍率（没有对应的 begin_send() 时不调整）
+        """
+        with self.lock:
+            if self._send_thread != threading.get_ident():
+                return self.scale
+            signals = self._pending_signals
+            self._pending_signals = []
+            self._send_thread = None
+            previous = self.scale
+
+            # 倍率保留 6 位小数，避免浮点误差在下限附近产生无效的调整
+            if signals:
+                self.scale = round(min(self.max_scale, self.scale * self.backoff), 6)
+                self.backoffs += 1
+                action = 'backoff'
+            else:
+                self.scale = round(max(self.min_scale, self.scale - self.step), 6)
+                if self.scale < previous:
+                    self.speedups += 1
+                action = 'speedup'
+
+            # 只记录倍率实际变化的调整
+            if self.scale != previous:
+                self.decisions.append({
+                    'time': time.time(),
+                    'action': action,
+                    'scale': round(self.scale, 3),
+                    'signals': sorted(set(signals))
+                })
+            if action == 'backoff' and self.scale != previous:
+                logger.warning(f"界面响应异常，放慢发送节奏: 倍率 {previous:.2f} -> {self.scale:.2f}, 信号={sorted(set(signals))}")
+            return self.scale
+
+    def get_stats(self):
+        """
+        获取节奏控制统计
+
+        Returns:
+            dict: 当前倍率、调整次数、各信号次数（发送之外的信号单独统计）、操作耗时和最近的调整记录
+        """
+        with self.lock:
+            return {
+                'scale': round(self.scale, 3),
+                'min_scale': self.min_scale,
+                'max_scale': self.max_scale,
+                'speedups': self.speedups,
+                'backoffs': self.backoffs,
+                'signals': dict(self.signals),
+                'ignored_signals': dict(self.ignored_signals),
+                'latency_ms': {name: round(value * 1000, 1) for name, value in self.latencies.items()},
+                'decisions': list(self.decisions)
+            }
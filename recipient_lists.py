@@ -0,0 +1,273 @@
+"""
+接收者列表模块
+服务端保存的命名接收者列表（如 "vip_groups"），请求只需携带 "to_list": "vip_groups"，
+不必每次都发送并校验几百个名称的 to 数组
+
+列表保存时即完成校验和去重，成员保存为驻留（sys.intern）字符串组成的元组：
+同一名称在多个列表中只占一份内存，群发任务直接引用该元组（tuple() 不会复制），处理线程按游标遍历；
+增删成员时生成新元组，已入队的任务不受影响
+
+列表按租户隔离，保存在 JSON 文件中：
+    {"租户": {"列表编号": {"members": ["接收者1", "接收者2"], "updated_at": 时间戳}}}
+"""
+import json
+import os
+import sys
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+def normalize_members(members, max_name_length=100):
+    """
+    校验接收者名称并去重（保持原有顺序），名称转换为驻留字符串
+
+    Args:
+        members: 接收者名称列表
+        max_name_length: 名称的最大字符数
+
+    Returns:
+        tuple: 去重后的接收者名称
+
+    Raises:
+        ValueError: 不是数组或包含空名称、非字符串、过长的名称
+    """
+    if not isinstance(members, list):
+        raise ValueError("接收者必须是字符串数组")
+    for name in members:
+        if not isinstance(name, str) or not name:
+            raise ValueError("接收者名称必须是非空字符串")
+        if len(name) > max_name_length:
+            raise ValueError(f"接收者名称不能超过 {max_name_length} 个字符: {name[:20]}...")
+    return tuple(dict.fromkeys(sys.intern(name) for name in members))
+
+
+class RecipientList:
+    """命名接收者列表（创建后不再修改，增删成员时生成新的对象）"""
+
+    __slots__ = ('list_id', 'members', 'updated_at')
+
+    def __init__(self, list_id, members, updated_at=None):
+        """
+        初始化接收者列表
+
+        Args:
+            list_id: 列表编号
+            members: 已校验、去重的接收者名称元组
+            updated_at: 更新时间（时间戳），None 表示当前时间
+        """
+        self.list_id = list_id
+        self.members = members
+        self.updated_at = updated_at or time.time()
+
+    def to_dict(self, include_members=True):
+        """
+        获取列表信息
+
+        Args:
+            include_members: 是否包含成员
+
+        Returns:
+            dict: 列表编号、成员数量、更新时间（以及成员）
+        """
+        info = {
+            'list_id': self.list_id,
+            'count': len(self.members),
+            'updated_at': self.updated_at
+        }
+        if include_members:
+            info['members'] = list(self.members)
+        return info
+
+
+class RecipientListStore:
+    """接收者列表存储类，按租户保存列表并持久化到文件"""
+
+    def __init__(self, store_file='recipient_lists.json', max_lists=1000, max_members=10000,
+                 max_name_length=100):
+        """
+        初始化接收者列表存储（会从文件加载已有列表）
+
+        Args:
+            store_file: 列表文件路径，None 表示不持久化
+            max_lists: 每个租户最多保存的列表数量
+            max_members: 每个列表最多包含的接收者数量
+            max_name_length: 接收者名称的最大字符数
+        """
+        self.store_file = store_file
+        self.max_lists = max_lists
+        self.max_members = max_members
+        self.max_name_length = max_name_length
+        self.lock = threading.Lock()
+        # 租户 -> {列表编号: RecipientList}
+        self.lists = {}
+        self._load()
+
+    def _load(self):
+        """从文件加载列表，文件不存在或损坏时从空存储开始"""
+        if not self.store_file or not os.path.exists(self.store_file):
+            return
+
+        try:
+            with open(self.store_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            count = 0
+            for tenant, entries in data.items():
+                for list_id, entry in entries.items():
+                    try:
+                        members = normalize_members(entry['members'], self.max_name_length)
+                    except (KeyError, ValueError) as e:
+                        logger.warning(f"跳过无效接收者列表: {tenant}/{list_id}, {str(e)}")
+                        continue
+                    self.lists.setdefault(tenant, {})[list_id] = RecipientList(
+                        list_id, members, entry.get('updated_at')
+                    )
+                    count += 1
+            logger.info(f"已加载接收者列表: {count} 个")
+        except Exception as e:
+            logger.warning(f"加载接收者列表失败，将使用空列表库: {str(e)}")
+            self.lists = {}
+
+    def _save(self):
+        """将列表写入文件（调用方持有锁，先写临时文件再替换）"""
+        if not self.store_file:
+            return
+
+        data = {
+            tenant: {
+                list_id: {'members': list(recipient_list.members), 'updated_at': recipient_list.updated_at}
+                for list_id, recipient_list in entries.items()
+            }
+            for tenant, entries in self.lists.items() if entries
+        }
+        try:
+            tmp_file = f"{self.store_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.store_file)
+        except Exception as e:
+            logger.warning(f"保存接收者列表失败: {str(e)}")
+
+    def _check_size(self, members):
+        """
+        检查列表大小
+
+        Args:
+            members: 接收者名称元组
+
+        Raises:
+            ValueError: 超出列表大小上限
+        """
+        if len(members) > self.max_members:
+            raise ValueError(f"接收者列表不能超过 {self.max_members} 个接收者")
+
+    def get(self, tenant, list_id):
+        """
+        获取接收者列表
+
+        Args:
+            tenant: 租户名称
+            list_id: 列表编号
+
+        Returns:
+            RecipientList: 接收者列表，不存在时返回 None
+        """
+        with self.lock:
+            return self.lists.get(tenant, {}).get(list_id)
+
+    def put(self, tenant, list_id, members):
+        """
+        创建或整体替换接收者列表
+
+        Args:
+            tenant: 租户名称
+            list_id: 列表编号
+            members: 接收者名称列表
+
+        Returns:
+            tuple: (接收者列表, 是否新建)
+
+        Raises:
+            ValueError: 名称不合法、超出列表大小或数量上限
+        """
+        members = normalize_members(members, self.max_name_length)
+        self._check_size(members)
+        recipient_list = RecipientList(list_id, members)
+
+        with self.lock:
+            entries = self.lists.setdefault(tenant, {})
+            created = list_id not in entries
+            if created and len(entries) >= self.max_lists:
+                raise ValueError(f"接收者列表数量已达上限 {self.max_lists}")
+            entries[list_id] = recipient_list
+            self._save()
+        logger.info(f"{'创建' if created else '替换'}接收者列表: {tenant}/{list_id}, 接收者数量={len(members)}")
+        return recipient_list, created
+
+    def update(self, tenant, list_id, add=None, remove=None):
+        """
+        增删接收者（新增的接收者追加到末尾，已存在的忽略；先删除再新增）
+
+        Args:
+            tenant: 租户名称
+            list_id: 列表编号
+            add: 要新增的接收者名称列表
+            remove: 要删除的接收者名称列表
+
+        Returns:
+            RecipientList: 更新后的接收者列表，列表不存在时返回 None
+
+        Raises:
+            ValueError: 名称不合法或超出列表大小上限
+        """
+        add = normalize_members(add if add is not None else [], self.max_name_length)
+        remove = set(normalize_members(remove if remove is not None else [], self.max_name_length))
+
+        with self.lock:
+            entries = self.lists.get(tenant, {})
+            current = entries.get(list_id)
+            if current is None:
+                return None
+            kept = [name for name in current.members if name not in remove] if remove else list(current.members)
+            members = tuple(dict.fromkeys(kept + list(add)))
+            self._check_size(members)
+            recipient_list = RecipientList(list_id, members)
+            entries[list_id] = recipient_list
+            self._save()
+        logger.info(f"更新接收者列表: {tenant}/{list_id}, 新增={len(add)}, 删除={len(remove)}, 接收者数量={len(members)}")
+        return recipient_list
+
+    def delete(self, tenant, list_id):
+        """
+        删除接收者列表（已入队的任务不受影响）
+
+        Args:
+            tenant: 租户名称
+            list_id: 列表编号
+
+        Returns:
+            bool: 列表存在并已删除时返回 True
+        """
+        with self.lock:
+            if self.lists.get(tenant, {}).pop(list_id, None) is None:
+                return False
+            self._save()
+        logger.info(f"删除接收者列表: {tenant}/{list_id}")
+        return True
+
+    def list(self, tenant):
+        """
+        列出租户的所有接收者列表（不含成员）
+
+        Args:
+            tenant: 租户名称
+
+        Returns:
+            list: 列表信息（按编号排序）
+        """
+        with self.lock:
+            entries = self.lists.get(tenant, {})
+            return [entries[list_id].to_dict(include_members=False) for list_id in sorted(entries)]
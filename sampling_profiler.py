@@ -0,0 +1,165 @@
+"""
+采样分析模块
+按固定间隔读取所有线程的调用栈（sys._current_frames），统计各调用栈出现的次数，
+输出 collapsed 格式（每行 "线程;外层函数;...;内层函数 次数"，可直接交给 flamegraph.pl 或 speedscope 生成火焰图）
+
+采样在调用方线程中进行，被分析的线程（包括 _process_queue 中的 COM 处理线程）不需要任何改动，
+未在采样时没有任何额外开销
+"""
+import collections
+import os
+import sys
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class SamplingProfiler:
+    """采样分析类，同一时间只允许一次采样"""
+
+    def __init__(self, max_duration=60, min_interval=0.001):
+        """
+        初始化采样分析器
+
+        Args:
+            max_duration: 单次采样的最长时间（秒）
+            min_interval: 允许的最小采样间隔（秒）
+        """
+        self.max_duration = max_duration
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        # 代码对象 -> 栈帧标签（避免每次采样都重新格式化）
+        self._labels = {}
+
+    def _label(self, code):
+        """
+        获取代码对象的栈帧标签，如 "search_contact (wechat_controller.py:234)"
+
+        Args:
+            code: 代码对象
+
+        Returns:
+            str: 栈帧标签
+        """
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def profile(self, duration, interval=0.01, thread_filter=None):
+        """
+        在当前线程中采样 duration 秒（阻塞）
+
+        Args:
+            duration: 采样时长（秒），超过 max_duration 时截断
+            interval: 采样间隔（秒）
+            thread_filter: 只统计名称包含该字符串的线程，None 表示所有线程
+
+        Returns:
+            dict: 采样结果（samples、duration、threads、stacks），已有采样在进行时返回 None
+        """
+        if not self.lock.acquire(blocking=False):
+            return None
+
+        try:
+            duration = min(max(duration, 0), self.max_duration)
+            interval = max(interval, self.min_interval)
+            own_ident = threading.get_ident()
+            stacks = collections.Counter()
+            thread_samples = collections.Counter()
+            samples = 0
+
+            logger.info(f"开始采样分析: 时长={duration}s, 间隔={interval}s, 线程过滤={thread_filter}")
+            start = time.perf_counter()
+            deadline = start + duration
+            next_sample = start
+            while True:
+                now = time.perf_counter()
+                if now >= deadline:
+                    break
+                if now < next_sample:
+                    time.sleep(next_sample - now)
+                next_sample += interval
+
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    name = names.get(ident, f'thread-{ident}')
+                    if thread_filter and thread_filter not in name:
+                        continue
+
+                    frames = []
+                    while frame is not None:
+                        frames.append(self._label(frame.f_code))
+                        frame = frame.f_back
+                    frames.append(name)
+                    frames.reverse()
+                    stacks[tuple(frames)] += 1
+                    thread_samples[name] += 1
+                samples += 1
+
+            elapsed = time.perf_counter() - start
+            logger.info(f"采样分析完成: 采样次数={samples}, 耗时={elapsed:.2f}s")
+            return {
+                'samples': samples,
+                'duration': round(elapsed, 3),
+                'interval': interval,
+                'threads': dict(thread_samples),
+                'stacks': stacks
+            }
+        finally:
+            self.lock.release()
+
+
+def format_collapsed(result):
+    """
+    把采样结果格式化为 collapsed 格式
+
+    Args:
+        result: profile() 返回的采样结果
+
+    Returns:
+        str: 每行 "线程;外层函数;...;内层函数 次数"
+    """
+    lines = [
+        f"{';'.join(frame.replace(';', ':') for frame in stack)} {count}"
+        for stack, count in result['stacks'].most_common()
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def summarize(result, top=30):
+    """
+    汇总采样结果（JSON 格式）：最常见的调用栈和自身耗时最多的函数
+
+    Args:
+        result: profile() 返回的采样结果
+        top: 返回的条目数量
+
+    Returns:
+        dict: 采样概要
+    """
+    leaf_counts = collections.Counter()
+    for stack, count in result['stacks'].items():
+        leaf_counts[stack[-1]] += count
+    total = sum(result['stacks'].values()) or 1
+
+    return {
+        'samples': result['samples'],
+        'duration': result['duration'],
+        'interval': result['interval'],
+        'threads': result['threads'],
+        'top_functions': [
+            {'function': label, 'samples': count, 'ratio': round(count / total, 4)}
+            for label, count in leaf_counts.most_common(top)
+        ],
+        'top_stacks': [
+            {'stack': list(stack), 'samples': count}
+            for stack, count in result['stacks'].most_common(top)
+        ]
+    }
@@ -0,0 +1,121 @@
+"""
+发送耗时估计模块
+按消息类型和发送路径（会话列表命中 / 搜索框兜底，图片或文件缓存命中 / 需要下载）
+分别统计每个接收者的发送耗时（指数移动平均），同时统计各路径最近出现的比例，
+两者加权得到每种消息类型的预期耗时，用于估计新任务的开始和完成时间以及队列的排空能力
+
+本模块不做任何界面操作，由处理线程在每次发送后调用 record()
+"""
+import threading
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 媒体文件（图片、文件）是否已在缓存中
+MEDIA_CACHED = 'cached'
+MEDIA_DOWNLOAD = 'download'
+
+# 没有样本时使用的每个接收者发送耗时（秒）
+DEFAULT_SERVICE_TIMES = {
+    'sendtext': 3.0,
+    'sendpic': 6.0,
+    'sendfile': 10.0
+}
+
+
+def path_label(route, media=None):
+    """
+    生成发送路径的名称，如 "session_list"、"search+download"
+
+    Args:
+        route: 找到联系人的策略，None 表示未知
+        media: 媒体缓存状态（MEDIA_CACHED 或 MEDIA_DOWNLOAD），文本消息为 None
+
+    Returns:
+        str: 路径名称
+    """
+    label = route or 'unknown'
+    return f"{label}+{media}" if media else label
+
+
+class ServiceTimeEstimator:
+    """发送耗时估计类，线程安全"""
+
+    def __init__(self, alpha=0.1, default_times=None):
+        """
+        初始化耗时估计
+
+        Args:
+            alpha: 指数移动平均的平滑系数（越大越偏重最近的样本）
+            default_times: 没有样本时各消息类型的每个接收者耗时（秒），覆盖 DEFAULT_SERVICE_TIMES
+        """
+        self.alpha = alpha
+        self.default_times = dict(DEFAULT_SERVICE_TIMES)
+        self.default_times.update(default_times or {})
+        self.lock = threading.Lock()
+        # 消息类型 -> {路径名称: [耗时平均值（秒）, 最近出现的比例, 样本数]}
+        self.paths = {}
+
+    def record(self, action, seconds, route=None, media=None):
+        """
+        记录一个接收者的发送耗时
+
+        Args:
+            action: 消息类型
+            seconds: 发送耗时（秒，不含发送间隔）
+            route: 找到联系人的策略
+            media: 媒体缓存状态
+        """
+        label = path_label(route, media)
+        with self.lock:
+            paths = self.paths.setdefault(action, {})
+            first = not paths
+            # 各路径的比例也按指数移动平均更新，比例之和始终为 1
+            for entry in paths.values():
+                entry[1] *= 1 - self.alpha
+            entry = paths.get(label)
+            if entry is None:
+                paths[label] = [seconds, 1.0 if first else self.alpha, 1]
+            else:
+                entry[0] += self.alpha * (seconds - entry[0])
+                entry[1] += self.alpha
+                entry[2] += 1
+
+    def estimate(self, action):
+        """
+        估计一个接收者的发送耗时（各路径耗时按最近出现的比例加权）
+
+        Args:
+            action: 消息类型
+
+        Returns:
+            float: 预期耗时（秒，不含发送间隔）
+        """
+        with self.lock:
+            paths = self.paths.get(action)
+            if not paths:
+                return self.default_times.get(action, self.default_times['sendtext'])
+            total_share = sum(entry[1] for entry in paths.values())
+            return sum(entry[0] * entry[1] for entry in paths.values()) / total_share
+
+    def get_stats(self):
+        """
+        获取各消息类型、各路径的耗时统计
+
+        Returns:
+            dict: 消息类型 -> 预期耗时、样本数和各路径的耗时与比例
+        """
+        stats = {}
+        for action in sorted(set(self.default_times) | set(self.paths)):
+            with self.lock:
+                paths = {
+                    label: {'avg_s': round(entry[0], 3), 'share': round(entry[1], 3), 'samples': entry[2]}
+                    for label, entry in self.paths.get(action, {}).items()
+                }
+            stats[action] = {
+                'estimate_s': round(self.estimate(action), 3),
+                'samples': sum(entry['samples'] for entry in paths.values()),
+                'paths': paths
+            }
+        return stats
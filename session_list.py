@@ -0,0 +1,217 @@
+"""
+会话列表快照模块
+一次性枚举左侧会话列表，建立 联系人名称 → 会话控件 的映射，
+之后只增量刷新列表顶部的少量会话，避免每条消息都做一次深度树搜索
+"""
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 会话项控件的类名和 AutomationId 前缀（格式: session_item_[联系人名]）
+SESSION_CELL_CLASS = 'mmui::ChatSessionCell'
+SESSION_ID_PREFIX = 'session_item_'
+
+
+class SessionListCache:
+    """会话列表快照类，维护会话名称到会话控件的映射"""
+
+    def __init__(self, refresh_top=5, full_refresh_interval=300):
+        """
+        初始化会话列表快照
+
+        Args:
+            refresh_top: 每次发送后增量刷新的顶部会话数量
+            full_refresh_interval: 全量刷新的最大间隔（秒）
+        """
+        self.refresh_top = refresh_top
+        self.full_refresh_interval = full_refresh_interval
+        self.list_control = None
+        self.cells = {}
+        self.last_full_refresh = 0
+
+        # 统计信息
+        self.hits = 0
+        self.misses = 0
+        self.stale_cells = 0
+        self.full_refreshes = 0
+        self.partial_refreshes = 0
+
+    @staticmethod
+    def _contact_name_of(cell):
+        """
+        从会话控件的 AutomationId 中解析联系人名称
+
+        Args:
+            cell: 会话项控件
+
+        Returns:
+            str: 联系人名称，无法解析时返回 None
+        """
+        try:
+            automation_id = cell.AutomationId or ''
+        except Exception:
+            return None
+        if not automation_id.startswith(SESSION_ID_PREFIX):
+            return None
+        return automation_id[len(SESSION_ID_PREFIX):]
+
+    def _iter_cells(self, limit=None):
+        """
+        按列表顺序遍历会话项控件
+
+        Args:
+            limit: 最多遍历的会话数量，None 表示遍历全部
+
+        Yields:
+            tuple: (联系人名称, 会话控件)
+        """
+        if self.list_control is None:
+            return
+
+        count = 0
+        child = self.list_control.GetFirstChildControl()
+        while child is not None:
+            if child.ClassName == SESSION_CELL_CLASS:
+                name = self._contact_name_of(child)
+                if name is not None:
+                    yield name, child
+                    count += 1
+                    if limit is not None and count >= limit:
+                        return
+            child = child.GetNextSiblingControl()
+
+    def iter_texts(self):
+        """
+        按列表顺序读取会话项文本（供新消息监听增量比较，调用方可以随时停止迭代）
+
+        Yields:
+            tuple: (联系人名称, 会话项文本)
+        """
+        for name, cell in self._iter_cells():
+            yield name, cell.Name
+
+    def is_stale(self):
+        """
+        判断快照是否需要全量刷新
+
+        Returns:
+            bool: 从未刷新或超过全量刷新间隔时返回 True
+        """
+        if self.list_control is None:
+            return True
+        return time.time() - self.last_full_refresh >= self.full_refresh_interval
+
+    def full_refresh(self, wx):
+        """
+        全量枚举会话列表，重建映射
+
+        Args:
+            wx: 微信窗口控件
+
+        Returns:
+            int: 快照中的会话数量
+        """
+        self.cells = {}
+        self.list_control = None
+        self.last_full_refresh = time.time()
+        self.full_refreshes += 1
+
+        try:
+            # 只做一次深度搜索找到任意一个会话项，然后通过它的父控件遍历整个列表
+            first_cell = wx.Control(ClassName=SESSION_CELL_CLASS, searchDepth=15)
+            if not first_cell.Exists(0, 0):
+                logger.debug("会话列表为空或未找到会话列表")
+                return 0
+
+            self.list_control = first_cell.GetParentControl()
+            for name, cell in self._iter_cells():
+                self.cells[name] = cell
+
+            logger.debug(f"会话列表全量刷新完成: {len(self.cells)} 个会话")
+        except Exception as e:
+            logger.debug(f"会话列表全量刷新失败: {str(e)}")
+            self.list_control = None
+            self.cells = {}
+
+        return len(self.cells)
+
+    def refresh(self, wx):
+        """
+        增量刷新列表顶部的会话（发送后当前会话会被移动到顶部）
+
+        Args:
+            wx: 微信窗口控件
+        """
+        if self.is_stale():
+            self.full_refresh(wx)
+            return
+
+        try:
+            self.partial_refreshes += 1
+            for name, cell in self._iter_cells(limit=self.refresh_top):
+                self.cells[name] = cell
+        except Exception as e:
+            logger.debug(f"会话列表增量刷新失败，改为全量刷新: {str(e)}")
+            self.full_refresh(wx)
+
+    def _is_valid(self, name, cell):
+        """检查缓存的会话控件是否仍然存在且仍对应该联系人"""
+        try:
+            return cell.Exists(0, 0) and self._contact_name_of(cell) == name
+        except Exception:
+            return False
+
+    def lookup(self, wx, contact_name):
+        """
+        在快照中查找联系人的会话控件
+
+        缓存的控件失效（会话被移除或控件被复用）时，会全量刷新一次后重新查找
+
+        Args:
+            wx: 微信窗口控件
+            contact_name: 联系人名称
+
+        Returns:
+            Control: 会话控件，不在会话列表中时返回 None
+        """
+        if self.is_stale():
+            self.full_refresh(wx)
+
+        cell = self.cells.get(contact_name)
+        if cell is not None and not self._is_valid(contact_name, cell):
+            self.stale_cells += 1
+            self.full_refresh(wx)
+            cell = self.cells.get(contact_name)
+            if cell is not None and not self._is_valid(contact_name, cell):
+                cell = None
+
+        if cell is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return cell
+
+    def invalidate(self):
+        """使快照失效，下次查找时全量刷新"""
+        self.list_control = None
+        self.cells = {}
+
+    def get_stats(self):
+        """
+        获取快照统计信息
+
+        Returns:
+            dict: 快照大小、命中率和刷新次数
+        """
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.cells),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None,
+            'stale_cells': self.stale_cells,
+            'full_refreshes': self.full_refreshes,
+            'partial_refreshes': self.partial_refreshes
+        }
@@ -0,0 +1,252 @@
+"""
+模拟微信控制器模块
+接口与 WeChatController 相同，但不操作任何界面：按配置的耗时等待并随机产生失败，
+用于在没有微信客户端（或非 Windows 环境）时压测 HTTP 服务、队列和调度逻辑
+
+同时维护一个模拟的会话列表：发送成功后会话移动到顶部并显示发出的内容，
+simulate_incoming() 模拟收到新消息，用于测试新消息监听
+
+在 config.json 中设置 "controller": "simulated" 启用
+"""
+import contextlib
+import random
+import threading
+import time
+import logging
+from contact_index import STRATEGY_SEARCH
+from session_list import SessionListCache
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 发送失败原因（取值与 wechat_controller 中的常量相同）
+FAILURE_WINDOW = 'window_not_found'
+FAILURE_UI = 'ui_error'
+FAILURE_CONTACT = 'contact_not_found'
+FAILURE_DOWNLOAD = 'download_failed'
+
+# 模拟会话列表最多保留的会话数量（压测时接收者很多，避免列表无限增长）
+MAX_SESSIONS = 500
+
+
+class SimulatedController:
+    """模拟微信控制器类，按固定耗时模拟搜索联系人和发送消息"""
+
+    def __init__(self, contact_index=None, search_time=0.3, send_time=0.2, picture_time=0.6,
+                 file_time=1.0, jitter=0.2, contact_failure_rate=0.0, ui_failure_rate=0.0, seed=None,
+                 cell_read_time=0.0):
+        """
+        初始化模拟控制器
+
+        Args:
+            contact_index: 联系人解析索引（模拟控制器不使用，保持接口一致）
+            search_time: 模拟搜索联系人的耗时（秒）
+            send_time: 模拟发送文本的耗时（秒）
+            picture_time: 模拟发送图片的耗时（秒）
+            file_time: 模拟发送文件的耗时（秒）
+            jitter: 耗时的随机波动比例（0.2 表示 ±20%）
+            contact_failure_rate: 找不到联系人的概率
+            ui_failure_rate: 界面操作失败的概率
+            seed: 随机数种子，None 表示不固定
+            cell_read_time: 模拟读取一个会话项文本的耗时（秒）
+        """
+        self.contact_index = contact_index
+        self.search_time = search_time
+        self.send_time = send_time
+        self.picture_time = picture_time
+        self.file_time = file_time
+        self.jitter = jitter
+        self.contact_failure_rate = contact_failure_rate
+        self.ui_failure_rate = ui_failure_rate
+        self.random = random.Random(seed)
+        self.failure_reason = None
+        # 模拟控制器总是按搜索耗时模拟找到联系人
+        self.last_route = STRATEGY_SEARCH
+        self.last_media = None
+        self.heartbeat = None
+        self.pacer = None
+        self.file_cache = None
+        self.session_cache = SessionListCache()
+        self.sends = 0
+        self.cell_read_time = cell_read_time
+        # 模拟的会话列表：[联系人名称, 会话项文本]，顶部在前
+        self.sessions_lock = threading.Lock()
+        self.sessions = []
+        self.cells_read = 0
+
+    @contextlib.contextmanager
+    def _operation(self, name):
+        """
+        标记一个模拟操作的开始和结束（供看门狗检测卡死）
+
+        Args:
+            name: 操作名称
+        """
+        if self.heartbeat is not None:
+            self.heartbeat.begin(name)
+        try:
+            yield
+        finally:
+            if self.heartbeat is not None:
+                self.heartbeat.end()
+
+    def _simulate(self, seconds):
+        """
+        按配置耗时等待（启用节奏控制时按当前倍率缩放）
+
+        Args:
+            seconds: 基准耗时（秒）
+
+        Raises:
+            WorkerAbandoned: 处理线程已被看门狗放弃（不再执行下一个模拟步骤）
+        """
+        delay = seconds * (1 + self.random.uniform(-self.jitter, self.jitter))
+        if self.pacer is not None:
+            self.pacer.pause(delay)
+        else:
+            time.sleep(delay)
+        if self.heartbeat is not None:
+            self.heartbeat.check_abandoned()
+
+    def get_clipboard_stats(self):
+        """
+        获取剪贴板统计（模拟控制器不使用剪贴板）
+
+        Returns:
+            dict: 写入次数和复用次数
+        """
+        return {'writes': 0, 'reuses': 0}
+
+    def probe(self):
+        """
+        探测微信窗口是否可用
+
+        Returns:
+            bool: 模拟窗口始终可用
+        """
+        self.failure_reason = None
+        return True
+
+    def warm_up(self, prefetch_urls=None):
+        """
+        模拟预热
+
+        Args:
+            prefetch_urls: 需要预先建立连接的 URL 列表（忽略）
+
+        Returns:
+            dict: 预热结果
+        """
+        return {'window': True, 'sessions': 0, 'http_connections': 0, 'duration_ms': 0.0, 'simulated': True}
+
+    def _move_to_top(self, contact_name, text):
+        """
+        把会话移动到模拟会话列表顶部并更新文本
+
+        Args:
+            contact_name: 联系人名称
+            text: 会话项文本
+        """
+        with self.sessions_lock:
+            self.sessions = [cell for cell in self.sessions if cell[0] != contact_name]
+            self.sessions.insert(0, [contact_name, text])
+            del self.sessions[MAX_SESSIONS:]
+
+    def simulate_incoming(self, contact_name, message, unread=1):
+        """
+        模拟收到一条新消息（会话移动到顶部，显示未读数和消息预览）
+
+        Args:
+            contact_name: 联系人名称
+            message: 消息内容
+            unread: 收到消息后的未读数，0 表示当前正打开该会话（不显示未读数）
+        """
+        prefix = f"[{unread}条]" if unread else ''
+        self._move_to_top(contact_name, f"{contact_name}\n{prefix}{message}\n{time.strftime('%H:%M')}")
+
+    def iter_session_cells(self):
+        """
+        按列表顺序读取模拟会话项文本
+
+        Yields:
+            tuple: (联系人名称, 会话项文本)
+        """
+        with self.sessions_lock:
+            sessions = [tuple(cell) for cell in self.sessions]
+        for cell in sessions:
+            if self.cell_read_time:
+                time.sleep(self.cell_read_time)
+            self.cells_read += 1
+            yield cell
+
+    def _send(self, contact_name, operation, seconds, preview):
+        """
+        模拟一次搜索联系人并发送
+
+        Args:
+            contact_name: 联系人名称
+            operation: 发送操作名称（send_message、send_picture 或 send_file）
+            seconds: 发送耗时（秒）
+            preview: 发送成功后会话项显示的预览
+
+        Returns:
+            bool: 是否发送成功
+        """
+        self.failure_reason = None
+
+        with self._operation('search_contact'):
+            self._simulate(self.search_time)
+        if self.random.random() < self.contact_failure_rate:
+            self.failure_reason = FAILURE_CONTACT
+            logger.debug(f"模拟找不到联系人: {contact_name}")
+            return False
+
+        with self._operation(operation):
+            self._simulate(seconds)
+        if self.random.random() < self.ui_failure_rate:
+            self.failure_reason = FAILURE_UI
+            logger.debug(f"模拟界面操作失败: {contact_name}")
+            return False
+
+        self.sends += 1
+        self._move_to_top(contact_name, f"{contact_name}\n{preview}\n{time.strftime('%H:%M')}")
+        return True
+
+    def search_and_send(self, contact_name, message):
+        """
+        模拟搜索联系人并发送文本
+
+        Args:
+            contact_name: 联系人名称
+            message: 消息内容
+
+        Returns:
+            bool: 是否发送成功
+        """
+        return self._send(contact_name, 'send_message', self.send_time, message.split('\n')[-1])
+
+    def search_and_send_picture(self, contact_name, image_url):
+        """
+        模拟搜索联系人并发送图片
+
+        Args:
+            contact_name: 联系人名称
+            image_url: 图片 URL
+
+        Returns:
+            bool: 是否发送成功
+        """
+        return self._send(contact_name, 'send_picture', self.picture_time, '[图片]')
+
+    def search_and_send_file(self, contact_name, file_url):
+        """
+        模拟搜索联系人并发送文件
+
+        Args:
+            contact_name: 联系人名称
+            file_url: 文件 URL
+
+        Returns:
+            bool: 是否发送成功
+        """
+        return self._send(contact_name, 'send_file', self.file_time, '[文件]')
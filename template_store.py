@@ -0,0 +1,277 @@
+"""
+消息模板模块
+服务端保存的消息模板（如 "您好 {name}，您的订单 {order_id} 已发货"），保存时预先编译为文本片段和变量名，
+请求只需携带模板编号和紧凑的变量表（列名 + 每个接收者一行），处理线程在发送前逐条渲染
+
+模板按租户隔离，保存在 JSON 文件中：
+    {"租户": {"模板编号": {"content": "模板内容", "updated_at": 时间戳}}}
+
+变量写法为 {变量名}（变量名须为合法标识符），{to} 表示接收者名称，{{ 和 }} 表示字面的花括号
+"""
+import json
+import os
+import string
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 内置变量：接收者名称
+RECIPIENT_FIELD = 'to'
+
+
+class Template:
+    """预编译的消息模板（创建后不再修改，已入队的任务不受模板后续更新影响）"""
+
+    __slots__ = ('template_id', 'source', 'parts', 'fields', 'updated_at')
+
+    # parts 中表示接收者名称的下标
+    RECIPIENT_INDEX = -1
+
+    def __init__(self, template_id, source, updated_at=None):
+        """
+        初始化并编译模板
+
+        Args:
+            template_id: 模板编号
+            source: 模板内容
+            updated_at: 更新时间（时间戳），None 表示当前时间
+
+        Raises:
+            ValueError: 模板语法错误或变量名不合法
+        """
+        self.template_id = template_id
+        self.source = source
+        self.updated_at = updated_at or time.time()
+        parts = []
+        try:
+            parsed = list(string.Formatter().parse(source))
+        except ValueError as e:
+            raise ValueError(f"模板语法错误: {str(e)}")
+        for literal, field, format_spec, conversion in parsed:
+            if field is not None:
+                if not field.isidentifier() or format_spec or conversion:
+                    raise ValueError(f"不支持的模板变量: {{{field}}}（只支持 {{变量名}} 形式）")
+            parts.append((literal, field))
+        # 模板用到的变量（不含 to），按首次出现顺序
+        self.fields = tuple(dict.fromkeys(
+            field for _, field in parts if field is not None and field != RECIPIENT_FIELD
+        ))
+        # 编译结果：(字面文本, 变量值下标) 元组，下标为 None 表示只有字面文本，RECIPIENT_INDEX 表示接收者名称
+        self.parts = tuple(
+            (literal, None if field is None
+             else self.RECIPIENT_INDEX if field == RECIPIENT_FIELD
+             else self.fields.index(field))
+            for literal, field in parts
+        )
+
+    def bind(self, columns, rows, recipient_count):
+        """
+        校验变量表并压缩为只包含模板用到的列
+
+        Args:
+            columns: 列名列表
+            rows: 每个接收者一行的变量值列表（与接收者顺序一致）
+            recipient_count: 接收者数量
+
+        Returns:
+            tuple: 每行一个元组，元素顺序与 fields 一致（值已转换为字符串）
+
+        Raises:
+            ValueError: 缺少模板用到的列、行数与接收者数量不一致或值类型不支持
+        """
+        if not isinstance(columns, list) or not all(isinstance(column, str) for column in columns):
+            raise ValueError("'vars.columns' 必须是字符串数组")
+        missing = [field for field in self.fields if field not in columns]
+        if missing:
+            raise ValueError(f"变量表缺少模板用到的列: {', '.join(missing)}")
+        if not isinstance(rows, list) or len(rows) != recipient_count:
+            raise ValueError("'vars.rows' 的行数必须与接收者数量一致")
+
+        indexes = [columns.index(field) for field in self.fields]
+        bound = []
+        for row in rows:
+            if not isinstance(row, list) or len(row) != len(columns):
+                raise ValueError("'vars.rows' 的每一行必须是与 columns 等长的数组")
+            values = []
+            for index in indexes:
+                value = row[index]
+                if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                    raise ValueError("变量值必须是字符串或数字")
+                values.append(str(value))
+            bound.append(tuple(values))
+        return tuple(bound)
+
+    def render(self, recipient, values):
+        """
+        渲染一条消息
+
+        Args:
+            recipient: 接收者名称（用于 {to}）
+            values: bind() 返回的一行变量值
+
+        Returns:
+            str: 渲染后的消息内容
+        """
+        return ''.join(
+            literal if index is None
+            else literal + (recipient if index == self.RECIPIENT_INDEX else values[index])
+            for literal, index in self.parts
+        )
+
+    def to_dict(self):
+        """
+        获取模板信息
+
+        Returns:
+            dict: 模板编号、内容、变量和更新时间
+        """
+        return {
+            'template_id': self.template_id,
+            'content': self.source,
+            'fields': list(self.fields),
+            'updated_at': self.updated_at
+        }
+
+
+class TemplateStore:
+    """模板存储类，按租户保存预编译的模板并持久化到文件"""
+
+    def __init__(self, store_file='templates.json', max_templates=1000, max_length=5000):
+        """
+        初始化模板存储（会从文件加载已有模板）
+
+        Args:
+            store_file: 模板文件路径，None 表示不持久化
+            max_templates: 每个租户最多保存的模板数量
+            max_length: 模板内容的最大字符数
+        """
+        self.store_file = store_file
+        self.max_templates = max_templates
+        self.max_length = max_length
+        self.lock = threading.Lock()
+        # 租户 -> {模板编号: Template}
+        self.templates = {}
+        self._load()
+
+    def _load(self):
+        """从文件加载模板，文件不存在或损坏时从空存储开始"""
+        if not self.store_file or not os.path.exists(self.store_file):
+            return
+
+        try:
+            with open(self.store_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            count = 0
+            for tenant, entries in data.items():
+                for template_id, entry in entries.items():
+                    try:
+                        template = Template(template_id, entry['content'], entry.get('updated_at'))
+                    except (KeyError, ValueError) as e:
+                        logger.warning(f"跳过无效模板: {tenant}/{template_id}, {str(e)}")
+                        continue
+                    self.templates.setdefault(tenant, {})[template_id] = template
+                    count += 1
+            logger.info(f"已加载消息模板: {count} 个")
+        except Exception as e:
+            logger.warning(f"加载消息模板失败，将使用空模板库: {str(e)}")
+            self.templates = {}
+
+    def _save(self):
+        """将模板写入文件（调用方持有锁，先写临时文件再替换）"""
+        if not self.store_file:
+            return
+
+        data = {
+            tenant: {
+                template_id: {'content': template.source, 'updated_at': template.updated_at}
+                for template_id, template in entries.items()
+            }
+            for tenant, entries in self.templates.items() if entries
+        }
+        try:
+            tmp_file = f"{self.store_file}.tmp"
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_file, self.store_file)
+        except Exception as e:
+            logger.warning(f"保存消息模板失败: {str(e)}")
+
+    def get(self, tenant, template_id):
+        """
+        获取模板
+
+        Args:
+            tenant: 租户名称
+            template_id: 模板编号
+
+        Returns:
+            Template: 模板，不存在时返回 None
+        """
+        with self.lock:
+            return self.templates.get(tenant, {}).get(template_id)
+
+    def put(self, tenant, template_id, source):
+        """
+        创建或更新模板（已入队的任务仍使用旧模板）
+
+        Args:
+            tenant: 租户名称
+            template_id: 模板编号
+            source: 模板内容
+
+        Returns:
+            tuple: (模板, 是否新建)
+
+        Raises:
+            ValueError: 模板内容为空、过长、语法错误或超出模板数量上限
+        """
+        if not isinstance(source, str) or not source:
+            raise ValueError("'content' 字段必须是非空字符串")
+        if len(source) > self.max_length:
+            raise ValueError(f"模板内容不能超过 {self.max_length} 个字符")
+        template = Template(template_id, source)
+
+        with self.lock:
+            entries = self.templates.setdefault(tenant, {})
+            created = template_id not in entries
+            if created and len(entries) >= self.max_templates:
+                raise ValueError(f"模板数量已达上限 {self.max_templates}")
+            entries[template_id] = template
+            self._save()
+        logger.info(f"{'创建' if created else '更新'}消息模板: {tenant}/{template_id}, 变量={list(template.fields)}")
+        return template, created
+
+    def delete(self, tenant, template_id):
+        """
+        删除模板（已入队的任务不受影响）
+
+        Args:
+            tenant: 租户名称
+            template_id: 模板编号
+
+        Returns:
+            bool: 模板存在并已删除时返回 True
+        """
+        with self.lock:
+            if self.templates.get(tenant, {}).pop(template_id, None) is None:
+                return False
+            self._save()
+        logger.info(f"删除消息模板: {tenant}/{template_id}")
+        return True
+
+    def list(self, tenant):
+        """
+        列出租户的所有模板
+
+        Args:
+            tenant: 租户名称
+
+        Returns:
+            list: 模板信息列表（按编号排序）
+        """
+        with self.lock:
+            entries = self.templates.get(tenant, {})
+            return [entries[template_id].to_dict() for template_id in sorted(entries)]
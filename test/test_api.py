@@ -5,6 +5,8 @@ API 测试脚本
 import requests
 import json
 import time
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
 # 配置
 BASE_URL = "http://127.0.0.1:8808"
@@ -144,6 +146,281 @@ def test_send_multiple_recipients():
         return False
 
 
+def test_ready():
+    """测试就绪检查端点"""
+    print("\n" + "="*50)
+    print("测试 7: 就绪检查")
+    print("="*50)
+    
+    try:
+        response = requests.get(f"{BASE_URL}/ready")
+        print(f"状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        # 预热完成返回 200，未完成返回 503，两者都是正确的响应
+        return response.status_code in (200, 503)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def start_callback_server():
+    """
+    启动一个本地 HTTP 服务作为回调接收端
+    
+    Returns:
+        tuple: (HTTPServer 实例, 收到的回调列表)
+    """
+    received = []
+    
+    class CallbackHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            received.append(json.loads(self.rfile.read(length).decode('utf-8')))
+            self.send_response(200)
+            self.end_headers()
+        
+        def log_message(self, format, *args):
+            pass
+    
+    server = HTTPServer(('127.0.0.1', 0), CallbackHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, received
+
+
+def test_send_with_callback():
+    """测试发送结果回调"""
+    print("\n" + "="*50)
+    print("测试 8: 发送结果回调")
+    print("="*50)
+    
+    server, received = start_callback_server()
+    callback_url = f"http://127.0.0.1:{server.server_address[1]}/callback"
+    data = {
+        "token": TOKEN,
+        "action": "sendtext",
+        "to": ["线报转发"],
+        "content": "回调测试消息 - " + time.strftime("%H:%M:%S"),
+        "callback_url": callback_url
+    }
+    
+    print(f"请求数据: {json.dumps(data, ensure_ascii=False, indent=2)}")
+    
+    try:
+        response = requests.post(f"{BASE_URL}/", json=data)
+        print(f"状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        if response.status_code != 200:
+            return False
+        
+        # 等待回调（发送一条消息加上攒批时间，通常几秒内完成）
+        job_id = response.json().get('job_id')
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            outcomes = [o for batch in received for o in batch.get('outcomes', []) if o.get('job_id') == job_id]
+            if outcomes:
+                print(f"收到回调: {json.dumps(outcomes, ensure_ascii=False, indent=2)}")
+                return True
+            time.sleep(0.5)
+        
+        print("等待回调超时")
+        return False
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+    finally:
+        server.shutdown()
+
+
+def test_cancel_job():
+    """测试取消群发任务"""
+    print("\n" + "="*50)
+    print("测试 9: 取消群发任务")
+    print("="*50)
+    
+    data = {
+        "token": TOKEN,
+        "action": "sendtext",
+        "to": ["线报转发", "LAVA", "线报转发"],
+        "content": "取消测试消息 - " + time.strftime("%H:%M:%S"),
+        "expires_in": 60
+    }
+    
+    try:
+        response = requests.post(f"{BASE_URL}/", json=data)
+        job_id = response.json().get('job_id')
+        response = requests.delete(f"{BASE_URL}/jobs/{job_id}", params={"token": TOKEN})
+        print(f"状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        # 任务可能在取消前已经发送完成，此时返回 409
+        return response.status_code in (200, 409)
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def test_events():
+    """测试事件流端点"""
+    print("\n" + "="*50)
+    print("测试 10: 事件流")
+    print("="*50)
+    
+    try:
+        # 第一个事件是连接时推送的吞吐概要
+        with requests.get(f"{BASE_URL}/events", params={"token": TOKEN}, stream=True, timeout=10) as response:
+            print(f"状态码: {response.status_code}")
+            if response.status_code != 200:
+                return False
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith('event:') or line.startswith('data:'):
+                    print(line)
+                if line.startswith('data:'):
+                    return 'queue_size' in line
+        return False
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def test_profile():
+    """测试采样分析端点（未启用 debug_profiler 时返回 404）"""
+    print("\n" + "="*50)
+    print("测试 11: 采样分析")
+    print("="*50)
+    
+    try:
+        response = requests.get(
+            f"{BASE_URL}/debug/profile",
+            params={"token": TOKEN, "seconds": 1},
+            timeout=10
+        )
+        print(f"状态码: {response.status_code}")
+        if response.status_code == 404:
+            print("采样分析未启用（config.json 中 debug_profiler 为 false）")
+            return True
+        print(f"采样次数: {response.headers.get('X-Profile-Samples')}")
+        print(response.text[:500])
+        return response.status_code == 200 and bool(response.text.strip())
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def test_template():
+    """测试模板个性化群发"""
+    print("\n" + "="*50)
+    print("测试 12: 模板个性化群发")
+    print("="*50)
+    
+    try:
+        response = requests.put(
+            f"{BASE_URL}/templates/api_test",
+            json={"token": TOKEN, "content": "模板测试 - {to}，编号 {number}"}
+        )
+        print(f"保存模板状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        if response.status_code not in (200, 201):
+            return False
+        
+        data = {
+            "token": TOKEN,
+            "action": "sendtext",
+            "to": ["线报转发", "LAVA"],
+            "template_id": "api_test",
+            "vars": {"columns": ["number"], "rows": [[1], [2]]}
+        }
+        response = requests.post(f"{BASE_URL}/", json=data)
+        print(f"发送状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        return response.status_code == 200
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def test_history():
+    """测试发送历史查询端点"""
+    print("\n" + "="*50)
+    print("测试 13: 发送历史")
+    print("="*50)
+    
+    try:
+        response = requests.get(
+            f"{BASE_URL}/history",
+            params={"token": TOKEN, "to": "线报转发", "limit": 5}
+        )
+        print(f"状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        if response.status_code == 404:
+            print("发送历史未启用（config.json 中 history_file 为 null）")
+            return True
+        return response.status_code == 200 and 'records' in response.json()
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def test_incoming():
+    """测试新消息获取端点"""
+    print("\n" + "="*50)
+    print("测试 14: 新消息监听")
+    print("="*50)
+    
+    try:
+        response = requests.get(
+            f"{BASE_URL}/incoming",
+            params={"token": TOKEN, "after_id": 0, "limit": 10}
+        )
+        print(f"状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        if response.status_code == 404:
+            print("新消息监听未启用（config.json 中 monitor_incoming 为 false）")
+            return True
+        return response.status_code == 200 and 'messages' in response.json()
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
+def test_recipient_list():
+    """测试接收者列表"""
+    print("\n" + "="*50)
+    print("测试 15: 接收者列表")
+    print("="*50)
+    
+    try:
+        response = requests.put(
+            f"{BASE_URL}/lists/api_test",
+            json={"token": TOKEN, "members": ["线报转发"]}
+        )
+        print(f"保存列表状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        if response.status_code not in (200, 201):
+            return False
+        
+        response = requests.patch(
+            f"{BASE_URL}/lists/api_test",
+            json={"token": TOKEN, "add": ["LAVA"]}
+        )
+        print(f"新增成员状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        if response.status_code != 200 or response.json()['list']['count'] != 2:
+            return False
+        
+        data = {
+            "token": TOKEN,
+            "action": "sendtext",
+            "to_list": "api_test",
+            "content": "接收者列表测试消息 - 来自 API 测试"
+        }
+        response = requests.post(f"{BASE_URL}/", json=data)
+        print(f"发送状态码: {response.status_code}")
+        print(f"响应: {json.dumps(response.json(), ensure_ascii=False, indent=2)}")
+        return response.status_code == 200 and response.json()['queued_count'] == 2
+    except Exception as e:
+        print(f"错误: {str(e)}")
+        return False
+
+
 def run_all_tests():
     """运行所有测试"""
     print("\n" + "="*70)
@@ -169,6 +446,15 @@ def run_all_tests():
         ("缺少字段", test_missing_fields),
         ("发送单个消息", test_send_single_message),
         ("批量发送", test_send_multiple_recipients),
+        ("就绪检查", test_ready),
+        ("发送结果回调", test_send_with_callback),
+        ("取消群发任务", test_cancel_job),
+        ("事件流", test_events),
+        ("采样分析", test_profile),
+        ("模板个性化群发", test_template),
+        ("发送历史", test_history),
+        ("新消息监听", test_incoming),
+        ("接收者列表", test_recipient_list),
     ]
     
     results = []
@@ -0,0 +1,187 @@
+"""
+流量录制模块
+把已接受的发送请求以紧凑的 JSON Lines 格式追加到录制文件，用于事后回放、复现积压和容量规划
+
+录制内容已匿名化：接收者名称和消息内容只保存带盐的 HMAC 摘要（同一接收者、同一内容的摘要相同，
+回放时仍能体现合并、剪贴板复用等行为），消息内容另外保存长度；文件名以 .gz 结尾时使用 gzip 压缩
+
+计算摘要和写文件都在后台写入线程中进行，请求线程只把记录放入有界队列（队列满时丢弃并计数）
+
+每行格式:
+    {"t": 到达时间, "a": "sendtext", "n": 租户, "r": [接收者摘要, ...], "l": 内容长度, "h": 内容摘要, "x": 有效期}
+"""
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import queue
+import threading
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+# 摘要保留的十六进制字符数
+DIGEST_CHARS = 12
+
+
+def open_traffic_file(path, mode):
+    """
+    打开录制文件（.gz 结尾时使用 gzip）
+
+    Args:
+        path: 文件路径
+        mode: 'a' 追加或 'r' 读取
+
+    Returns:
+        file: 文本模式的文件对象
+    """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_traffic(path):
+    """
+    逐行读取录制文件
+
+    Args:
+        path: 文件路径
+
+    Returns:
+        generator: 每个已接受请求的记录字典（按录制顺序）
+    """
+    with open_traffic_file(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+class TrafficRecorder:
+    """流量录制类，线程安全地追加匿名化的请求记录"""
+
+    def __init__(self, record_file, salt=None, max_queue_size=10000):
+        """
+        初始化流量录制器（启动后台写入线程）
+
+        Args:
+            record_file: 录制文件路径
+            salt: 计算摘要使用的盐，None 表示每次启动随机生成（不同录制文件之间的摘要不可对应）
+            max_queue_size: 等待写入的最大记录数，队列满时丢弃新记录
+        """
+        self.record_file = record_file
+        self.salt = (salt or os.urandom(16).hex()).encode('utf-8')
+        self.lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.recorded = 0
+        self.errors = 0
+        self.dropped = 0
+        self.file = open_traffic_file(record_file, 'a')
+        self.writer_thread = threading.Thread(target=self._run, name='traffic-recorder', daemon=True)
+        self.writer_thread.start()
+        logger.info(f"流量录制已启用: {record_file}")
+
+    def _digest(self, value):
+        """
+        计算带盐的摘要
+
+        Args:
+            value: 原始字符串
+
+        Returns:
+            str: 摘要（十六进制）
+        """
+        return hmac.new(self.salt, value.encode('utf-8'), hashlib.sha256).hexdigest()[:DIGEST_CHARS]
+
+    def record(self, arrived_at, action, recipients, content, tenant=None, expires_in=None):
+        """
+        记录一个已接受的请求（不阻塞，由后台写入线程计算摘要并写入；失败只记录日志，不影响请求处理）
+
+        Args:
+            arrived_at: 到达时间（时间戳）
+            action: 消息类型
+            recipients: 接收者列表
+            content: 消息内容（文本或图片 URL）
+            tenant: 租户名称
+            expires_in: 有效期（秒），None 表示不过期
+        """
+        try:
+            self.queue.put_nowait((arrived_at, action, recipients, content, tenant, expires_in))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        """后台写入线程：计算摘要并追加到录制文件，收到 None 时退出"""
+        while True:
+            request = self.queue.get()
+            if request is None:
+                return
+            try:
+                self._write(*request)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"写入流量录制文件失败: {str(e)}")
+
+    def _write(self, arrived_at, action, recipients, content, tenant, expires_in):
+        """
+        把一个请求写入录制文件（在后台写入线程中调用）
+
+        Args:
+            arrived_at: 到达时间（时间戳）
+            action: 消息类型
+            recipients: 接收者列表
+            content: 消息内容
+            tenant: 租户名称
+            expires_in: 有效期（秒）
+        """
+        entry = {
+            't': round(arrived_at, 3),
+            'a': action,
+            'n': tenant,
+            'r': [self._digest(recipient) for recipient in recipients],
+            'l': len(content),
+            'h': self._digest(content)
+        }
+        if expires_in is not None:
+            entry['x'] = round(expires_in, 3)
+        line = json.dumps(entry, separators=(',', ':')) + '\n'
+
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+            self.recorded += 1
+
+    def close(self, timeout=5):
+        """
+        写完队列中剩余的记录后关闭录制文件
+
+        Args:
+            timeout: 等待写入线程退出的最长时间（秒）
+        """
+        try:
+            self.queue.put(None, timeout=timeout)
+            self.writer_thread.join(timeout=timeout)
+        except queue.Full:
+            pass
+        with self.lock:
+            try:
+                self.file.close()
+            except Exception:
+                pass
+
+    def get_stats(self):
+        """
+        获取录制统计
+
+        Returns:
+            dict: 录制文件、已录制请求数、等待写入数、写入失败次数和丢弃次数
+        """
+        return {
+            'file': self.record_file,
+            'recorded': self.recorded,
+            'pending': self.queue.qsize(),
+            'errors': self.errors,
+            'dropped': self.dropped
+        }
@@ -0,0 +1,260 @@
+"""
+发送结果回调模块
+在独立线程中把每个接收者的发送结果批量 POST 到回调地址，
+使用有界队列、连接复用和重试，回调再慢也不会拖慢消息处理线程
+
+攒批线程按回调地址分组后交给各地址独立的投递线程，每个地址有自己的待投递批次（有上限），
+一个回调地址失效（超时、重试退避）不会耽误其他地址的投递
+"""
+import collections
+import queue
+import threading
+import time
+import logging
+
+# 配置日志
+logger = logging.getLogger(__name__)
+
+
+class WebhookDispatcher:
+    """回调分发类，异步批量投递发送结果"""
+
+    def __init__(self, max_queue_size=10000, batch_size=50, flush_interval=1.0,
+                 max_retries=3, retry_backoff=1.0, timeout=10, idle_timeout=30):
+        """
+        初始化回调分发器
+
+        Args:
+            max_queue_size: 待投递结果的最大数量，队列满时丢弃新结果；
+                每个回调地址积压的结果也不超过该数量，超出时丢弃最早的批次
+            batch_size: 每次 POST 最多携带的结果数量
+            flush_interval: 攒批的最长等待时间（秒）
+            max_retries: 投递失败后的最大重试次数
+            retry_backoff: 第一次重试前的等待时间（秒），之后每次加倍
+            timeout: 单次 POST 的超时时间（秒）
+            idle_timeout: 回调地址的投递线程空闲多久后退出（秒）
+        """
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_lane_outcomes = max_queue_size
+        self.worker_thread = None
+        self.running = False
+        self.lock = threading.Lock()
+        self.lane_ready = threading.Condition(self.lock)
+        # 回调地址 -> 待投递批次（每批为结果列表）
+        self.lanes = {}
+        # 回调地址 -> 投递线程
+        self.lane_threads = {}
+        self.lane_outcomes = collections.Counter()
+
+        # 统计信息
+        self.delivered_batches = 0
+        self.delivered_outcomes = 0
+        self.failed_outcomes = 0
+        self.dropped_outcomes = 0
+        self.retries = 0
+
+    def start(self):
+        """启动回调投递线程"""
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            return
+
+        self.running = True
+        self.worker_thread = threading.Thread(target=self._run, name='webhook-dispatcher', daemon=True)
+        self.worker_thread.start()
+        logger.info("回调投递线程已启动")
+
+    def stop(self, timeout=5):
+        """
+        停止回调投递线程（会先尝试投递队列中剩余的结果）
+
+        Args:
+            timeout: 等待线程退出的最长时间（秒）
+        """
+        self.running = False
+        deadline = time.time() + timeout
+        if self.worker_thread is not None:
+            self.worker_thread.join(timeout=timeout)
+        with self.lock:
+            self.lane_ready.notify_all()
+            threads = list(self.lane_threads.values())
+        for thread in threads:
+            thread.join(timeout=max(deadline - time.time(), 0))
+        logger.info("回调投递线程已停止")
+
+    def submit(self, url, outcome):
+        """
+        提交一个发送结果（不阻塞）
+
+        Args:
+            url: 回调地址
+            outcome: 发送结果字典
+
+        Returns:
+            bool: 是否成功加入待投递队列（队列满时返回 False）
+        """
+        try:
+            self.queue.put_nowait((url, outcome))
+            return True
+        except queue.Full:
+            self.dropped_outcomes += 1
+            return False
+
+    def _collect_batch(self):
+        """
+        攒一批待投递的结果：数量达到 batch_size 或等待超过 flush_interval 即返回
+
+        Returns:
+            list: (url, outcome) 列表，可能为空
+        """
+        try:
+            batch = [self.queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.time() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.time()
+            try:
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _deliver(self, session, url, outcomes):
+        """
+        把一批结果 POST 到回调地址（失败时按指数退避重试）
+
+        Args:
+            session: requests.Session（复用连接）
+            url: 回调地址
+            outcomes: 结果列表
+
+        Returns:
+            bool: 是否投递成功
+        """
+        payload = {'count': len(outcomes), 'outcomes': outcomes}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code < 400:
+                    self.delivered_batches += 1
+                    self.delivered_outcomes += len(outcomes)
+                    return True
+                if response.status_code < 500:
+                    # 客户端错误重试也不会成功，直接放弃
+                    logger.warning(f"回调被拒绝: url={url}, 状态码={response.status_code}")
+                    break
+                logger.warning(f"回调失败: url={url}, 状态码={response.status_code} (尝试 {attempt + 1}/{self.max_retries + 1})")
+            except Exception as e:
+                logger.warning(f"回调失败: url={url}, {str(e)} (尝试 {attempt + 1}/{self.max_retries + 1})")
+
+            if attempt < self.max_retries:
+                self.retries += 1
+                time.sleep(self.retry_backoff * (2 ** attempt))
+
+        self.failed_outcomes += len(outcomes)
+        logger.error(f"回调投递失败，已放弃 {len(outcomes)} 条结果: url={url}")
+        return False
+
+    def _enqueue(self, url, outcomes):
+        """
+        把一批结果交给回调地址的投递线程（线程不存在时创建）
+
+        Args:
+            url: 回调地址
+            outcomes: 结果列表
+        """
+        with self.lock:
+            lane = self.lanes.setdefault(url, collections.deque())
+            lane.append(outcomes)
+            self.lane_outcomes[url] += len(outcomes)
+            # 回调地址积压过多（通常是地址失效）时丢弃最早的批次，不影响其他地址
+            while self.lane_outcomes[url] > self.max_lane_outcomes and len(lane) > 1:
+                dropped = lane.popleft()
+                self.lane_outcomes[url] -= len(dropped)
+                self.dropped_outcomes += len(dropped)
+                logger.warning(f"回调地址积压过多，丢弃 {len(dropped)} 条结果: url={url}")
+            if url in self.lane_threads:
+                self.lane_ready.notify_all()
+                return
+            thread = threading.Thread(target=self._run_lane, args=(url,), name='webhook-lane', daemon=True)
+            self.lane_threads[url] = thread
+        thread.start()
+
+    def _run_lane(self, url):
+        """
+        回调地址的投递线程：依次投递该地址的批次（复用连接），空闲超过 idle_timeout 后退出
+
+        Args:
+            url: 回调地址
+        """
+        # 延迟导入 requests，HTTP 服务启动时不需要加载
+        import requests
+        session = requests.Session()
+
+        try:
+            while True:
+                with self.lock:
+                    lane = self.lanes[url]
+                    if not lane and self.running:
+                        self.lane_ready.wait_for(lambda: lane or not self.running, self.idle_timeout)
+                    if not lane:
+                        del self.lanes[url]
+                        del self.lane_threads[url]
+                        del self.lane_outcomes[url]
+                        return
+                    outcomes = lane.popleft()
+                    self.lane_outcomes[url] -= len(outcomes)
+                try:
+                    self._deliver(session, url, outcomes)
+                except Exception as e:
+                    logger.error(f"回调投递发生错误: url={url}, {str(e)}", exc_info=True)
+        finally:
+            session.close()
+
+    def _run(self):
+        """攒批线程：攒批、按回调地址分组后交给各地址的投递线程"""
+        while self.running or not self.queue.empty():
+            try:
+                batch = self._collect_batch()
+                if not batch:
+                    continue
+
+                # 按回调地址分组，同一地址的结果合并到一次 POST 中
+                grouped = collections.OrderedDict()
+                for url, outcome in batch:
+                    grouped.setdefault(url, []).append(outcome)
+
+                for url, outcomes in grouped.items():
+                    self._enqueue(url, outcomes)
+            except Exception as e:
+                logger.error(f"回调攒批线程发生错误: {str(e)}", exc_info=True)
+
+    def get_stats(self):
+        """
+        获取回调投递统计
+
+        Returns:
+            dict: 待投递、已投递、失败和丢弃的数量
+        """
+        with self.lock:
+            lane_pending = sum(self.lane_outcomes.values())
+            active_urls = len(self.lane_threads)
+        return {
+            'pending': self.queue.qsize() + lane_pending,
+            'active_urls': active_urls,
+            'delivered_batches': self.delivered_batches,
+            'delivered_outcomes': self.delivered_outcomes,
+            'failed_outcomes': self.failed_outcomes,
+            'dropped_outcomes': self.dropped_outcomes,
+            'retries': self.retries
+        }
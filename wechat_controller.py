@@ -13,17 +13,69 @@ from io import BytesIO
 import win32clipboard
 from pathlib import Path
 import hashlib
+import contextlib
+import struct
+from contact_index import STRATEGY_SESSION_LIST, DEFAULT_STRATEGIES
+from session_list import SessionListCache
+from file_cache import FileCache, DEFAULT_FETCH_TIMEOUT
+from service_estimator import MEDIA_CACHED, MEDIA_DOWNLOAD
+from pacing import SIGNAL_SESSION_NOT_SELECTED, SIGNAL_CLIPBOARD_RETRY, SIGNAL_INPUT_MISSING
+from worker_watchdog import WorkerAbandoned
 
 # 配置日志
 logger = logging.getLogger(__name__)
 
+# 发送失败原因
+FAILURE_WINDOW = 'window_not_found'    # 未找到微信窗口（微信关闭或未登录）
+FAILURE_UI = 'ui_error'                # 界面操作失败（找不到输入框、剪贴板异常等）
+FAILURE_CONTACT = 'contact_not_found'  # 找不到联系人
+FAILURE_DOWNLOAD = 'download_failed'   # 图片或文件下载失败
+
 
 class WeChatController:
     """微信控制器类，用于自动化控制微信发送消息"""
     
-    def __init__(self):
-        """初始化微信控制器"""
+    def __init__(self, contact_index=None, session_refresh_top=5, session_full_refresh_interval=300):
+        """
+        初始化微信控制器
+        
+        Args:
+            contact_index: 联系人解析索引（ContactIndex），None 表示不记录查找策略
+            session_refresh_top: 每次发送后增量刷新的会话列表顶部会话数量
+            session_full_refresh_interval: 会话列表全量刷新的最大间隔（秒）
+        """
         self.wx = None
+        self.contact_index = contact_index
+        # 最近一次发送失败的原因（FAILURE_* 常量），成功时为 None
+        self.failure_reason = None
+        # 最近一次发送找到联系人的策略和媒体缓存状态（供发送耗时估计区分发送路径）
+        self.last_route = None
+        self.last_media = None
+        # 看门狗心跳（Heartbeat），由消息队列设置，None 表示不做操作计时
+        self.heartbeat = None
+        # 自适应节奏控制（AdaptivePacer），由消息队列设置，None 表示使用固定等待时间
+        self.pacer = None
+        # 累计主动等待（以及下载图片）的时间，用于从操作耗时中扣除，只统计界面响应时间
+        self._paused_total = 0.0
+        self.session_cache = SessionListCache(
+            refresh_top=session_refresh_top,
+            full_refresh_interval=session_full_refresh_interval
+        )
+        # 剪贴板复用：记录本控制器最近一次写入的内容和写入后的剪贴板序列号
+        # 群发时同一内容只需写入并验证一次，序列号不变说明期间没有其他程序改动剪贴板
+        self._clipboard_key = None
+        self._clipboard_seq = None
+        # 最近一次转换的图片 DIB 数据（图片路径, 数据），避免重复解码
+        self._dib_cache = None
+        self.clipboard_writes = 0
+        self.clipboard_reuses = 0
+        # 复用 HTTP 连接池下载图片，避免每次下载都重新建立连接
+        self.http_session = requests.Session()
+        self.http_session.headers['User-Agent'] = (
+            'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+        )
+        # sendfile 使用的文件缓存，由消息队列设置为共享实例（入队时即开始预先下载）
+        self.file_cache = None
         # 创建图片缓存目录
         self.cache_dir = os.path.join(tempfile.gettempdir(), 'wechat_image_cache')
         if not os.path.exists(self.cache_dir):
@@ -50,11 +102,109 @@ class WeChatController:
                 return wx
             else:
                 logger.error("未找到微信窗口，请确保微信已启动并设置了 Ctrl+Alt+W 快捷键")
+                self.failure_reason = FAILURE_WINDOW
                 return None
         except Exception as e:
             logger.error(f"获取微信窗口失败: {str(e)}")
+            self.failure_reason = FAILURE_WINDOW
             return None
     
+    @contextlib.contextmanager
+    def _operation(self, name):
+        """
+        标记一个界面操作的开始和结束，供看门狗按操作预算检测卡死，
+        并把扣除主动等待后的耗时报告给节奏控制器
+        
+        Args:
+            name: 操作名称（对应 ui_timeouts 中的键）
+        """
+        if self.heartbeat is not None:
+            self.heartbeat.begin(name)
+        started = time.time()
+        paused = self._paused_total
+        try:
+            yield
+        finally:
+            if self.heartbeat is not None:
+                self.heartbeat.end()
+            if self.pacer is not None:
+                self.pacer.record_latency(name, time.time() - started - (self._paused_total - paused))
+    
+    def _pause(self, seconds):
+        """
+        界面操作之间的等待（启用节奏控制时按当前倍率缩放）
+        
+        Args:
+            seconds: 原始等待时间（秒）
+            
+        Raises:
+            WorkerAbandoned: 处理线程已被看门狗放弃（不再执行下一个界面步骤）
+        """
+        if self.pacer is None:
+            time.sleep(seconds)
+            self._paused_total += seconds
+        else:
+            self._paused_total += self.pacer.pause(seconds)
+        if self.heartbeat is not None:
+            self.heartbeat.check_abandoned()
+    
+    def _signal(self, name):
+        """
+        向节奏控制器报告异常信号
+        
+        Args:
+            name: 信号名称
+        """
+        if self.pacer is not None:
+            self.pacer.signal(name)
+    
+    def probe(self):
+        """
+        探测微信窗口是否可用（供熔断器在恢复前试探使用）
+        
+        Returns:
+            bool: 是否找到微信窗口
+        """
+        self.failure_reason = None
+        with self._operation('probe'):
+            return self._get_wechat_window() is not None
+    
+    def warm_up(self, prefetch_urls=None):
+        """
+        预热：定位微信窗口、建立会话列表快照并预先建立 HTTP 连接
+        
+        Args:
+            prefetch_urls: 需要预先建立连接的 URL 列表（如图片服务器地址）
+            
+        Returns:
+            dict: 预热结果，window 表示是否找到微信窗口
+        """
+        start_time = time.time()
+        result = {'window': False, 'sessions': 0, 'http_connections': 0}
+        
+        try:
+            with self._operation('warm_up'):
+                wx = self._get_wechat_window()
+                if wx:
+                    result['window'] = True
+                    result['sessions'] = self.session_cache.full_refresh(wx)
+                    # 预先定位搜索框和聊天输入框，让首条消息不必冷启动查找
+                    wx.EditControl(Name='搜索').Exists(0, 0)
+                    wx.EditControl(foundIndex=1).Exists(0, 0)
+        except Exception as e:
+            logger.warning(f"预热微信窗口失败: {str(e)}")
+        
+        for url in prefetch_urls or []:
+            try:
+                self.http_session.head(url, timeout=5, allow_redirects=True)
+                result['http_connections'] += 1
+            except Exception as e:
+                logger.warning(f"预热 HTTP 连接失败: {url}, {str(e)}")
+        
+        result['duration_ms'] = round((time.time() - start_time) * 1000, 1)
+        logger.info(f"预热完成: {result}")
+        return result
+    
     def _is_session_selected(self, session_item):
         """
         检查会话项是否已被选中
@@ -97,18 +247,10 @@ class WeChatController:
             if not wx:
                 return False
             
-            # 查找会话列表中的联系人
-            # AutomationId 格式: session_item_[联系人名]
-            automation_id = f"session_item_{contact_name}"
-            
-            # 查找会话项
-            session_item = wx.Control(
-                ClassName="mmui::ChatSessionCell",
-                AutomationId=automation_id,
-                searchDepth=15
-            )
+            # 从会话列表快照中查找联系人（字典查找，无需每次深度搜索）
+            session_item = self.session_cache.lookup(wx, contact_name)
             
-            if session_item.Exists(0, 0):
+            if session_item is not None:
                 # 检查是否已经选中
                 if self._is_session_selected(session_item):
                     logger.info(f"会话 '{contact_name}' 已经处于选中状态，无需点击")
@@ -117,7 +259,7 @@ class WeChatController:
                 # 未选中，需要点击激活
                 logger.info(f"点击激活会话: {contact_name}")
                 session_item.Click()
-                time.sleep(0.3)
+                self._pause(0.3)
                 
                 # 验证是否选中成功
                 if self._is_session_selected(session_item):
@@ -125,18 +267,26 @@ class WeChatController:
                     return True
                 else:
                     logger.warning(f"点击后会话 '{contact_name}' 未被选中")
+                    self._signal(SIGNAL_SESSION_NOT_SELECTED)
                     return False
             else:
                 logger.debug(f"会话列表中未找到 {contact_name}，将使用搜索方式")
                 return False
                 
+        except WorkerAbandoned:
+            raise
         except Exception as e:
             logger.debug(f"从会话列表激活失败: {str(e)}")
             return False
     
     def search_contact(self, contact_name):
         """
-        搜索联系人（双重策略：优先从会话列表激活，找不到再搜索）
+        搜索联系人（双重策略：会话列表激活和搜索框查找）
+        
+        策略的尝试顺序由联系人解析索引决定：上次成功的策略优先，
+        冷却期内失败过的策略会被跳过（搜索框兜底始终保留）；没有索引时优先从会话列表激活
+        
+        微信窗口不可用或界面操作出错时不记录策略结果，避免把临时故障当成策略失败
         
         Args:
             contact_name: 联系人名称
@@ -144,12 +294,51 @@ class WeChatController:
         Returns:
             bool: 搜索是否成功
         """
-        try:
-            # 策略1: 优先尝试从会话列表直接激活（更快）
-            if self._activate_from_session_list(contact_name):
+        if self.contact_index:
+            strategies = self.contact_index.plan(contact_name)
+        else:
+            strategies = list(DEFAULT_STRATEGIES)
+        
+        self.last_route = None
+        attempts = 0
+        for strategy in strategies:
+            attempts += 1
+            self.failure_reason = None
+            if strategy == STRATEGY_SESSION_LIST:
+                success = self._activate_from_session_list(contact_name)
+            else:
+                success = self._activate_from_search_box(contact_name)
+            
+            if self.contact_index and self.failure_reason not in (FAILURE_WINDOW, FAILURE_UI):
+                self.contact_index.record_attempt(contact_name, strategy, success)
+            
+            if success:
+                if self.contact_index:
+                    self.contact_index.record_lookup(strategy, attempts)
+                self.last_route = strategy
                 return True
             
-            # 策略2: 降级使用搜索框（兜底方案）
+            # 微信窗口不可用时，其他策略同样会失败，不再继续尝试
+            if self.failure_reason == FAILURE_WINDOW:
+                break
+        
+        if self.contact_index:
+            self.contact_index.record_lookup(None, attempts)
+        if self.failure_reason is None:
+            self.failure_reason = FAILURE_CONTACT
+        return False
+    
+    def _activate_from_search_box(self, contact_name):
+        """
+        通过搜索框查找并激活联系人（兜底方案）
+        
+        Args:
+            contact_name: 联系人名称
+            
+        Returns:
+            bool: 是否成功激活
+        """
+        try:
             logger.info(f"使用搜索框查找联系人: {contact_name}")
             
             # 获取微信窗口
@@ -159,47 +348,46 @@ class WeChatController:
             
             # 激活窗口
             wx.SetActive()
-            time.sleep(0.5)
+            self._pause(0.5)
             
             # 查找搜索框
             search_box = wx.EditControl(Name='搜索')
             if not search_box.Exists(0, 0):
                 logger.error("未找到搜索框")
+                self.failure_reason = FAILURE_UI
+                self._signal(SIGNAL_INPUT_MISSING)
                 return False
             
             # 点击搜索框
             search_box.Click()
-            time.sleep(0.3)
+            self._pause(0.3)
             
             # 使用剪贴板粘贴方式输入搜索内容（更快且避免特殊字符问题）
             if self._set_clipboard_text(contact_name):
                 search_box.SendKeys('{Ctrl}v')
-                time.sleep(0.2)
+                self._pause(0.2)
             else:
                 # 剪贴板设置失败，回退到 SendKeys
                 logger.warning("搜索时剪贴板设置失败，使用 SendKeys 方式")
                 escaped_name = contact_name.replace('{', '{{').replace('}', '}}')
                 search_box.SendKeys(escaped_name, interval=0.01)
-                time.sleep(0.2)
+                self._pause(0.2)
             
             # 按 Enter 确认搜索
             search_box.SendKeys('{Enter}')
-            time.sleep(0.8)
+            self._pause(0.8)
             
-            # 搜索后，尝试验证会话是否已选中
-            automation_id = f"session_item_{contact_name}"
-            session_item = wx.Control(
-                ClassName="mmui::ChatSessionCell",
-                AutomationId=automation_id,
-                searchDepth=15
-            )
+            # 搜索后会话会被移动到列表顶部，增量刷新快照后验证会话是否已选中
+            self.session_cache.refresh(wx)
+            session_item = self.session_cache.lookup(wx, contact_name)
             
-            if session_item.Exists(0, 0):
+            if session_item is not None:
                 if self._is_session_selected(session_item):
                     logger.info(f"搜索后确认会话 '{contact_name}' 已选中")
                     return True
                 else:
                     logger.warning(f"搜索后会话 '{contact_name}' 未被选中")
+                    self._signal(SIGNAL_SESSION_NOT_SELECTED)
                     return False
             else:
                 # 搜索框可能找到的是其他类型的结果（如公众号、小程序等）
@@ -207,14 +395,62 @@ class WeChatController:
                 logger.info(f"完成搜索联系人: {contact_name}（无法验证选中状态）")
                 return True
             
+        except WorkerAbandoned:
+            raise
         except Exception as e:
             logger.error(f"搜索联系人 '{contact_name}' 失败: {str(e)}")
             return False
     
+    def _clipboard_holds(self, key):
+        """
+        检查剪贴板中是否仍是本控制器最近写入的内容
+        
+        Args:
+            key: 内容标识，如 ('text', 文本) 或 ('image', 图片路径)
+            
+        Returns:
+            bool: 内容相同且剪贴板序列号未变化时返回 True
+        """
+        if key != self._clipboard_key or self._clipboard_seq is None:
+            return False
+        try:
+            return win32clipboard.GetClipboardSequenceNumber() == self._clipboard_seq
+        except Exception:
+            return False
+    
+    def _remember_clipboard(self, key):
+        """
+        记录刚写入剪贴板的内容标识和当前剪贴板序列号
+        
+        Args:
+            key: 内容标识
+        """
+        self.clipboard_writes += 1
+        try:
+            self._clipboard_seq = win32clipboard.GetClipboardSequenceNumber()
+            self._clipboard_key = key
+        except Exception:
+            self._clipboard_seq = None
+            self._clipboard_key = None
+    
+    def get_clipboard_stats(self):
+        """
+        获取剪贴板写入和复用统计
+        
+        Returns:
+            dict: 写入次数和复用次数
+        """
+        return {
+            'writes': self.clipboard_writes,
+            'reuses': self.clipboard_reuses
+        }
+    
     def _set_clipboard_text(self, text, max_retries=3):
         """
         安全地设置剪贴板文本（带重试机制）
         
+        如果剪贴板中仍是上次写入的同一文本（序列号未变化），直接复用，不再写入和验证
+        
         Args:
             text: 要设置的文本内容
             max_retries: 最大重试次数
@@ -222,19 +458,26 @@ class WeChatController:
         Returns:
             bool: 操作是否成功
         """
+        clipboard_key = ('text', text)
+        if self._clipboard_holds(clipboard_key):
+            self.clipboard_reuses += 1
+            return True
+        
         for attempt in range(max_retries):
             try:
                 auto.SetClipboardText(text)
                 # 验证剪贴板内容是否设置成功
-                time.sleep(0.05)
+                self._pause(0.05)
                 clipboard_content = auto.GetClipboardText()
                 if clipboard_content == text:
+                    self._remember_clipboard(clipboard_key)
                     return True
                 else:
                     logger.warning(f"剪贴板内容验证失败，重试中... (尝试 {attempt + 1}/{max_retries})")
             except Exception as e:
                 logger.warning(f"设置剪贴板失败: {e}，重试中... (尝试 {attempt + 1}/{max_retries})")
-            time.sleep(0.1)
+            self._signal(SIGNAL_CLIPBOARD_RETRY)
+            self._pause(0.1)
         
         logger.error("设置剪贴板文本失败，已达最大重试次数")
         return False
@@ -257,17 +500,19 @@ class WeChatController:
             
             # 激活窗口确保焦点正确
             wx.SetActive()
-            time.sleep(0.2)
+            self._pause(0.2)
             
             # 查找聊天输入框（foundIndex=1 表示第二个 EditControl）
             chat_edit = wx.EditControl(foundIndex=1)
             if not chat_edit.Exists(0, 0):
                 logger.error("未找到聊天输入框")
+                self.failure_reason = FAILURE_UI
+                self._signal(SIGNAL_INPUT_MISSING)
                 return False
             
             # 点击输入框获取焦点
             chat_edit.Click()
-            time.sleep(0.2)
+            self._pause(0.2)
             
             # 使用剪贴板粘贴方式发送消息
             # 这种方式比 SendKeys 快得多，且不会出现特殊字符（如【】￥等）被误解析的问题
@@ -281,20 +526,23 @@ class WeChatController:
             else:
                 # 粘贴消息（Ctrl+V）
                 chat_edit.SendKeys('{Ctrl}v')
-                time.sleep(0.2)
+                self._pause(0.2)
                 
                 # 发送消息（Enter）
                 chat_edit.SendKeys('{Enter}')
             
-            time.sleep(0.3)
+            self._pause(0.3)
             
             # 日志中显示原始消息（包含换行符）
             log_preview = message.replace('\n', '\\n')[:50]
             logger.info(f"成功发送消息: {log_preview}...")
             return True
             
+        except WorkerAbandoned:
+            raise
         except Exception as e:
             logger.error(f"发送消息失败: {str(e)}", exc_info=True)
+            self.failure_reason = FAILURE_UI
             return False
     
     def _download_image(self, url, max_retries=3):
@@ -318,6 +566,7 @@ class WeChatController:
                 # 验证缓存文件是否有效（大小大于0）
                 if os.path.getsize(cache_path) > 0:
                     logger.info(f"使用缓存图片: {cache_path}")
+                    self.last_media = MEDIA_CACHED
                     return cache_path
                 else:
                     # 缓存文件无效，删除后重新下载
@@ -331,9 +580,7 @@ class WeChatController:
             for attempt in range(max_retries):
                 try:
                     # 下载图片
-                    response = requests.get(url, timeout=30, headers={
-                        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-                    })
+                    response = self.http_session.get(url, timeout=30)
                     response.raise_for_status()
                     
                     # 判断内容类型（某些服务器可能不返回正确的 content-type）
@@ -354,6 +601,7 @@ class WeChatController:
                     # 保存图片到缓存目录
                     image.save(cache_path, 'PNG')
                     logger.info(f"图片已下载并缓存到: {cache_path}")
+                    self.last_media = MEDIA_DOWNLOAD
                     
                     return cache_path
                     
@@ -379,6 +627,9 @@ class WeChatController:
         """
         将图片复制到剪贴板（带重试机制和安全的资源释放）
         
+        如果剪贴板中仍是同一张图片（序列号未变化），直接复用；
+        最近一次转换的 DIB 数据会被缓存，重新写入时不再解码图片
+        
         Args:
             image_path: 图片文件路径
             max_retries: 最大重试次数
@@ -386,17 +637,27 @@ class WeChatController:
         Returns:
             bool: 操作是否成功
         """
+        clipboard_key = ('image', image_path)
+        if self._clipboard_holds(clipboard_key):
+            self.clipboard_reuses += 1
+            logger.info("剪贴板中已是该图片，直接复用")
+            return True
+        
         for attempt in range(max_retries):
             clipboard_opened = False
             try:
-                # 打开图片
-                image = Image.open(image_path)
-                
-                # 转换为 BMP 格式（Windows 剪贴板需要）
-                output = BytesIO()
-                image.convert('RGB').save(output, 'BMP')
-                data = output.getvalue()[14:]  # BMP 文件头是 14 字节，剪贴板不需要
-                output.close()
+                if self._dib_cache and self._dib_cache[0] == image_path:
+                    data = self._dib_cache[1]
+                else:
+                    # 打开图片
+                    image = Image.open(image_path)
+                    
+                    # 转换为 BMP 格式（Windows 剪贴板需要）
+                    output = BytesIO()
+                    image.convert('RGB').save(output, 'BMP')
+                    data = output.getvalue()[14:]  # BMP 文件头是 14 字节，剪贴板不需要
+                    output.close()
+                    self._dib_cache = (image_path, data)
                 
                 # 复制到剪贴板（使用标志位确保正确关闭）
                 win32clipboard.OpenClipboard()
@@ -405,6 +666,7 @@ class WeChatController:
                 win32clipboard.SetClipboardData(win32clipboard.CF_DIB, data)
                 win32clipboard.CloseClipboard()
                 clipboard_opened = False
+                self._remember_clipboard(clipboard_key)
                 
                 logger.info("图片已复制到剪贴板")
                 return True
@@ -419,12 +681,147 @@ class WeChatController:
                 
                 if attempt < max_retries - 1:
                     logger.warning(f"复制图片到剪贴板失败: {e}，重试中... (尝试 {attempt + 1}/{max_retries})")
-                    time.sleep(0.2)
+                    self._signal(SIGNAL_CLIPBOARD_RETRY)
+                    self._pause(0.2)
                 else:
                     logger.error(f"复制图片到剪贴板失败，已达最大重试次数: {str(e)}")
         
         return False
     
+    def _copy_file_to_clipboard(self, file_path, max_retries=3):
+        """
+        将文件以文件引用（CF_HDROP）的形式放入剪贴板，粘贴到微信时作为文件发送（不读取文件内容）
+        
+        Args:
+            file_path: 文件路径
+            max_retries: 最大重试次数
+            
+        Returns:
+            bool: 操作是否成功
+        """
+        clipboard_key = ('file', file_path)
+        if self._clipboard_holds(clipboard_key):
+            self.clipboard_reuses += 1
+            logger.info("剪贴板中已是该文件，直接复用")
+            return True
+        
+        # DROPFILES 结构：文件列表偏移（20 字节）、拖放坐标、fNC、fWide（1 表示 UTF-16 路径），
+        # 之后是以两个空字符结尾的路径列表
+        data = struct.pack('<IiiII', 20, 0, 0, 0, 1) + (os.path.abspath(file_path) + '\0\0').encode('utf-16-le')
+        
+        for attempt in range(max_retries):
+            clipboard_opened = False
+            try:
+                win32clipboard.OpenClipboard()
+                clipboard_opened = True
+                win32clipboard.EmptyClipboard()
+                win32clipboard.SetClipboardData(win32clipboard.CF_HDROP, data)
+                win32clipboard.CloseClipboard()
+                clipboard_opened = False
+                self._remember_clipboard(clipboard_key)
+                
+                logger.info("文件已复制到剪贴板")
+                return True
+                
+            except Exception as e:
+                # 确保剪贴板被关闭
+                if clipboard_opened:
+                    try:
+                        win32clipboard.CloseClipboard()
+                    except Exception:
+                        pass
+                
+                if attempt < max_retries - 1:
+                    logger.warning(f"复制文件到剪贴板失败: {e}，重试中... (尝试 {attempt + 1}/{max_retries})")
+                    self._signal(SIGNAL_CLIPBOARD_RETRY)
+                    self._pause(0.2)
+                else:
+                    logger.error(f"复制文件到剪贴板失败，已达最大重试次数: {str(e)}")
+        
+        return False
+    
+    def _prepare_file(self, file_url):
+        """
+        获取文件的缓存路径并固定（通常已在入队时预先下载），发送结束后需要调用 file_cache.unpin()
+        
+        下载不是界面操作，按单独的 download_file 预算计时，等待时间始终低于该预算
+        
+        Args:
+            file_url: 文件的 URL
+            
+        Returns:
+            str: 缓存文件路径，下载失败或超时返回 None
+        """
+        if self.file_cache is None:
+            self.file_cache = FileCache()
+        self.last_media = MEDIA_CACHED if self.file_cache.is_cached(file_url) else MEDIA_DOWNLOAD
+        
+        timeout = DEFAULT_FETCH_TIMEOUT
+        if self.heartbeat is not None:
+            timeout = min(timeout, self.heartbeat.budget('download_file') * 0.9)
+            self.heartbeat.begin('download_file')
+        try:
+            return self.file_cache.fetch(file_url, timeout=timeout, pin=True)
+        finally:
+            if self.heartbeat is not None:
+                self.heartbeat.end()
+    
+    def send_file(self, file_url, cache_file):
+        """
+        发送文件（以缓存文件的引用粘贴发送）
+        
+        Args:
+            file_url: 文件的 URL（用于日志）
+            cache_file: 缓存文件路径
+            
+        Returns:
+            bool: 发送是否成功
+        """
+        try:
+            # 复制文件引用到剪贴板
+            if not self._copy_file_to_clipboard(cache_file):
+                self.failure_reason = FAILURE_UI
+                return False
+            
+            # 获取微信窗口
+            wx = self._get_wechat_window()
+            if not wx:
+                return False
+            
+            # 激活窗口确保焦点正确
+            wx.SetActive()
+            self._pause(0.2)
+            
+            # 查找聊天输入框
+            chat_edit = wx.EditControl(foundIndex=1)
+            if not chat_edit.Exists(0, 0):
+                logger.error("未找到聊天输入框")
+                self.failure_reason = FAILURE_UI
+                self._signal(SIGNAL_INPUT_MISSING)
+                return False
+            
+            # 点击输入框获取焦点
+            chat_edit.Click()
+            self._pause(0.2)
+            
+            # 粘贴文件（Ctrl+V）
+            chat_edit.SendKeys('{Ctrl}v')
+            self._pause(0.5)
+            
+            # 发送（Enter）
+            chat_edit.SendKeys('{Enter}')
+            self._pause(0.3)
+            
+            logger.info(f"成功发送文件: {file_url}")
+            return True
+            
+        except WorkerAbandoned:
+            raise
+        except Exception as e:
+            logger.error(f"发送文件失败: {str(e)}", exc_info=True)
+            self.failure_reason = FAILURE_UI
+            return False
+    
     def send_picture(self, image_url):
         """
         发送图片（通过 URL 下载后粘贴发送，使用缓存避免重复下载）
@@ -436,13 +833,17 @@ class WeChatController:
             bool: 发送是否成功
         """
         try:
-            # 下载图片（或使用缓存）
+            # 下载图片（或使用缓存），下载耗时不计入界面响应时间
+            download_started = time.time()
             cache_file = self._download_image(image_url)
+            self._paused_total += time.time() - download_started
             if not cache_file:
+                self.failure_reason = FAILURE_DOWNLOAD
                 return False
             
             # 复制图片到剪贴板
             if not self._copy_image_to_clipboard(cache_file):
+                self.failure_reason = FAILURE_UI
                 return False
             
             # 获取微信窗口
@@ -452,33 +853,62 @@ class WeChatController:
             
             # 激活窗口确保焦点正确
             wx.SetActive()
-            time.sleep(0.2)
+            self._pause(0.2)
             
             # 查找聊天输入框
             chat_edit = wx.EditControl(foundIndex=1)
             if not chat_edit.Exists(0, 0):
                 logger.error("未找到聊天输入框")
+                self.failure_reason = FAILURE_UI
+                self._signal(SIGNAL_INPUT_MISSING)
                 return False
             
             # 点击输入框获取焦点
             chat_edit.Click()
-            time.sleep(0.2)
+            self._pause(0.2)
             
             # 粘贴图片（Ctrl+V）
             chat_edit.SendKeys('{Ctrl}v')
-            time.sleep(0.5)
+            self._pause(0.5)
             
             # 发送（Enter）
             chat_edit.SendKeys('{Enter}')
-            time.sleep(0.3)
+            self._pause(0.3)
             
             logger.info(f"成功发送图片: {image_url}")
             return True
             
+        except WorkerAbandoned:
+            raise
         except Exception as e:
             logger.error(f"发送图片失败: {str(e)}", exc_info=True)
+            self.failure_reason = FAILURE_UI
             return False
     
+    def _refresh_session_list(self):
+        """发送成功后增量刷新会话列表快照（当前会话会被移动到顶部）"""
+        try:
+            with self._operation('refresh_session_list'):
+                wx = self._get_wechat_window()
+                if wx:
+                    self.session_cache.refresh(wx)
+        except Exception as e:
+            logger.debug(f"刷新会话列表快照失败: {str(e)}")
+    
+    def iter_session_cells(self):
+        """
+        按列表顺序读取会话项文本（供新消息监听使用，会话列表快照失效时先全量刷新）
+        
+        Yields:
+            tuple: (联系人名称, 会话项文本)
+        """
+        if self.session_cache.list_control is None:
+            wx = self._get_wechat_window()
+            if not wx:
+                return
+            self.session_cache.full_refresh(wx)
+        yield from self.session_cache.iter_texts()
+    
     def search_and_send(self, contact_name, message):
         """
         搜索联系人并发送消息（组合操作）
@@ -491,17 +921,24 @@ class WeChatController:
             bool: 操作是否成功
         """
         logger.info(f"开始向 '{contact_name}' 发送消息")
+        self.failure_reason = None
+        self.last_media = None
         
         # 搜索联系人
-        if not self.search_contact(contact_name):
+        with self._operation('search_contact'):
+            found = self.search_contact(contact_name)
+        if not found:
             logger.warning(f"跳过向 '{contact_name}' 发送消息（搜索失败）")
             return False
         
         # 发送消息
-        if not self.send_message(message):
+        with self._operation('send_message'):
+            sent = self.send_message(message)
+        if not sent:
             logger.warning(f"向 '{contact_name}' 发送消息失败")
             return False
         
+        self._refresh_session_list()
         logger.info(f"成功向 '{contact_name}' 发送消息")
         return True
     
@@ -517,20 +954,71 @@ class WeChatController:
             bool: 操作是否成功
         """
         logger.info(f"开始向 '{contact_name}' 发送图片")
+        self.failure_reason = None
+        self.last_media = None
         
         # 搜索联系人
-        if not self.search_contact(contact_name):
+        with self._operation('search_contact'):
+            found = self.search_contact(contact_name)
+        if not found:
             logger.warning(f"跳过向 '{contact_name}' 发送图片（搜索失败）")
             return False
         
         # 发送图片
-        if not self.send_picture(image_url):
+        with self._operation('send_picture'):
+            sent = self.send_picture(image_url)
+        if not sent:
             logger.warning(f"向 '{contact_name}' 发送图片失败")
             return False
         
+        self._refresh_session_list()
         logger.info(f"成功向 '{contact_name}' 发送图片")
         return True
 
+    
+    def search_and_send_file(self, contact_name, file_url):
+        """
+        搜索联系人并发送文件（组合操作）
+        
+        Args:
+            contact_name: 联系人名称
+            file_url: 文件的 URL
+            
+        Returns:
+            bool: 操作是否成功
+        """
+        logger.info(f"开始向 '{contact_name}' 发送文件")
+        self.failure_reason = None
+        self.last_media = None
+        
+        # 搜索联系人
+        with self._operation('search_contact'):
+            found = self.search_contact(contact_name)
+        if not found:
+            logger.warning(f"跳过向 '{contact_name}' 发送文件（搜索失败）")
+            return False
+        
+        # 获取缓存文件，发送结束前固定，避免微信读取时被淘汰
+        cache_file = self._prepare_file(file_url)
+        if not cache_file:
+            self.failure_reason = FAILURE_DOWNLOAD
+            logger.warning(f"向 '{contact_name}' 发送文件失败（下载失败）")
+            return False
+        
+        # 发送文件
+        try:
+            with self._operation('send_file'):
+                sent = self.send_file(file_url, cache_file)
+        finally:
+            self.file_cache.unpin(cache_file)
+        if not sent:
+            logger.warning(f"向 '{contact_name}' 发送文件失败")
+            return False
+        
+        self._refresh_session_list()
+        logger.info(f"成功向 '{contact_name}' 发送文件")
+        return True
+
 
 # 测试代码
 if __name__ == "__main__":
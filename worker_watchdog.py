@@ -0,0 +1,168 @@
+"""
+看门狗心跳模块
+消息处理线程在每轮循环和每个界面操作前后更新心跳，
+看门狗线程据此判断处理线程是否卡死（例如微信弹出模态对话框、COM 调用挂起）
+"""
+import threading
+import time
+
+# 各界面操作的默认耗时预算（秒），超过预算视为卡死
+DEFAULT_UI_TIMEOUTS = {
+    'warm_up': 30,
+    'probe': 10,
+    'search_contact': 20,
+    'send_message': 15,
+    'send_picture': 120,
+    'send_file': 300,
+    # 发送文件前等待下载（不是界面操作），下载超时低于该预算
+    'download_file': 660,
+    'refresh_session_list': 15,
+    'monitor_poll': 15
+}
+
+# 未在预算表中列出的操作使用的默认预算（秒）
+DEFAULT_OPERATION_TIMEOUT = 30
+
+
+class WorkerAbandoned(Exception):
+    """处理线程已被看门狗放弃，不能再操作界面"""
+
+
+class Heartbeat:
+    """心跳类，记录一个处理线程最近的活动时间和正在执行的界面操作"""
+
+    def __init__(self, generation, ui_timeouts=None, idle_timeout=60):
+        """
+        初始化心跳
+
+        Args:
+            generation: 处理线程的代数（每次替换线程加 1）
+            ui_timeouts: 各界面操作的耗时预算（秒），会覆盖默认值
+            idle_timeout: 没有界面操作时两次心跳之间的最长间隔（秒）
+        """
+        self.generation = generation
+        self.ui_timeouts = dict(DEFAULT_UI_TIMEOUTS)
+        self.ui_timeouts.update(ui_timeouts or {})
+        self.idle_timeout = idle_timeout
+        self.lock = threading.Lock()
+        self.last_beat = time.time()
+        self.operation = None
+        self.operation_deadline = None
+        # 正在发送的消息项，线程被替换时放回队列
+        self.inflight = []
+        # 被看门狗放弃后置为 True，旧线程恢复后不再记录结果并直接退出
+        self.abandoned = False
+
+    def beat(self):
+        """更新心跳时间"""
+        self.last_beat = time.time()
+
+    def check_abandoned(self):
+        """
+        检查处理线程是否已被放弃（每个界面步骤之前调用）
+
+        Raises:
+            WorkerAbandoned: 已被看门狗放弃
+        """
+        if self.abandoned:
+            raise WorkerAbandoned(f"处理线程已被放弃: 线程代数={self.generation}")
+
+    def abandon(self):
+        """
+        放弃处理线程并取走正在发送的消息（看门狗调用，与 claim_inflight() 互斥）
+
+        Returns:
+            list: 正在发送、尚未被处理线程认领的消息项
+        """
+        with self.lock:
+            self.abandoned = True
+            inflight = self.inflight
+            self.inflight = []
+            return inflight
+
+    def set_inflight(self, items):
+        """
+        登记即将发送的消息项
+
+        Args:
+            items: 消息项列表
+
+        Returns:
+            bool: 已被放弃时返回 False（消息未登记，由调用方放回队列）
+        """
+        with self.lock:
+            if self.abandoned:
+                return False
+            self.inflight = items
+            return True
+
+    def claim_inflight(self):
+        """
+        发送结束后认领正在发送的消息项，之后由处理线程记录结果
+
+        Returns:
+            bool: 已被放弃时返回 False（消息已被看门狗放回队列，不能再记录结果）
+        """
+        with self.lock:
+            if self.abandoned:
+                return False
+            self.inflight = []
+            return True
+
+    def budget(self, operation):
+        """
+        获取界面操作的耗时预算
+
+        Args:
+            operation: 操作名称
+
+        Returns:
+            float: 耗时预算（秒）
+        """
+        return self.ui_timeouts.get(operation, DEFAULT_OPERATION_TIMEOUT)
+
+    def begin(self, operation):
+        """
+        开始一个界面操作
+
+        Args:
+            operation: 操作名称
+
+        Raises:
+            WorkerAbandoned: 已被看门狗放弃
+        """
+        budget = self.budget(operation)
+        with self.lock:
+            if self.abandoned:
+                raise WorkerAbandoned(f"处理线程已被放弃: 线程代数={self.generation}")
+            now = time.time()
+            self.last_beat = now
+            self.operation = operation
+            self.operation_deadline = now + budget
+
+    def end(self):
+        """结束当前界面操作"""
+        with self.lock:
+            self.last_beat = time.time()
+            self.operation = None
+            self.operation_deadline = None
+
+    def check_stall(self, now=None):
+        """
+        检查处理线程是否卡死
+
+        Args:
+            now: 当前时间戳，默认取当前时间
+
+        Returns:
+            str: 卡死的操作名称（空闲超时为 'idle'），未卡死返回 None
+        """
+        now = now or time.time()
+        with self.lock:
+            if self.operation is not None:
+                if now > self.operation_deadline:
+                    return self.operation
+                return None
+            if now - self.last_beat > self.idle_timeout:
+                return 'idle'
+            return None